@@ -1,14 +1,22 @@
 from textsearchpy.index import Index
 from textsearchpy.query import Query
-from typing import List
+from typing import Iterable, List, Optional
 import time
 import psutil
 
 
-def create_index_from_data(data: List[str]):
+def create_index_from_data(
+    data: Iterable[str], workers: Optional[int] = None, compress_positions: bool = False
+):
+    """
+    data is streamed into the index by append, bulk_append reads it all first
+    """
     start = time.time()
-    index = Index()
-    index.append(data)
+    index = Index(compress_positions=compress_positions)
+    if workers:
+        index.bulk_append(list(data), workers=workers)
+    else:
+        index.append(data)
     end = time.time()
     elapsed_time = end - start
     print("Indexing Execution time:", elapsed_time, "seconds")
@@ -19,6 +27,24 @@ def create_index_from_data(data: List[str]):
     return index
 
 
+def print_postings_size(index: Index):
+    doc_ids = 0
+    offsets = 0
+    positions = 0
+    for postings in index.positional_index.values():
+        doc_ids += postings.doc_ids.itemsize * len(postings.doc_ids)
+        offsets += postings.offsets.itemsize * len(postings.offsets)
+        if index.compress_positions:
+            offsets += postings.blocks.itemsize * len(postings.blocks)
+            positions += len(postings.positions)
+        else:
+            positions += postings.positions.itemsize * len(postings.positions)
+
+    print(f"Postings doc ids: {doc_ids / 1024**2} MiB")
+    print(f"Postings offsets: {offsets / 1024**2} MiB")
+    print(f"Postings positions: {positions / 1024**2} MiB")
+
+
 def print_memory_usage():
     process = psutil.Process()
     mem_usage = process.memory_info().rss / 1024**2
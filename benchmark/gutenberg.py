@@ -1,4 +1,9 @@
-from benchmark_utils import create_index_from_data, print_memory_usage, evaluate_queries
+from benchmark_utils import (
+    create_index_from_data,
+    print_memory_usage,
+    print_postings_size,
+    evaluate_queries,
+)
 from textsearchpy.query import (
     TermQuery,
     BooleanQuery,
@@ -11,45 +16,60 @@ from os.path import isfile, join, isdir
 import argparse
 from pathlib import Path
 
-# sample of project gutenberg books
-DATA_PATH = ""
-
 
-def load_corpus(n):
-    data = []
+def iter_corpus(data_path, n):
+    """
+    yields the text of up to n books, reading one file at a time
+    """
+    count = 0
     total_size = 0
-    for dir in listdir(DATA_PATH):
-        if isdir(join(DATA_PATH, dir)):
-            for f in listdir(join(DATA_PATH, dir)):
-                path = join(DATA_PATH, dir, f)
+    for dir in listdir(data_path):
+        if isdir(join(data_path, dir)):
+            for f in listdir(join(data_path, dir)):
+                path = join(data_path, dir, f)
                 if isfile(path):
                     with open(path, "r") as file:
-                        data.append(file.read())
+                        yield file.read()
 
+                    count += 1
                     total_size += Path(path).stat().st_size
 
-                    if len(data) == n:
+                    if count == n:
                         print(f"Raw data size: {total_size * 0.000001} MB")
-                        return data
+                        return
 
     print(f"Raw data size: {total_size * 0.000001} MB")
-    return data
 
 
 def run():
     parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "data_path",
+        help="folder of project gutenberg books, one sub folder per book",
+    )
     parser.add_argument("-n", type=int)
+    parser.add_argument(
+        "--workers", type=int, help="index with bulk_append over this many processes"
+    )
+    parser.add_argument(
+        "--compress-positions",
+        action="store_true",
+        help="store positions as varint encoded gaps",
+    )
 
     args = parser.parse_args()
 
-    data = load_corpus(args.n)
-    print(f"Gutenberg data loaded with {len(data)} documents")
-
     print_memory_usage()
 
-    index = create_index_from_data(data)
+    # books are streamed into the index rather than loaded up front
+    index = create_index_from_data(
+        iter_corpus(args.data_path, args.n),
+        workers=args.workers,
+        compress_positions=args.compress_positions,
+    )
 
     print_memory_usage()
+    print_postings_size(index)
 
     evaluate_queries(
         index=index,
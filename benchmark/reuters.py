@@ -8,34 +8,38 @@ from textsearchpy.query import (
 )
 from os import listdir
 from os.path import isfile, join
+import argparse
 from pathlib import Path
 
-# https://www.nltk.org/nltk_data/ The Reuters-21578 benchmark corpus
-REUTERS_DATA_PATH = "/Users/kimili/Downloads/reuters/total"
 
-
-def load_corpus():
-    data = []
+def iter_corpus(data_path):
+    """
+    yields the text of every article, reading one file at a time
+    """
     total_size = 0
-    for f in listdir(REUTERS_DATA_PATH):
-        path = join(REUTERS_DATA_PATH, f)
+    for f in listdir(data_path):
+        path = join(data_path, f)
         if isfile(path):
-            with open(join(REUTERS_DATA_PATH, f), "r", encoding="latin-1") as file:
-                data.append(file.read())
+            with open(path, "r", encoding="latin-1") as file:
+                yield file.read()
 
             total_size += Path(path).stat().st_size
 
     print(f"Raw data size: {total_size * 0.000001} MB")
-    return data
 
 
 def run():
-    data = load_corpus()
-    print(f"Reuters data loaded with {len(data)} documents")
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "data_path",
+        help="folder of Reuters-21578 articles (https://www.nltk.org/nltk_data/)",
+    )
+    args = parser.parse_args()
 
     print_memory_usage()
 
-    index = create_index_from_data(data)
+    # articles are streamed into the index rather than loaded up front
+    index = create_index_from_data(iter_corpus(args.data_path))
 
     print_memory_usage()
 
@@ -0,0 +1,324 @@
+"""
+reproducible benchmark over a seeded synthetic corpus
+
+runs indexing, each query type, ranked retrieval, save/load and delete scenarios and
+writes the results as json, optionally comparing them against a stored baseline,
+the exit status is 1 when any scenario regressed past the tolerance
+"""
+
+import argparse
+import gc
+import importlib.metadata
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from synthetic import ZipfCorpus
+from textsearchpy.index import Index
+
+# bumped when the result layout changes, results of another schema are not compared
+SCHEMA_VERSION = 1
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    """
+    nearest rank percentile of ascending values
+    """
+    rank = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[List[float]]) -> Dict:
+    """
+    ops, throughput per second and latency percentiles in milliseconds, latencies holds the
+    timings of each operation (i.e. each query of a set) repeated
+
+    median_ms sums the median timing of every operation, the figure compared to a baseline
+    as it is far less noisy than any percentile over the mixed operations
+    """
+    median_ms = sum(percentile(sorted(op), 50) for op in latencies) * 1000
+    latencies = sorted(t for op in latencies for t in op)
+    total = sum(latencies)
+    return {
+        "ops": len(latencies),
+        "seconds": total,
+        "throughput": len(latencies) / total if total else None,
+        "median_ms": median_ms,
+        "latency_ms": {
+            "p50": percentile(latencies, 50) * 1000,
+            "p90": percentile(latencies, 90) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": latencies[-1] * 1000,
+        },
+    }
+
+
+# fast queries are repeated until they ran this long, so their medians are stable
+_MIN_QUERY_SECONDS = 0.05
+_MAX_QUERY_REPEAT = 1000
+
+
+def timed(fn: Callable[[], object], repeat: int = 1) -> List[List[float]]:
+    gc.collect()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return [latencies]
+
+
+def time_queries(
+    run: Callable[[str], object], queries: List[str], repeat: int
+) -> List[List[float]]:
+    """
+    timings of each query, repeated at least repeat times
+    """
+    gc.collect()
+    latencies = []
+    for query in queries:
+        # one untimed run so the plan is compiled and lazily built structures exist
+        run(query)
+        timings = []
+        while len(timings) < repeat or (
+            sum(timings) < _MIN_QUERY_SECONDS and len(timings) < _MAX_QUERY_REPEAT
+        ):
+            start = time.perf_counter()
+            run(query)
+            timings.append(time.perf_counter() - start)
+        latencies.append(timings)
+    return latencies
+
+
+def peak_rss_mib() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        # not available on windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def package_version() -> str:
+    try:
+        return importlib.metadata.version("textsearchpy")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def query_sets(corpus: ZipfCorpus) -> Dict[str, List[str]]:
+    """
+    queries over words of fixed frequency ranks, from the most frequent words to rare ones
+    """
+    w = corpus.word
+    ranks = [0, 10, 100, 1000, corpus.vocab_size // 2]
+    return {
+        "term": [w(r) for r in ranks],
+        "boolean_and": [
+            f"{w(1)} AND {w(20)}",
+            f"{w(10)} AND {w(200)}",
+            f"{w(5)} AND {w(50)} AND {w(500)}",
+        ],
+        "boolean_or": [
+            f"{w(1)} OR {w(20)}",
+            f"{w(100)} OR {w(1000)}",
+            f"({w(3)} OR {w(30)}) NOT {w(300)}",
+        ],
+        "phrase": [
+            f'"{w(0)} {w(1)}"',
+            f'"{w(2)} {w(40)}"~3',
+            f'"{w(50)} {w(300)}"~10',
+        ],
+        "phrase_multi_term": [
+            f'"{w(0)} {w(1)} {w(2)}"~2',
+            f'"{w(5)} {w(10)} {w(50)}"~5',
+        ],
+        "wildcard_prefix": [w(r)[:2] + "*" for r in (0, 100, 1000)],
+        "wildcard_leading": ["*" + w(r)[-3:] for r in (0, 100)],
+    }
+
+
+def run_scenarios(corpus: ZipfCorpus, repeat: int) -> Dict[str, Dict]:
+    scenarios = {}
+
+    latencies = []
+    index = None
+    for _ in range(min(repeat, 3)):
+        # the previous index is freed first, so peak memory holds a single index
+        index = None
+        gc.collect()
+        start = time.perf_counter()
+        index = Index()
+        index.append(corpus.documents())
+        latencies.append(time.perf_counter() - start)
+    append = scenarios["index_append"] = summarize([latencies])
+    append["docs_per_second"] = len(index) / (append["median_ms"] / 1000)
+    append["tokens_per_second"] = index.total_tokens / (append["median_ms"] / 1000)
+
+    queries = query_sets(corpus)
+    for name, query_set in queries.items():
+        latencies = time_queries(index.search, query_set, repeat)
+        scenarios[f"search_{name}"] = summarize(latencies)
+
+    for name in ("term", "boolean_or", "phrase"):
+        latencies = time_queries(
+            lambda q: index.retrieve_top_n(q, n=10), queries[name], repeat
+        )
+        scenarios[f"top_10_{name}"] = summarize(latencies)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for format in ("json", "binary"):
+            paths = [Path(tmp, f"{format}_{i}") for i in range(min(repeat, 3))]
+            paths_iter = iter(paths)
+            latencies = timed(
+                lambda: index.save(str(next(paths_iter)), format=format), len(paths)
+            )
+            scenarios[f"save_{format}"] = summarize(latencies)
+
+            paths_iter = iter(paths)
+            latencies = timed(
+                lambda: Index().load_from_file(str(next(paths_iter))), len(paths)
+            )
+            scenarios[f"load_{format}"] = summarize(latencies)
+
+    # run last, it changes the index
+    rng = random.Random(corpus.seed)
+    batch_count = len(index) // 10
+    single_count = len(index) // 20
+    ids = rng.sample(sorted(index.documents), batch_count + single_count)
+    single_ids = iter(ids[batch_count:])
+    ids = ids[:batch_count]
+    batches = [ids[i : i + 100] for i in range(0, len(ids), 100)]
+    batches_iter = iter(batches)
+    latencies = timed(lambda: index.delete(ids=next(batches_iter)), len(batches))
+    scenarios["delete_batch_100"] = summarize(latencies)
+    # one id per call, the cost of a delete must not grow with the index
+    latencies = timed(lambda: index.delete(ids=[next(single_ids)]), single_count)
+    scenarios["delete_single"] = summarize(latencies)
+    scenarios["search_term_after_delete"] = summarize(
+        time_queries(index.search, queries["term"], repeat)
+    )
+    # clauses are intersected before deleted documents are dropped
+    scenarios["search_boolean_and_after_delete"] = summarize(
+        time_queries(index.search, queries["boolean_and"], repeat)
+    )
+    scenarios["compact"] = summarize(timed(index.compact))
+
+    return scenarios
+
+
+def run_suite(corpus: ZipfCorpus, repeat: int) -> Dict:
+    scenarios = run_scenarios(corpus, repeat)
+    return {
+        "schema": SCHEMA_VERSION,
+        "config": {**corpus.config(), "repeat": repeat},
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "textsearchpy": package_version(),
+        },
+        "peak_rss_mib": peak_rss_mib(),
+        "scenarios": scenarios,
+    }
+
+
+def compare(result: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    regressions of result against baseline, a scenario regresses when its summed
+    median time grows by more than tolerance, peak memory is checked the same way
+    """
+    if result["schema"] != baseline.get("schema"):
+        raise SystemExit("baseline was written by another version of the suite")
+    if result["config"] != baseline["config"]:
+        raise SystemExit(
+            f"baseline config {baseline['config']} differs from {result['config']}"
+        )
+
+    regressions = []
+    print(f"{'scenario':<28}{'baseline ms':>14}{'median ms':>12}{'change':>10}")
+    for name, base in baseline["scenarios"].items():
+        current = result["scenarios"].get(name)
+        if current is None:
+            continue
+        base_ms = base["median_ms"]
+        median_ms = current["median_ms"]
+        change = median_ms / base_ms - 1 if base_ms else 0
+        flag = " REGRESSION" if change > tolerance else ""
+        print(f"{name:<28}{base_ms:>14.3f}{median_ms:>12.3f}{change:>+10.1%}{flag}")
+        if flag:
+            regressions.append(f"{name}: {base_ms:.3f} ms -> {median_ms:.3f} ms")
+
+    base_rss = baseline.get("peak_rss_mib")
+    rss = result.get("peak_rss_mib")
+    if base_rss and rss:
+        change = rss / base_rss - 1
+        flag = " REGRESSION" if change > tolerance else ""
+        print(
+            f"{'peak_rss_mib':<28}{base_rss:>14.1f}{rss:>12.1f}{change:>+10.1%}{flag}"
+        )
+        if flag:
+            regressions.append(f"peak rss {base_rss:.1f} MiB -> {rss:.1f} MiB")
+
+    return regressions
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--doc-length", type=int, default=200)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="timed passes over each query set"
+    )
+    parser.add_argument("--output", help="write results json to this file")
+    parser.add_argument("--baseline", help="compare against this results json")
+    parser.add_argument(
+        "--save-baseline", help="write results json to this file to compare against"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed median time and peak memory growth over the baseline",
+    )
+    args = parser.parse_args()
+
+    corpus = ZipfCorpus(
+        num_docs=args.docs,
+        vocab_size=args.vocab,
+        doc_length=args.doc_length,
+        zipf_s=args.zipf,
+        seed=args.seed,
+    )
+    result = run_suite(corpus, args.repeat)
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(output)
+    if not args.output and not args.save_baseline:
+        print(output)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("performance regressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,77 @@
+from itertools import accumulate
+import random
+from typing import Iterator, List
+
+from textsearchpy.index import Document
+
+# letters only, the default tokenizer drops digits
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+
+
+def make_vocabulary(size: int, seed: int = 0) -> List[str]:
+    """
+    size distinct pseudo words, the first words are the most frequent in generated text
+    """
+    rng = random.Random(seed)
+    words = []
+    seen = set()
+    while len(words) < size:
+        # frequent words tend to be short, as in natural language
+        length = min(2 + int(rng.expovariate(0.4)) + len(words) * 4 // size, 14)
+        word = "".join(rng.choices(_ALPHABET, k=length))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+class ZipfCorpus:
+    """
+    seeded synthetic corpus, word frequencies follow a zipf distribution with exponent
+    zipf_s over the vocabulary, document lengths are drawn around doc_length
+
+    the same arguments always generate the same documents and vocabulary
+    """
+
+    def __init__(
+        self,
+        num_docs: int = 20000,
+        vocab_size: int = 50000,
+        doc_length: int = 200,
+        zipf_s: float = 1.1,
+        seed: int = 0,
+    ):
+        self.num_docs = num_docs
+        self.vocab_size = vocab_size
+        self.doc_length = doc_length
+        self.zipf_s = zipf_s
+        self.seed = seed
+
+        self.vocabulary = make_vocabulary(vocab_size, seed)
+        self._cum_weights = list(
+            accumulate(1 / rank**zipf_s for rank in range(1, vocab_size + 1))
+        )
+
+    def config(self) -> dict:
+        return {
+            "num_docs": self.num_docs,
+            "vocab_size": self.vocab_size,
+            "doc_length": self.doc_length,
+            "zipf_s": self.zipf_s,
+            "seed": self.seed,
+        }
+
+    def documents(self) -> Iterator[Document]:
+        rng = random.Random(self.seed)
+        vocabulary = self.vocabulary
+        cum_weights = self._cum_weights
+        for i in range(self.num_docs):
+            length = max(1, int(rng.gauss(self.doc_length, self.doc_length / 4)))
+            words = rng.choices(vocabulary, cum_weights=cum_weights, k=length)
+            yield Document(id=f"doc{i}", text=" ".join(words))
+
+    def word(self, rank: int) -> str:
+        """
+        word with the given frequency rank, 0 is the most frequent
+        """
+        return self.vocabulary[rank]
@@ -0,0 +1,137 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Dict, Hashable, List, Optional, Tuple, Union
+
+from .docstore import Document
+from .exception import QueryRejectedError
+from .plan import plan_query
+from .query import Query
+
+
+def _cursor_key(
+    search_after: Optional[Union[Document, Tuple[float, str]]],
+) -> Optional[Tuple[float, str]]:
+    if isinstance(search_after, Document):
+        return search_after.score, search_after.id
+    if search_after is not None:
+        return tuple(search_after)
+    return None
+
+
+class AsyncIndex:
+    """
+    asyncio facade over an Index or SegmentedIndex, queries are evaluated on an executor so
+    the event loop keeps serving other requests while a query runs
+
+    at most max_concurrency queries are evaluated at once, the rest wait their turn, once
+    max_pending queries are waiting or running new queries raise QueryRejectedError
+
+    query evaluation is python code holding the GIL, so more than one worker thread adds
+    no throughput and delays the event loop thread further, max_concurrency defaults to 1
+    the executor should run threads, a process pool would pickle the index with every query
+    concurrent identical queries share a single evaluation when coalesce is set, every
+    caller gets its own result list holding the same Documents
+    """
+
+    def __init__(
+        self,
+        index,
+        executor: Optional[Executor] = None,
+        max_concurrency: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        coalesce: bool = True,
+    ):
+        self.index = index
+        self.max_concurrency = max_concurrency or 1
+        self.max_pending = max_pending
+        self.coalesce = coalesce
+
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="textsearchpy"
+        )
+        # created on first use, so it belongs to the running event loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # {query key: evaluation task} of queries waiting or running
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._pending = 0
+
+        self.evaluations = 0
+        self.coalesced = 0
+
+    @property
+    def pending(self) -> int:
+        """
+        number of query evaluations waiting or running
+        """
+        return self._pending
+
+    def _query_key(self, query: Union[Query, str]) -> Hashable:
+        # Query models are not hashable, queries compiling to the same plan share a key
+        index = self.index
+        return plan_query(query, index.analyzer.token_normalizers, index.plan_cache).key
+
+    async def search(self, query: Union[Query, str]) -> List[Document]:
+        return await self._submit(
+            ("search", self._query_key(query)), self.index.search, query
+        )
+
+    async def retrieve_top_n(
+        self,
+        query: Union[Query, str],
+        n: Optional[int] = None,
+        search_after: Optional[Union[Document, Tuple[float, str]]] = None,
+    ) -> List[Document]:
+        key = ("top_n", self._query_key(query), n, _cursor_key(search_after))
+        return await self._submit(
+            key, self.index.retrieve_top_n, query, n, search_after
+        )
+
+    async def _submit(self, key: Hashable, fn, *args) -> List[Document]:
+        task = self._in_flight.get(key) if self.coalesce else None
+        if task is not None:
+            self.coalesced += 1
+        else:
+            if self.max_pending is not None and self._pending >= self.max_pending:
+                raise QueryRejectedError(
+                    f"{self._pending} queries pending, limit is {self.max_pending}"
+                )
+
+            self._pending += 1
+            self.evaluations += 1
+            task = asyncio.ensure_future(self._evaluate(fn, *args))
+            if self.coalesce:
+                self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+
+        # a cancelled caller does not cancel the evaluation shared with other callers
+        result = await asyncio.shield(task)
+        return list(result)
+
+    async def _evaluate(self, fn, *args) -> List[Document]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _done(self, key: Hashable, task: asyncio.Future):
+        self._pending -= 1
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # mark a failure as retrieved when every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def close(self):
+        """
+        shut down the executor when it was created here
+        """
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> "AsyncIndex":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
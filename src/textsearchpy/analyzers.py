@@ -0,0 +1,137 @@
+from typing import Callable, Iterable, List, Optional, Set
+import re
+
+from .normalizers import LowerCaseNormalizer, StopwordsNormalizer, TokenNormalizer
+from .tokenizers import SimpleTokenizer, Tokenizer
+
+# PAT_ALPHABETIC without capture groups, so findall returns the matched tokens
+_PAT_ALPHABETIC_TOKENS = re.compile(r"(?:(?![\d])\w)+", re.UNICODE)
+
+
+def _fuse_normalizers(
+    normalizers: List[TokenNormalizer],
+) -> Callable[[List[str]], List[str]]:
+    """
+    single list comprehension equivalent to running normalizers one after another,
+    normalizers should be LowerCaseNormalizer or StopwordsNormalizer
+    """
+    lower = False
+    # stopwords removed before and after lowercasing
+    raw_stopwords: Set[str] = set()
+    lower_stopwords: Set[str] = set()
+    for normalizer in normalizers:
+        if isinstance(normalizer, LowerCaseNormalizer):
+            # lowercasing twice changes nothing
+            lower = True
+        elif lower:
+            lower_stopwords |= normalizer.stopwords
+        else:
+            raw_stopwords |= normalizer.stopwords
+
+    if not lower:
+        if not raw_stopwords:
+            return list
+        return lambda tokens: [t for t in tokens if t not in raw_stopwords]
+
+    if raw_stopwords:
+        if lower_stopwords:
+            return lambda tokens: [
+                t
+                for t in (t.lower() for t in tokens if t not in raw_stopwords)
+                if t not in lower_stopwords
+            ]
+        return lambda tokens: [t.lower() for t in tokens if t not in raw_stopwords]
+
+    if lower_stopwords:
+        return lambda tokens: [
+            t for t in map(str.lower, tokens) if t not in lower_stopwords
+        ]
+    return lambda tokens: list(map(str.lower, tokens))
+
+
+def _is_fusable(normalizer: TokenNormalizer) -> bool:
+    # exact types only, a subclass may override normalize
+    return type(normalizer) in (LowerCaseNormalizer, StopwordsNormalizer)
+
+
+class Analyzer:
+    """
+    tokenizer and token normalizers compiled into one function turning text into index tokens
+
+    LowerCaseNormalizer and StopwordsNormalizer run fused in a single pass over the tokens,
+    with SimpleTokenizer ascii text is lowercased before tokenizing, which gives the same
+    tokens for ascii
+    any other tokenizer or normalizer runs as is, in the order given
+    """
+
+    def __init__(
+        self,
+        tokenizer: Optional[Tokenizer] = None,
+        token_normalizers: Optional[List[TokenNormalizer]] = None,
+    ):
+        self.tokenizer = tokenizer if tokenizer is not None else SimpleTokenizer()
+        self.token_normalizers = (
+            list(token_normalizers)
+            if token_normalizers is not None
+            else [LowerCaseNormalizer()]
+        )
+        self.normalize = self._compile_normalizers(self.token_normalizers)
+        self.analyze = self._compile()
+
+    @staticmethod
+    def _compile_normalizers(
+        normalizers: List[TokenNormalizer],
+    ) -> Callable[[List[str]], List[str]]:
+        # consecutive fusable normalizers become one step
+        steps = []
+        run = []
+        for normalizer in normalizers:
+            if _is_fusable(normalizer):
+                run.append(normalizer)
+                continue
+            if run:
+                steps.append(_fuse_normalizers(run))
+                run = []
+            steps.append(normalizer.normalize)
+        if run:
+            steps.append(_fuse_normalizers(run))
+
+        if not steps:
+            return lambda tokens: tokens
+        if len(steps) == 1:
+            return steps[0]
+
+        def normalize(tokens: List[str]) -> List[str]:
+            for step in steps:
+                tokens = step(tokens)
+            return tokens
+
+        return normalize
+
+    def _compile(self) -> Callable[[str], List[str]]:
+        tokenize = self.tokenizer.tokenize
+        normalize = self.normalize
+
+        if type(self.tokenizer) is not SimpleTokenizer:
+            return lambda text: normalize(tokenize(text))
+
+        findall = _PAT_ALPHABETIC_TOKENS.findall
+        normalizers = self.token_normalizers
+        if not normalizers or type(normalizers[0]) is not LowerCaseNormalizer:
+            return lambda text: normalize(findall(text))
+
+        # ascii text is lowercased as a whole before tokenizing, outside ascii lowercasing
+        # can change how text splits into tokens (i.e. "İ" lowercases to "i" and a
+        # combining dot) so tokens are lowercased one by one
+        rest = self._compile_normalizers(normalizers[1:])
+
+        def analyze(text: str) -> List[str]:
+            if text.isascii():
+                return rest(findall(text.lower()))
+            return normalize(findall(text))
+
+        return analyze
+
+    def analyze_batch(self, texts: Iterable[str]) -> List[List[str]]:
+        analyze = self.analyze
+        return [analyze(text) for text in texts]
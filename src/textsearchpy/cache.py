@@ -0,0 +1,101 @@
+from collections import OrderedDict
+import sys
+import threading
+from typing import Dict, Hashable, List, Optional
+
+from .docstore import Document
+
+# rough per document cost of a cached result on top of its text
+_DOCUMENT_OVERHEAD = 200
+
+
+def estimate_size(docs: List[Document]) -> int:
+    size = sys.getsizeof(docs)
+    for doc in docs:
+        size += _DOCUMENT_OVERHEAD + len(doc.text)
+    return size
+
+
+class ResultCache:
+    """
+    least recently used {key: documents} for one index generation
+
+    entries are only served for the generation they were stored with, once the index
+    changes every older entry is dropped, so stale results are never returned
+    entries are evicted once their estimated size passes max_bytes
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size_bytes = 0
+
+        self._generation = None
+        # {key: (documents, estimated size)}
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _check_generation(self, generation: int) -> bool:
+        """
+        False for a generation older than the cached one, i.e. from a reader of an
+        earlier snapshot, which neither reads nor replaces the newer entries
+        """
+        if generation != self._generation:
+            if self._generation is not None and generation < self._generation:
+                return False
+            self._entries.clear()
+            self.size_bytes = 0
+            self._generation = generation
+        return True
+
+    def get(self, key: Hashable, generation: int) -> Optional[List[Document]]:
+        with self._lock:
+            entry = None
+            if self._check_generation(generation):
+                entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return list(entry[0])
+
+    def put(self, key: Hashable, generation: int, docs: List[Document]):
+        size = estimate_size(docs)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if not self._check_generation(generation):
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= previous[1]
+
+            self._entries[key] = (list(docs), size)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,54 @@
+from heapq import heappush, heapreplace
+from typing import List, Optional, Tuple
+
+
+class TopNCollector:
+    """
+    collects the best n (score, doc_id) hits, ordered by score descending with ties broken
+    by doc_id ascending so the order of equal scores is stable
+
+    when after is set to the (score, doc_id) of the last hit of a previous page, only hits
+    ordered after it are kept, so deeper pages never hold any of the earlier pages
+    a negative n keeps no hits
+    """
+
+    def __init__(
+        self, n: Optional[int] = None, after: Optional[Tuple[float, int]] = None
+    ):
+        self.n = n if n is None else max(n, 0)
+        self.after = after
+        # min heap of (score, -doc_id), heap[0] is the weakest hit kept so far
+        self._heap: List[Tuple[float, int]] = []
+
+    def collect(self, doc_id: int, score: float) -> bool:
+        """
+        offer a hit to the collector, returns True if it was kept
+        """
+        after = self.after
+        if after is not None and (
+            score > after[0] or (score == after[0] and doc_id <= after[1])
+        ):
+            return False
+
+        entry = (score, -doc_id)
+        heap = self._heap
+        if self.n is None or len(heap) < self.n:
+            heappush(heap, entry)
+            return True
+        if heap and entry > heap[0]:
+            heapreplace(heap, entry)
+            return True
+        return False
+
+    @property
+    def threshold(self) -> Optional[float]:
+        """
+        once the collector is full, the score a new hit has to reach to be kept
+        with equal scores only a smaller doc_id than the weakest hit is kept
+        """
+        if self.n is not None and self._heap and len(self._heap) >= self.n:
+            return self._heap[0][0]
+        return None
+
+    def top_docs(self) -> List[Tuple[float, int]]:
+        return [(score, -neg_id) for score, neg_id in sorted(self._heap, reverse=True)]
@@ -0,0 +1,127 @@
+from array import array
+from collections.abc import Mapping
+import copy
+import mmap
+import os
+from typing import Dict, Iterable, Iterator, Optional, Set
+from pydantic import BaseModel
+
+
+class Document(BaseModel):
+    text: str
+    # metadata
+    id: Optional[str] = None
+    # document size post processing
+    count: Optional[int] = None
+    # query match score
+    score: Optional[float] = None
+
+
+class DocumentStore:
+    """
+    documents by internal doc id
+
+    documents loaded from a docs.jsonl file stay on disk, the file is memory mapped and
+    a line is only parsed into a Document when that document is requested
+    documents appended after loading are kept in memory
+    """
+
+    def __init__(self):
+        self._memory: Dict[int, Document] = {}
+        self._removed: Set[int] = set()
+
+        self._file = None
+        self._mmap = None
+        # byte offset of each line in the file, one more entry than file documents
+        self._offsets = array("Q", [0])
+
+    @classmethod
+    def open(cls, path: str, offsets: Optional[array] = None) -> "DocumentStore":
+        """
+        open a docs.jsonl file, line i of the file becomes internal doc id i
+        offsets of every line are found by scanning the file when not given
+        """
+        store = cls()
+        if offsets is None:
+            offsets = array("Q", [0])
+            with open(path, "rb") as f:
+                for line in f:
+                    offsets.append(offsets[-1] + len(line))
+        store._offsets = offsets
+
+        if os.path.getsize(path) > 0:
+            store._file = open(path, "rb")
+            store._mmap = mmap.mmap(store._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return store
+
+    @property
+    def file_count(self) -> int:
+        return len(self._offsets) - 1
+
+    def add(self, doc_id: int, doc: Document):
+        self._memory[doc_id] = doc
+
+    def remove(self, doc_id: int):
+        if self._memory.pop(doc_id, None) is None:
+            self._removed.add(doc_id)
+
+    def without(self, doc_ids: Iterable[int]) -> "DocumentStore":
+        """
+        copy with doc_ids removed, the documents file stays shared with this store
+        """
+        store = copy.copy(self)
+        store._memory = dict(self._memory)
+        store._removed = set(self._removed)
+        for doc_id in doc_ids:
+            store.remove(doc_id)
+        return store
+
+    def raw_json(self, doc_id: int) -> bytes:
+        """
+        document as one line of json without the trailing newline
+        """
+        doc = self._memory.get(doc_id)
+        if doc is not None:
+            return doc.model_dump_json().encode("utf-8")
+
+        if doc_id in self._removed or doc_id >= self.file_count:
+            raise KeyError(doc_id)
+        return self._mmap[self._offsets[doc_id] : self._offsets[doc_id + 1]].rstrip(
+            b"\r\n"
+        )
+
+    def __getitem__(self, doc_id: int) -> Document:
+        doc = self._memory.get(doc_id)
+        if doc is not None:
+            return doc
+        return Document.model_validate_json(self.raw_json(doc_id))
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+            self._file = None
+
+
+class DocumentsView(Mapping):
+    """
+    {document id: Document} view of a DocumentStore through the external to internal id table
+    """
+
+    def __init__(self, internal_ids: Mapping[str, int], store: DocumentStore):
+        self._internal_ids = internal_ids
+        self._store = store
+
+    def __getitem__(self, ext_id: str) -> Document:
+        return self._store[self._internal_ids[ext_id]]
+
+    def __contains__(self, ext_id) -> bool:
+        return ext_id in self._internal_ids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._internal_ids)
+
+    def __len__(self) -> int:
+        return len(self._internal_ids)
@@ -20,3 +20,11 @@ class QueryParseError(TextSearchPyError):
     """
 
     pass
+
+
+class QueryRejectedError(TextSearchPyError):
+    """
+    Query not accepted because too many queries are already pending
+    """
+
+    pass
@@ -1,48 +1,145 @@
+from array import array
+from bisect import bisect_left
+import collections.abc
+from concurrent.futures import ProcessPoolExecutor
 import json
 from pathlib import Path
-import re
-from typing import Dict, List, Optional, Set, Union
-from pydantic import BaseModel
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 import uuid
 import os
 import math
-from queue import PriorityQueue
+import threading
+import time
+from itertools import accumulate, islice
 import importlib.metadata
 
+from .analyzers import Analyzer
+from .cache import ResultCache
+from .collectors import TopNCollector
+from .docstore import Document, DocumentStore, DocumentsView
+from .plan import (
+    BooleanPlan,
+    PhrasePlan,
+    Plan,
+    PlanCache,
+    TermPlan,
+    WildcardPlan,
+    plan_query,
+    term_plan,
+)
+from .profile import QueryProfile
+from .stats import BM25, CorpusStats, PhraseKey
+from .terms import TermDictionary
+from .postings import (
+    CompressedPostings,
+    DocIdsView,
+    PackedPostings,
+    Postings,
+    gallop,
+    gallop_probes,
+    intersect_sorted,
+    multi_proximity_match_count,
+    pack_postings,
+    proximity_match_count,
+    unpack_postings,
+)
+from .storage import IndexFileReader, MappedPostings, write_index_file
 from .tokenizers import SimpleTokenizer, Tokenizer
 from .normalizers import TokenNormalizer, LowerCaseNormalizer
 from .query import (
-    BooleanQuery,
     Clause,
-    PhraseQuery,
     Query,
-    TermQuery,
-    WildcardQuery,
-    parse_query,
 )
 from .exception import TextSearchPyError, IndexingError
 
 
-class Document(BaseModel):
-    text: str
-    # metadata
-    id: Optional[str] = None
-    # document size post processing
-    count: Optional[int] = None
-    # query match score
-    score: Optional[float] = None
-
-
-class QueryResult(BaseModel):
+class QueryResult:
     """
     internal results for evaluating queries used to track metadata
+    a plain slots class, built at every level of query evaluation
     """
 
-    # set or list out of convenience, to avoid recreating objects
-    doc_ids: Union[Set[str], List[str]] = []
+    __slots__ = ("doc_ids", "match_score")
 
-    # track doc_id: match_score of each document
-    match_score: Optional[Dict[str, float]] = None
+    def __init__(
+        self,
+        doc_ids: Optional[Sequence[int]] = None,
+        match_score: Optional[Dict[int, float]] = None,
+    ):
+        # internal doc ids sorted ascending, so results can be merged with sorted intersections
+        self.doc_ids: Sequence[int] = doc_ids if doc_ids is not None else []
+        # track doc_id: match_score of each document
+        self.match_score = match_score
+
+
+# deleted documents stay in postings until they exceed this share of indexed documents
+_COMPACT_DELETED_RATIO = 0.25
+
+# documents read and analyzed together by append and the streaming loaders
+_ANALYZE_BATCH_SIZE = 256
+
+# upper bounds are inflated slightly so float rounding never prunes a qualifying document
+_UPPER_BOUND_SLACK = 1 + 1e-9
+
+
+def _add_postings(
+    positional_index: MutableMapping[str, Postings],
+    doc_id: int,
+    tokens: List[str],
+    terms: Optional[TermDictionary] = None,
+    postings_class: Type[Postings] = Postings,
+) -> Dict[str, List[int]]:
+    # group positions per token first so each posting list is touched once per document
+    doc_positions: Dict[str, List[int]] = {}
+    for tok_i, tok in enumerate(tokens):
+        if tok in doc_positions:
+            doc_positions[tok].append(tok_i)
+        else:
+            doc_positions[tok] = [tok_i]
+
+    for tok, positions in doc_positions.items():
+        postings = positional_index.get(tok)
+        if postings is None:
+            postings = postings_class()
+            positional_index[tok] = postings
+            if terms is not None:
+                terms.add(tok)
+        postings.add(doc_id, positions, len(tokens))
+
+    return doc_positions
+
+
+def _index_batch(
+    tokenizer: Tokenizer,
+    token_normalizers: List[TokenNormalizer],
+    texts: List[str],
+    first_doc_id: int,
+) -> Tuple[array, PackedPostings]:
+    """
+    token counts and packed postings of texts numbered from first_doc_id,
+    run in worker processes
+    """
+    analyzer = Analyzer(tokenizer, token_normalizers)
+    doc_lengths = array("I")
+    positional_index: Dict[str, Postings] = {}
+    for i, tokens in enumerate(analyzer.analyze_batch(texts)):
+        doc_lengths.append(len(tokens))
+        if tokens:
+            _add_postings(positional_index, first_doc_id + i, tokens)
+    return doc_lengths, pack_postings(positional_index)
 
 
 class Index:
@@ -50,160 +147,814 @@ class Index:
         self,
         token_normalizers: List[TokenNormalizer] = [LowerCaseNormalizer()],
         tokenizer: Tokenizer = SimpleTokenizer(),
+        kgram_size: Optional[int] = None,
+        result_cache_bytes: Optional[int] = None,
+        compress_positions: bool = False,
     ):
-        self.token_normalizers: List[TokenNormalizer] = token_normalizers
-        self.tokenizer: Tokenizer = tokenizer
-
-        # {token: doc_id}
-        self.inverted_index: Dict[str, List[str]] = {}
-        self.documents: Dict[str, Document] = {}
-        # {token: {doc_id: [token_index]}}
-        self.positional_index: Dict[str, Dict[str, List[int]]] = {}
+        """
+        kgram_size enables a k-gram index over terms, so wildcards without a literal
+        prefix (i.e. *tion) avoid scanning every term
+        result_cache_bytes enables a ResultCache of about that size, repeated queries are
+        then answered without evaluating them until the index changes
+        compress_positions stores positions as varint encoded gaps (CompressedPostings),
+        using several times less memory at some cost to phrase queries, postings read
+        from a binary index file keep the plain layout of the file
+        """
+        # tokenizer and normalizers compiled into a single pass, documents and queries
+        # are both analyzed through it
+        self.analyzer = Analyzer(tokenizer, token_normalizers)
+        self.kgram_size = kgram_size
+        self.compress_positions = compress_positions
+        self._postings_class = CompressedPostings if compress_positions else Postings
+
+        # documents are referenced internally by a dense integer id assigned in append order
+        # the external Document.id is only kept in these side tables, _doc_ids keeps the
+        # ids of deleted documents while _internal_ids only holds live documents
+        self._doc_ids: List[str] = []
+        self._internal_ids: Dict[str, int] = {}
+        # token count of each document by internal id
+        self._doc_lengths = array("I")
+        # internal ids in delete order, and by internal id the 1 based position of the
+        # document in _deletions or 0 while it is live, both are only appended to or set
+        # once, so snapshots share them and only see the first _delete_limit deletes
+        self._deletions = array("I")
+        self._deleted_at = array("I")
+        self._delete_limit = 0
+        # deletes before this position in _deletions are removed from postings by compact
+        self._compacted = 0
+        # {token: (visible postings length, live document frequency)}, only used while
+        # there are deleted documents, an entry is stale once the postings grew
+        self._live_dfs: Dict[str, Tuple[int, int]] = {}
+
+        # documents by internal id, loaded documents are only parsed when accessed
+        self._doc_store = DocumentStore()
+        # {token: Postings}, Postings maps internal doc_id -> array of token_index
+        # after loading a binary index file this is a MappedPostings decoding postings on access
+        self.positional_index: MutableMapping[str, Postings] = {}
+        # sorted view of positional_index keys, built on the first lookup that needs it
+        self._terms: Optional[TermDictionary] = None
+        # open binary index file backing positional_index
+        self._index_file: Optional[IndexFileReader] = None
 
         # tracked to calculate bm25 score avg doc length
         self.total_tokens = 0
+        # scorer for the current document count and total_tokens, replaced once they change
+        self._bm25: Optional[BM25] = None
+
+        # compiled plans of recent query strings
+        self.plan_cache = PlanCache()
+
+        # bumped on every change to the indexed documents, cached results of an older
+        # generation are never served
+        self._generation = 0
+        self.result_cache: Optional[ResultCache] = None
+        if result_cache_bytes:
+            self.result_cache = ResultCache(result_cache_bytes)
+
+        # {phrase key: (doc ids, match counts)} when set, phrases are matched once and the
+        # matches reused, i.e. between the statistics and scoring passes of a ShardedIndex
+        self._phrase_matches: Optional[Dict[PhraseKey, Tuple[List[int], Dict]]] = None
+
+        # writers hold the lock and publish an IndexSnapshot once their change is complete,
+        # searches read the published snapshot without locking
+        self._write_lock = threading.RLock()
+        # internal ids from this one up were added after the snapshot, None when unbounded
+        self._doc_limit: Optional[int] = None
+        self._reader: IndexSnapshot
+        self._publish()
 
     def __len__(self):
-        return len(self.documents)
+        return len(self._internal_ids)
+
+    def _publish(self):
+        """
+        make the current state the version searched by readers
+        """
+        self._reader = IndexSnapshot(self)
+
+    def snapshot(self) -> "IndexSnapshot":
+        """
+        point in time reader, later appends, deletes and compactions do not change its results
+        """
+        return self._reader
+
+    @property
+    def documents(self) -> Mapping[str, Document]:
+        """
+        {document id: Document}
+        """
+        return DocumentsView(self._internal_ids, self._doc_store)
+
+    @property
+    def tokenizer(self) -> Tokenizer:
+        """
+        read only, the analyzer is compiled from it at construction
+        """
+        return self.analyzer.tokenizer
+
+    @property
+    def token_normalizers(self) -> List[TokenNormalizer]:
+        """
+        copy of the normalizers the analyzer was compiled from, changing it has no effect
+        """
+        return list(self.analyzer.token_normalizers)
+
+    @property
+    def inverted_index(self) -> Mapping[str, array]:
+        """
+        {token: array of internal doc_id}, sorted ascending since ids are assigned in order
+        """
+        return DocIdsView(self.positional_index)
 
     def _add_to_index(self, doc: Document, tokens: List[str]):
         if doc.id is None:
             raise ValueError("Document ID cannot be None")
 
-        self.documents[doc.id] = doc
+        doc_id = len(self._doc_ids)
+        self._generation += 1
+        self._doc_ids.append(doc.id)
+        self._internal_ids[doc.id] = doc_id
+        self._doc_lengths.append(len(tokens))
+        self._deleted_at.append(0)
+        self._doc_store.add(doc_id, doc)
 
         if tokens:
-            for tok_i, tok in enumerate(tokens):
-                # add to inverted index, first check if doc id already has been recorded in positional index to avoid dupe ids
-                # TODO think about if inverted_index is needed vs using positional index only
-                if (
-                    tok not in self.positional_index
-                    or doc.id not in self.positional_index[tok]
-                ):
-                    if tok in self.inverted_index:
-                        self.inverted_index[tok].append(doc.id)
-                    else:
-                        self.inverted_index[tok] = [doc.id]
-
-                # add to positional index
-                if tok not in self.positional_index:
-                    self.positional_index[tok] = {}
-
-                if doc.id in self.positional_index[tok]:
-                    self.positional_index[tok][doc.id].append(tok_i)
-                else:
-                    self.positional_index[tok][doc.id] = [tok_i]
-
+            _add_postings(
+                self.positional_index,
+                doc_id,
+                tokens,
+                self._terms,
+                self._postings_class,
+            )
             self.total_tokens += len(tokens)
 
-    def _normalize_tokens(self, tokens: List[str]):
-        if not self.token_normalizers:
-            return tokens
-
-        for normalizer in self.token_normalizers:
-            tokens = normalizer.normalize(tokens)
+    def text_to_index_tokens(self, text: str) -> List[str]:
+        return self.analyzer.analyze(text)
 
-        return tokens
+    def append(
+        self,
+        docs: Iterable[Union[str, Document]],
+        batch_size: int = _ANALYZE_BATCH_SIZE,
+    ):
+        """
+        docs can be any iterable or generator, it is consumed batch_size documents at a time
+        """
+        docs = iter(docs)
+        while True:
+            batch = [
+                Document(text=doc) if isinstance(doc, str) else doc
+                for doc in islice(docs, batch_size)
+            ]
+            if not batch:
+                break
+            token_lists = self.analyzer.analyze_batch([doc.text for doc in batch])
+            self._append_batch(batch, token_lists)
+
+    def _append_batch(self, docs: List[Document], token_lists: List[List[str]]):
+        """
+        add analyzed documents and publish them together
+        """
+        with self._write_lock:
+            try:
+                for doc, tokens in zip(docs, token_lists):
+                    self._append_analyzed(doc, tokens)
+            finally:
+                self._publish()
+
+    def append_jsonl(self, path: str, batch_size: int = _ANALYZE_BATCH_SIZE):
+        """
+        append the Document on each line of a jsonl file, i.e. {"text": "...", "id": "..."}
+        the file is read batch_size lines at a time
+        """
+
+        def read_documents():
+            with open(path, "rb") as f:
+                for line in f:
+                    if line.strip():
+                        yield Document.model_validate_json(line)
+
+        self.append(read_documents(), batch_size)
+
+    def append_files(
+        self,
+        paths: Iterable[str],
+        encoding: str = "utf-8",
+        batch_size: int = _ANALYZE_BATCH_SIZE,
+    ):
+        """
+        append each file as one document with its path as id
+        files are read batch_size at a time
+        """
+
+        def read_documents():
+            for path in paths:
+                with open(path, "r", encoding=encoding) as f:
+                    yield Document(text=f.read(), id=str(path))
+
+        self.append(read_documents(), batch_size)
+
+    def _append_analyzed(self, doc: Document, tokens: List[str]):
+        doc.count = len(tokens)
+        if doc.id is not None:
+            if doc.id in self._internal_ids:
+                raise IndexingError(
+                    f"Attempting to add a Document with ID: {doc.id} already exists in index"
+                )
+        else:
+            doc_id = uuid.uuid4().hex
+            doc.id = doc_id
 
-    def text_to_index_tokens(self, text: str) -> List[str]:
-        tokens = self.tokenizer.tokenize(text)
-        tokens = self._normalize_tokens(tokens)
-        return tokens
+        self._add_to_index(doc, tokens)
 
-    def append(self, docs: List[Union[str, Document]]):
+    def bulk_append(
+        self,
+        docs: List[Union[str, Document]],
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ):
+        """
+        append with tokenization spread over a pool of worker processes
+        the index ends up the same as with append, including which documents are added
+        before an IndexingError is raised
+        workers defaults to the cpu count, tokenizer and normalizers have to be picklable
+        batch_size defaults to a few batches per worker, larger batches spend less time
+        merging postings in this process
+        """
+        with self._write_lock:
+            self._bulk_append(docs, workers, batch_size)
+
+    def _bulk_append(
+        self,
+        docs: List[Union[str, Document]],
+        workers: Optional[int],
+        batch_size: Optional[int],
+    ):
+        to_add = []
+        seen = set()
+        duplicate = None
         for doc in docs:
             if isinstance(doc, str):
                 doc = Document(text=doc)
 
-            tokens = self.text_to_index_tokens(doc.text)
-            doc.count = len(tokens)
             if doc.id is not None:
-                if doc.id in self.documents:
-                    raise IndexingError(
-                        f"Attempting to add a Document with ID: {doc.id} already exists in index"
-                    )
+                if doc.id in self._internal_ids or doc.id in seen:
+                    duplicate = doc.id
+                    break
+                seen.add(doc.id)
             else:
-                doc_id = uuid.uuid4().hex
-                doc.id = doc_id
+                doc.id = uuid.uuid4().hex
+            to_add.append(doc)
+
+        workers = workers or os.cpu_count() or 1
+        batch_size = batch_size or max(1, math.ceil(len(to_add) / (workers * 4)))
+
+        # internal ids are assigned up front so every batch can build final postings
+        first_doc_id = len(self._doc_ids)
+        batches = [
+            to_add[start : start + batch_size]
+            for start in range(0, len(to_add), batch_size)
+        ]
+        args = (
+            [self.analyzer.tokenizer] * len(batches),
+            [self.analyzer.token_normalizers] * len(batches),
+            [[doc.text for doc in batch] for batch in batches],
+            [first_doc_id + i * batch_size for i in range(len(batches))],
+        )
+
+        if workers == 1 or len(batches) <= 1:
+            results = map(_index_batch, *args)
+            self._merge_batches(batches, results)
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+                # map yields results in submission order, so batches merge deterministically
+                self._merge_batches(batches, pool.map(_index_batch, *args))
 
-            self._add_to_index(doc, tokens)
+        if duplicate is not None:
+            raise IndexingError(
+                f"Attempting to add a Document with ID: {duplicate} already exists in index"
+            )
 
-    def search(self, query: Union[Query, str]) -> List[Document]:
-        if isinstance(query, str):
-            query = parse_query(query)
+    def _merge_batches(
+        self,
+        batches: List[List[Document]],
+        results: Iterable[Tuple[array, PackedPostings]],
+    ):
+        for batch, (doc_lengths, packed_postings) in zip(batches, results):
+            self._generation += 1
+            for doc, doc_length in zip(batch, doc_lengths):
+                doc.count = doc_length
+                doc_id = len(self._doc_ids)
+                self._doc_ids.append(doc.id)
+                self._internal_ids[doc.id] = doc_id
+                self._doc_lengths.append(doc_length)
+                self._deleted_at.append(0)
+                self._doc_store.add(doc_id, doc)
+                self.total_tokens += doc_length
+
+            for tok, postings in unpack_postings(packed_postings):
+                target = self.positional_index.get(tok)
+                if target is None:
+                    if self.compress_positions:
+                        postings = CompressedPostings.from_postings(postings)
+                    self.positional_index[tok] = postings
+                    if self._terms is not None:
+                        self._terms.add(tok)
+                else:
+                    target.extend(postings)
+
+            self._publish()
+
+    def search(
+        self, query: Union[Query, str], profile: bool = False
+    ) -> Union[List[Document], Tuple[List[Document], QueryProfile]]:
+        """
+        with profile, returns (documents, QueryProfile) where the profile tree follows the
+        query clauses, profiled queries are always evaluated rather than read from the cache
+        """
+        reader = self._reader
+        plan = reader._plan(query)
+        if profile:
+            query_profile = QueryProfile(plan)
+            return reader._search(plan, query_profile), query_profile
+
+        if reader.result_cache is None:
+            return reader._search(plan)
+
+        key = (plan.key, "search")
+        docs = reader.result_cache.get(key, reader._generation)
+        if docs is None:
+            docs = reader._search(plan)
+            reader.result_cache.put(key, reader._generation, docs)
+        return docs
 
-        query_result = self._eval_query(query, score=False)
+    def _plan(self, query: Union[Query, str]) -> Plan:
+        return plan_query(query, self.analyzer.token_normalizers, self.plan_cache)
+
+    def _search(
+        self, plan: Plan, profile: Optional[QueryProfile] = None
+    ) -> List[Document]:
+        query_result = self._eval_plan(plan, score=False, profile=profile)
         doc_ids = query_result.doc_ids
 
-        docs = [self.documents[d_id] for d_id in doc_ids]
+        docs = [self._doc_store[d_id] for d_id in doc_ids]
 
         return docs
 
     def retrieve_top_n(
-        self, query: Union[Query, str], n: Optional[int] = None
-    ) -> List[Document]:
-        if isinstance(query, str):
-            query = parse_query(query)
+        self,
+        query: Union[Query, str],
+        n: Optional[int] = None,
+        search_after: Optional[Union[Document, Tuple[float, str]]] = None,
+        profile: bool = False,
+    ) -> Union[List[Document], Tuple[List[Document], QueryProfile]]:
+        """
+        returns matching documents ordered by score descending, ties ordered by index order
+
+        search_after takes the last Document (or its (score, id)) of the previous page
+        to return the n documents ranked after it
+
+        with profile, returns (documents, QueryProfile) as search does
+        """
+        reader = self._reader
+        plan = reader._plan(query)
+
+        after = None
+        if search_after is not None:
+            after = reader._resolve_cursor(search_after)
+
+        if profile:
+            query_profile = QueryProfile(plan)
+            collector = TopNCollector(n or None, after)
+            reader._collect_top_n(plan, collector, profile=query_profile)
+            return reader._scored_documents(collector.top_docs()), query_profile
+
+        key = None
+        if reader.result_cache is not None:
+            key = (plan.key, "top_n", n or None, after)
+            docs = reader.result_cache.get(key, reader._generation)
+            if docs is not None:
+                return docs
+
+        collector = TopNCollector(n or None, after)
+        reader._collect_top_n(plan, collector)
+
+        docs = reader._scored_documents(collector.top_docs())
+        if key is not None:
+            reader.result_cache.put(key, reader._generation, docs)
+        return docs
+
+    def _collect_top_n(
+        self,
+        plan: Plan,
+        collector: TopNCollector,
+        stats: Optional[CorpusStats] = None,
+        profile: Optional[QueryProfile] = None,
+    ):
+        disjunction = self._term_disjunction(plan) if collector.n else None
+        if disjunction is not None:
+            # pure term disjunctions can skip documents that cannot make the top n
+            start = time.perf_counter()
+            terms, excluded_plans = disjunction
+            term_profiles = None
+            excluded_profiles = [None] * len(excluded_plans)
+            if profile is not None:
+                term_profiles, excluded_profiles = self._disjunction_profiles(
+                    plan, profile
+                )
+
+            excluded = set()
+            for p, p_profile in zip(excluded_plans, excluded_profiles):
+                excluded.update(self._eval_node(p, False, None, p_profile).doc_ids)
 
-        query_result = self._eval_query(query, score=True)
-        queue = PriorityQueue()
+            self._max_score_collect(
+                terms, excluded, collector, stats, profile, term_profiles
+            )
+            if profile is not None:
+                profile.seconds = time.perf_counter() - start
+        else:
+            query_result = self._eval_plan(
+                plan, score=True, stats=stats, profile=profile
+            )
+            for doc_id, score in (query_result.match_score or {}).items():
+                collector.collect(doc_id, score)
+
+    def _disjunction_profiles(
+        self, plan: Plan, profile: QueryProfile
+    ) -> Tuple[List[QueryProfile], List[QueryProfile]]:
+        """
+        profiles of the SHOULD terms and MUST_NOT plans of _term_disjunction(plan),
+        children of profile in clause order as when the plan is evaluated exhaustively
+        """
+        profile.pruned = True
+        if isinstance(plan, TermPlan):
+            return ([profile] if plan.term is not None else []), []
+
+        term_profiles = []
+        excluded_profiles = []
+        for clause, sub_plan in plan.clauses:
+            child = profile.child(sub_plan, clause)
+            if clause == Clause.MUST_NOT:
+                excluded_profiles.append(child)
+            else:
+                child.pruned = True
+                if sub_plan.term is not None:
+                    term_profiles.append(child)
+        return term_profiles, excluded_profiles
+
+    def _query_stats(self, plan: Plan) -> CorpusStats:
+        """
+        corpus statistics of this index for every term and phrase scored by plan
+        """
+        stats = CorpusStats(len(self), self.total_tokens)
+        self._collect_query_stats(plan, stats)
+        return stats
+
+    def _collect_query_stats(self, plan: Plan, stats: CorpusStats):
+        # mirrors how _eval_plan expands each plan type
+        if isinstance(plan, BooleanPlan):
+            for _, sub_plan in plan.clauses:
+                self._collect_query_stats(sub_plan, stats)
+
+        elif isinstance(plan, TermPlan):
+            if plan.term is not None:
+                postings = self.positional_index.get(plan.term)
+                stats.term_dfs[plan.term] = (
+                    self._doc_freq(plan.term, postings) if postings else 0
+                )
 
-        for doc_id, score in query_result.match_score.items():
-            queue.put((score, doc_id))
+        elif isinstance(plan, PhrasePlan):
+            stats.phrase_dfs[plan.key] = len(self._eval_plan(plan, score=False).doc_ids)
 
-            if n and queue.qsize() > n:
-                queue.get()
+        elif isinstance(plan, WildcardPlan):
+            for tok in self._wildcard_terms(plan):
+                self._collect_query_stats(
+                    term_plan(self.analyzer.token_normalizers, tok), stats
+                )
 
-        result = []
-        while not queue.empty():
-            score, doc_id = queue.get()
-            doc = self.documents[doc_id]
-            doc.score = score
-            result.insert(0, doc)
+    def _resolve_cursor(
+        self, search_after: Union[Document, Tuple[float, str]]
+    ) -> Tuple[float, int]:
+        if isinstance(search_after, Document):
+            score, ext_id = search_after.score, search_after.id
+        else:
+            score, ext_id = search_after
+
+        d_id = self._lookup(ext_id)
+        if score is None or d_id is None:
+            raise TextSearchPyError(
+                f"search_after requires a scored document in index, found: {ext_id}"
+            )
+
+        return score, d_id
+
+    def _scored_documents(self, scored: List[Tuple[float, int]]) -> List[Document]:
+        # scored copies are returned so a score stays attached to the page it came from
+        return [
+            self._doc_store[doc_id].model_copy(update={"score": score})
+            for score, doc_id in scored
+        ]
+
+    def _term_disjunction(self, plan: Plan) -> Optional[Tuple[List[str], List[Plan]]]:
+        """
+        if plan is a single term or a boolean of SHOULD terms with optional MUST_NOT clauses,
+        returns the normalized SHOULD terms in clause order and the MUST_NOT plans
+        """
+        if isinstance(plan, TermPlan):
+            should_plans = [plan]
+            excluded_plans = []
+        elif isinstance(plan, BooleanPlan):
+            should_plans = []
+            excluded_plans = []
+            for clause, sub_plan in plan.clauses:
+                if clause == Clause.SHOULD and isinstance(sub_plan, TermPlan):
+                    should_plans.append(sub_plan)
+                elif clause == Clause.MUST_NOT:
+                    excluded_plans.append(sub_plan)
+                else:
+                    return None
+        else:
+            return None
+
+        # a term removed by normalization matches nothing, same as TermPlan evaluation
+        terms = [p.term for p in should_plans if p.term is not None]
+
+        return terms, excluded_plans
 
-        return result
+    def _max_score_collect(
+        self,
+        terms: List[str],
+        excluded: Set[int],
+        collector: TopNCollector,
+        stats: Optional[CorpusStats] = None,
+        profile: Optional[QueryProfile] = None,
+        term_profiles: Optional[List[QueryProfile]] = None,
+    ):
+        """
+        collect a disjunction of terms with MaxScore dynamic pruning, the collector ends up
+        with the same hits as when every matching document is scored
+
+        terms are ordered by their score upper bound, once the current top n threshold exceeds
+        the summed bounds of the lowest terms, those terms no longer drive candidate selection
+        and are only probed for documents that can still make the top n
+
+        profile is the whole disjunction and term_profiles[i] the profile of terms[i]
+        """
+        # [upper bound, clause index, postings, doc frequency, cursor, visible doc ids,
+        # documents scored, postings read]
+        cursors = []
+        bm25 = self._scorer(stats)
+        for clause_i, term in enumerate(terms):
+            postings = self.positional_index.get(term)
+            if postings is None:
+                continue
+            df = self._doc_freq(term, postings)
+            if stats is not None:
+                df = stats.term_dfs.get(term, df)
+            # every posting of the term is a pending delete
+            if df == 0:
+                continue
+            upper_bound = (
+                bm25.score(postings.max_tf, df, postings.min_doc_length)
+                * _UPPER_BOUND_SLACK
+            )
+            doc_ids = self._visible(postings.doc_ids)
+            cursors.append([upper_bound, clause_i, postings, df, 0, doc_ids, 0, 0])
+
+        cursors.sort(key=lambda c: c[0])
+        # bounds[i] is the best possible score from cursors[0..i] combined
+        bounds = list(accumulate(c[0] for c in cursors))
+
+        threshold = None
+        first_essential = 0
+        doc_lengths = self._doc_lengths
+        deleted_at = self._deleted_at
+        delete_limit = self._delete_limit
+        visited = 0
+        scored = 0
+
+        while first_essential < len(cursors):
+            essential = cursors[first_essential:]
+
+            doc_id = None
+            for c in essential:
+                doc_ids = c[5]
+                if c[4] < len(doc_ids) and (doc_id is None or doc_ids[c[4]] < doc_id):
+                    doc_id = doc_ids[c[4]]
+            if doc_id is None:
+                break
+
+            doc_len = doc_lengths[doc_id]
+            contributions = {}
+            for c in essential:
+                doc_ids = c[5]
+                pos = c[4]
+                if pos < len(doc_ids) and doc_ids[pos] == doc_id:
+                    offsets = c[2].offsets
+                    tf = offsets[pos + 1] - offsets[pos]
+                    contributions[c[1]] = bm25.score(tf, c[3], doc_len)
+                    c[4] = pos + 1
+                    c[6] += 1
+                    c[7] += 1
+
+            if doc_id in excluded or 0 < deleted_at[doc_id] <= delete_limit:
+                continue
+            visited += 1
+
+            # doc ids are visited in increasing order and ties go to the smaller doc id,
+            # so once the collector is full a document has to score above the threshold
+            if threshold is not None:
+                remaining = bounds[first_essential - 1] if first_essential else 0
+                if sum(contributions.values()) + remaining <= threshold:
+                    continue
+
+            for i in range(first_essential - 1, -1, -1):
+                c = cursors[i]
+                doc_ids = c[5]
+                if profile is None:
+                    pos = gallop(doc_ids, doc_id, c[4])
+                else:
+                    pos, probes = gallop_probes(doc_ids, doc_id, c[4])
+                    c[7] += probes
+                c[4] = pos
+                if pos < len(doc_ids) and doc_ids[pos] == doc_id:
+                    offsets = c[2].offsets
+                    tf = offsets[pos + 1] - offsets[pos]
+                    contributions[c[1]] = bm25.score(tf, c[3], doc_len)
+                    c[6] += 1
+
+            # summed in clause order to reproduce the exhaustive score exactly
+            scored += 1
+            doc_score = 0
+            for clause_i in sorted(contributions):
+                doc_score += contributions[clause_i]
+
+            if not collector.collect(doc_id, doc_score):
+                continue
+
+            threshold = collector.threshold
+            if threshold is not None:
+                while (
+                    first_essential < len(cursors)
+                    and bounds[first_essential] <= threshold
+                ):
+                    first_essential += 1
+
+        if profile is not None:
+            # entries stepped over while the term drove candidates and entries compared
+            # while galloping to candidates of other terms
+            for c in cursors:
+                term_profile = term_profiles[c[1]]
+                term_profile.postings_scanned = c[7]
+                term_profile.docs_matched = term_profile.docs_scored = c[6]
+            profile.docs_matched = visited
+            profile.docs_scored = scored
 
     def delete(self, docs: List[Document] = None, ids: List[str] = None) -> int:
+        """
+        deleted documents are only marked in the live docs, they are dropped from postings
+        once enough deletes accumulate or compact is called
+        """
         if docs is None and ids is None:
             raise TextSearchPyError("docs or ids required to delete from index")
 
+        with self._write_lock:
+            return self._delete(docs, ids)
+
+    def _delete(self, docs: Optional[List[Document]], ids: Optional[List[str]]) -> int:
         ids_to_delete = []
         if docs:
             ids_to_delete = ids_to_delete + [
-                d.id for d in docs if d.id in self.documents
+                d.id for d in docs if d.id in self._internal_ids
             ]
 
         if ids:
-            ids_to_delete = ids_to_delete + [id for id in ids if id in self.documents]
-
-        # this doesn't seem very performant, could revisit to take advantage of bulk operations
-        for d_id in ids_to_delete:
-            doc = self.documents[d_id]
-
-            # parses doc.text to tokens to clean up index, the tokens are not saved due to memory cost
-            tokens = self.text_to_index_tokens(doc.text)
-            for tok in tokens:
-                if tok in self.inverted_index:
-                    # TODO should handle better?
-                    try:
-                        self.inverted_index[tok].remove(d_id)
-                    except ValueError:
-                        pass
-                    if len(self.inverted_index[tok]) == 0:
-                        del self.inverted_index[tok]
-                if tok in self.positional_index and d_id in self.positional_index[tok]:
-                    del self.positional_index[tok][d_id]
-                    if len(self.positional_index[tok]) == 0:
-                        del self.positional_index[tok]
-            self.total_tokens -= len(tokens)
-
-        # remove documents
-        for d_id in ids_to_delete:
-            del self.documents[d_id]
+            ids_to_delete = ids_to_delete + [
+                id for id in ids if id in self._internal_ids
+            ]
+
+        ids_to_delete = list(dict.fromkeys(ids_to_delete))
+        self._mark_deleted(ids_to_delete)
+
+        pending = self._delete_limit - self._compacted
+        if pending > _COMPACT_DELETED_RATIO * (len(self._internal_ids) + pending):
+            self.compact()
 
         return len(ids_to_delete)
 
-    def save(self, path: str, mkdir: bool = True) -> bool:
+    def _mark_deleted(self, ext_ids: List[str]):
+        if not ext_ids:
+            return
+        # deletes are appended to the shared log, published snapshots keep their own
+        # _delete_limit so they are unaffected, internal ids are not reused
+        deletions = self._deletions
+        deleted_at = self._deleted_at
+        for ext_id in ext_ids:
+            d_id = self._internal_ids[ext_id]
+            deletions.append(d_id)
+            deleted_at[d_id] = len(deletions)
+            # removed once logged, so a snapshot missing ext_id finds it in the log
+            del self._internal_ids[ext_id]
+            self.total_tokens -= self._doc_lengths[d_id]
+        self._delete_limit = len(deletions)
+        self._live_dfs = {}
+        self._generation += 1
+        self._publish()
+
+    def compact(self):
+        """
+        remove deleted documents from postings and the document store
+        postings and documents are copied without them, so published snapshots still see
+        the documents deleted after they were taken
+        """
+        with self._write_lock:
+            deleted = self._pending_deletes()
+            if not deleted:
+                return
+
+            live_docs = bytearray(b"\x01") * len(self._doc_ids)
+            for d_id in deleted:
+                live_docs[d_id] = 0
+            positional_index = {}
+            for tok, postings in self.positional_index.items():
+                live_postings = postings.live_copy(live_docs)
+                if len(live_postings):
+                    positional_index[tok] = live_postings
+
+            self.positional_index = positional_index
+            if self._terms is not None:
+                self._terms = TermDictionary(
+                    positional_index.keys(), kgram_size=self.kgram_size
+                )
+            self._doc_store = self._doc_store.without(deleted)
+
+            self._compacted = self._delete_limit
+            self._live_dfs = {}
+            self._publish()
+
+    def _visible(self, doc_ids: Sequence[int]) -> Sequence[int]:
+        """
+        sorted doc_ids without the documents added after this snapshot
+        """
+        limit = self._doc_limit
+        if limit is None:
+            return doc_ids
+        # sliced even when every id is below the limit, postings arrays are appended to
+        # while the snapshot reads them
+        return doc_ids[: bisect_left(doc_ids, limit)]
+
+    def _live(self, doc_ids: List[int]) -> List[int]:
+        doc_ids = self._visible(doc_ids)
+        if self._delete_limit == self._compacted:
+            return doc_ids
+        deleted_at = self._deleted_at
+        limit = self._delete_limit
+        return [d for d in doc_ids if not 0 < deleted_at[d] <= limit]
+
+    def _is_live(self, d_id: int) -> bool:
+        deleted = self._deleted_at[d_id]
+        return not deleted or deleted > self._delete_limit
+
+    def _pending_deletes(self) -> Sequence[int]:
+        """
+        internal ids deleted but still in postings, as seen by this index or snapshot
+        """
+        return self._deletions[self._compacted : self._delete_limit]
+
+    def _lookup(self, ext_id: str) -> Optional[int]:
+        return self._internal_ids.get(ext_id)
+
+    def _doc_freq(self, term: str, postings: Postings) -> int:
+        """
+        number of live documents in postings of term
+        """
+        doc_ids = self._visible(postings.doc_ids)
+        if self._delete_limit == self._compacted:
+            return len(doc_ids)
+
+        cached = self._live_dfs.get(term)
+        if cached is not None and cached[0] == len(doc_ids):
+            return cached[1]
+
+        # count from whichever side is smaller, the postings or the deleted ids
+        if len(doc_ids) <= self._delete_limit - self._compacted:
+            df = sum(1 for d in doc_ids if self._is_live(d))
+        else:
+            df = len(doc_ids) - sum(1 for d in self._pending_deletes() if d in postings)
+        self._live_dfs[term] = (len(doc_ids), df)
+        return df
+
+    def save(self, path: str, mkdir: bool = True, format: str = "json") -> bool:
+        """
+        format "json" writes index.json, "binary" writes index.bin which loads
+        without decoding postings up front
+        """
+        if format not in ("json", "binary"):
+            raise TextSearchPyError(f"unknown save format: {format}")
+
+        with self._write_lock:
+            return self._save(path, mkdir, format)
+
+    def _save(self, path: str, mkdir: bool, format: str) -> bool:
         if not os.path.exists(path) and mkdir:
             Path(path).mkdir(parents=True, exist_ok=True)
 
@@ -211,7 +962,9 @@ class Index:
             raise TextSearchPyError(f"save path: {path} should be a folder")
 
         document_file_path = os.path.join(path, "docs.jsonl")
-        index_file_path = os.path.join(path, "index.json")
+        index_file_path = os.path.join(
+            path, "index.json" if format == "json" else "index.bin"
+        )
 
         # fetch the version of the package
         version_string = importlib.metadata.version("textsearchpy")
@@ -221,134 +974,329 @@ class Index:
         if os.path.exists(index_file_path):
             raise TextSearchPyError(f"{index_file_path} already exists")
 
-        with open(document_file_path, "w") as doc_file:
-            for d in self.documents.values():
-                json.dump(d.model_dump(), doc_file)
-                doc_file.write("\n")
+        # deleted documents are dropped from postings before writing them
+        self.compact()
+
+        # documents are written in internal id order, recording the offset of each line
+        live_doc_ids = []
+        doc_offsets = array("Q", [0])
+        with open(document_file_path, "wb") as doc_file:
+            for d_id, ext_id in enumerate(self._doc_ids):
+                if self._deleted_at[d_id]:
+                    continue
+                live_doc_ids.append(ext_id)
+                doc_file.write(self._doc_store.raw_json(d_id))
+                doc_file.write(b"\n")
+                doc_offsets.append(doc_file.tell())
+
+        metadata = {
+            "version": version_string,
+            "token_normalizers": [t.__class__.__name__ for t in self.token_normalizers],
+            "tokenizer": self.tokenizer.__class__.__name__,
+        }
+
+        if format == "binary":
+            self._save_binary(index_file_path, metadata, live_doc_ids, doc_offsets)
+            return True
 
         with open(index_file_path, "w") as index_file:
             file_body = {
-                "version": version_string,
-                "token_normalizers": [
-                    t.__class__.__name__ for t in self.token_normalizers
-                ],
-                "tokenizer": self.tokenizer.__class__.__name__,
-                "inverted_index": self.inverted_index,
-                "positional_index": self.positional_index,
+                **metadata,
+                # saved with external document ids so the file is independent of internal ids
+                "inverted_index": {
+                    tok: [self._doc_ids[d_id] for d_id in doc_ids]
+                    for tok, doc_ids in self.inverted_index.items()
+                },
+                "positional_index": {
+                    tok: {
+                        self._doc_ids[d_id]: positions.tolist()
+                        for d_id, positions in postings.items()
+                    }
+                    for tok, postings in self.positional_index.items()
+                },
             }
             json.dump(file_body, index_file)
 
         return True
 
+    def _save_binary(
+        self,
+        index_file_path: str,
+        metadata: Dict,
+        live_doc_ids: List[str],
+        doc_offsets: array,
+    ):
+        # internal ids left unused by deletes are closed up so the file ids are dense
+        doc_id_map = None
+        doc_lengths = self._doc_lengths
+        if len(live_doc_ids) != len(self._doc_ids):
+            doc_id_map = array("I", [0] * len(self._doc_ids))
+            doc_lengths = array("I")
+            for d_id, ext_id in enumerate(self._doc_ids):
+                if not self._deleted_at[d_id]:
+                    doc_id_map[d_id] = len(doc_lengths)
+                    doc_lengths.append(self._doc_lengths[d_id])
+
+        write_index_file(
+            index_file_path,
+            {**metadata, "total_tokens": self.total_tokens},
+            live_doc_ids,
+            doc_lengths,
+            self.positional_index,
+            doc_id_map,
+            doc_offsets,
+        )
+
     def load_from_file(self, path: str) -> bool:
+        """
+        replaces the content of the index, files of the previous content are closed so
+        snapshots taken before loading should no longer be searched
+        """
         if not os.path.exists(path) or not os.path.isdir(path):
             raise TextSearchPyError(f"{path} directory not found")
 
+        with self._write_lock:
+            loaded = self._load(path)
+            self._publish()
+        return loaded
+
+    def _load(self, path: str) -> bool:
         document_file_path = os.path.join(path, "docs.jsonl")
         index_file_path = os.path.join(path, "index.json")
+        binary_index_file_path = os.path.join(path, "index.bin")
+
+        if os.path.exists(binary_index_file_path):
+            return self._load_binary(binary_index_file_path, document_file_path)
 
         with open(index_file_path, "r") as f:
             # TODO may want to validate tokenizer + normalizer set up against file
             loaded_index = json.load(f)
 
-        self.inverted_index = loaded_index["inverted_index"]
-        self.positional_index = loaded_index["positional_index"]
-
-        saved_docs = {}
-        with open(document_file_path, "r") as f:
+        self._close_index_file()
+        self._generation += 1
+        self._doc_ids = []
+        self._internal_ids = {}
+        self._doc_lengths = array("I")
+        self._deletions = array("I")
+        self._delete_limit = 0
+        self._compacted = 0
+        self._live_dfs = {}
+        self.total_tokens = 0
+        # only id and count are kept, the document store reads documents back by offset
+        doc_offsets = array("Q", [0])
+        with open(document_file_path, "rb") as f:
             for line in f:
-                doc = Document.model_validate(json.loads(line))
-                saved_docs[doc.id] = doc
-
-        self.documents = saved_docs
+                doc = json.loads(line)
+                self._internal_ids[doc["id"]] = len(self._doc_ids)
+                self._doc_ids.append(doc["id"])
+                self._doc_lengths.append(doc.get("count") or 0)
+                self.total_tokens += doc.get("count") or 0
+                doc_offsets.append(doc_offsets[-1] + len(line))
+        self._doc_store = DocumentStore.open(document_file_path, doc_offsets)
+        self._deleted_at = array("I", bytes(4 * len(self._doc_ids)))
+
+        internal_ids = self._internal_ids
+        self.positional_index = {}
+        self._terms = None
+        for tok, saved_postings in loaded_index["positional_index"].items():
+            postings = self._postings_class()
+            for d_id, ext_id in sorted(
+                (internal_ids[ext_id], ext_id) for ext_id in saved_postings
+            ):
+                postings.add(d_id, saved_postings[ext_id], self._doc_lengths[d_id])
+            self.positional_index[tok] = postings
 
         return True
 
-    def _eval_query(self, query: Query, score: bool) -> QueryResult:
-        if isinstance(query, BooleanQuery):
-            and_set = None
-            or_set = set()
-            not_set = set()
+    def _load_binary(self, index_file_path: str, document_file_path: str) -> bool:
+        reader = IndexFileReader(index_file_path)
+
+        self._close_index_file()
+        self._generation += 1
+        self._index_file = reader
+        self.positional_index = MappedPostings(reader)
+        self._terms = None
+        self._doc_lengths = reader.doc_lengths()
+        self._doc_ids = list(reader.doc_ids())
+        self._internal_ids = {ext_id: d_id for d_id, ext_id in enumerate(self._doc_ids)}
+        self._deletions = array("I")
+        self._deleted_at = array("I", bytes(4 * len(self._doc_ids)))
+        self._delete_limit = 0
+        self._compacted = 0
+        self._live_dfs = {}
+        self.total_tokens = reader.metadata["total_tokens"]
+        self._doc_store = DocumentStore.open(document_file_path, reader.doc_offsets())
 
-            match_score = {}
+        return True
 
-            for clause in query.clauses:
-                query = clause.query
-                query_condition = clause.clause
+    def _close_index_file(self):
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+        self._doc_store.close()
 
-                sub_query_result = self._eval_query(query, score)
+    def _eval_plan(
+        self,
+        plan: Plan,
+        score: bool,
+        stats: Optional[CorpusStats] = None,
+        profile: Optional[QueryProfile] = None,
+    ) -> QueryResult:
+        """
+        stats replaces this index's own corpus statistics when scoring
+        profile, when given, is filled in with the timing and counters of plan
+
+        documents deleted but not yet compacted are only removed from the result of the
+        whole plan, clauses are combined on the postings as they are
+        """
+        query_result = self._eval_node(plan, score, stats, profile)
+        if self._delete_limit == self._compacted:
+            return query_result
+
+        deleted_at = self._deleted_at
+        limit = self._delete_limit
+        doc_ids = [d for d in query_result.doc_ids if not 0 < deleted_at[d] <= limit]
+        match_score = query_result.match_score
+        if match_score:
+            match_score = {d: match_score[d] for d in doc_ids if d in match_score}
+        if profile is not None:
+            profile.docs_matched = len(doc_ids)
+            if score and match_score:
+                profile.docs_scored = len(match_score)
+        return QueryResult(doc_ids=doc_ids, match_score=match_score)
+
+    def _eval_node(
+        self,
+        plan: Plan,
+        score: bool,
+        stats: Optional[CorpusStats],
+        profile: Optional[QueryProfile],
+    ) -> QueryResult:
+        if profile is None:
+            return self._evaluate(plan, score, stats, None)
+
+        start = time.perf_counter()
+        query_result = self._evaluate(plan, score, stats, profile)
+        profile.seconds = time.perf_counter() - start
+        profile.docs_matched = len(query_result.doc_ids)
+        if score and query_result.match_score:
+            profile.docs_scored = len(query_result.match_score)
+        return query_result
+
+    def _evaluate(
+        self,
+        plan: Plan,
+        score: bool,
+        stats: Optional[CorpusStats],
+        profile: Optional[QueryProfile],
+    ) -> QueryResult:
+        if isinstance(plan, BooleanPlan):
+            must_doc_ids = []
+            or_set = set()
+            not_set = set()
+            # match scores of the clauses contributing to the score, in clause order
+            clause_scores = []
+
+            for query_condition, sub_plan in plan.clauses:
+                sub_query_result = self._eval_node(
+                    sub_plan,
+                    score,
+                    stats,
+                    (
+                        profile.child(sub_plan, query_condition)
+                        if profile is not None
+                        else None
+                    ),
+                )
                 doc_ids = sub_query_result.doc_ids
 
                 if query_condition == Clause.MUST:
-                    if and_set is None:
-                        and_set = set(doc_ids)
-                    else:
-                        and_set = and_set.intersection(set(doc_ids))
-
-                    if score:
-                        for doc_id in and_set:
-                            match_score[doc_id] = (
-                                match_score.get(doc_id, 0)
-                                + sub_query_result.match_score[doc_id]
-                            )
+                    must_doc_ids.append(doc_ids)
+                    clause_scores.append(sub_query_result.match_score)
 
                 elif query_condition == Clause.SHOULD:
                     or_set.update(doc_ids)
 
-                    if score and and_set is None:
-                        for (
-                            d_id,
-                            sub_q_match_score,
-                        ) in sub_query_result.match_score.items():
-                            match_score[d_id] = (
-                                match_score.get(d_id, 0) + sub_q_match_score
-                            )
+                    # once a MUST clause is found later SHOULD clauses no longer count
+                    if not must_doc_ids:
+                        clause_scores.append(sub_query_result.match_score)
 
                 elif query_condition == Clause.MUST_NOT:
                     not_set.update(doc_ids)
 
             # if ANDs exists ORs are ignored
-            match_doc_ids = and_set if and_set is not None else or_set
-            match_doc_ids = match_doc_ids - not_set
+            if must_doc_ids:
+                # sub query doc_ids are sorted, intersect starting from the rarest clause
+                match_doc_ids = intersect_sorted(must_doc_ids)
+                if not_set:
+                    match_doc_ids = [d for d in match_doc_ids if d not in not_set]
+            else:
+                match_doc_ids = sorted(or_set - not_set)
+
+            match_score = {}
+            if score:
+                clause_scores = [c for c in clause_scores if c]
+                for doc_id in match_doc_ids:
+                    doc_score = 0
+                    for c in clause_scores:
+                        if doc_id in c:
+                            doc_score += c[doc_id]
+                    match_score[doc_id] = doc_score
+
             query_result = QueryResult(doc_ids=match_doc_ids, match_score=match_score)
             return query_result
 
-        elif isinstance(query, TermQuery):
-            # running same normalization on the search term to ensure consistency
-            query_tokens = self._normalize_tokens([query.term])
-            # TODO revisit: if normalization removes the token, consider no match
-            if len(query_tokens) == 0:
+        elif isinstance(plan, TermPlan):
+            # terms are normalized when the plan is compiled
+            query_term = plan.term
+            if query_term is None:
                 return QueryResult()
 
-            query_term = query_tokens[0]
+            postings = self.positional_index.get(query_term)
+            if postings is None:
+                return QueryResult()
 
-            doc_ids = self.inverted_index.get(query_term, [])
-            query_result = QueryResult(doc_ids=doc_ids)
+            # deleted documents are left in, _eval_plan drops them from the final result
+            visible_doc_ids = self._visible(postings.doc_ids)
+            if profile is not None:
+                profile.postings_scanned = len(visible_doc_ids)
+            query_result = QueryResult(doc_ids=visible_doc_ids)
             if score:
                 match_score = {}
-                for doc_id in doc_ids:
-                    term_freq = len(self.positional_index[query_term][doc_id])
-                    match_freq = len(doc_ids)
-                    token_len = self.documents[doc_id].count
-                    match_score[doc_id] = self._bm_25_score(
-                        term_freq, match_freq, token_len
+                if stats is not None and query_term in stats.term_dfs:
+                    match_freq = stats.term_dfs[query_term]
+                else:
+                    match_freq = self._doc_freq(query_term, postings)
+
+                bm25 = self._scorer(stats)
+                # same expression as BM25.score with the per term parts hoisted
+                idf = bm25.idf(match_freq)
+                k1_1 = bm25.k1 + 1
+                norms = bm25.norm
+                doc_lengths = self._doc_lengths
+                deleted_at = self._deleted_at
+                delete_limit = self._delete_limit
+                offsets = postings.offsets
+                # term frequencies come from the offsets, walked alongside doc ids
+                for i, doc_id in enumerate(visible_doc_ids):
+                    if 0 < deleted_at[doc_id] <= delete_limit:
+                        continue
+                    term_freq = offsets[i + 1] - offsets[i]
+                    match_score[doc_id] = (
+                        idf
+                        * (term_freq * k1_1)
+                        / (term_freq + norms(doc_lengths[doc_id]))
                     )
                 query_result.match_score = match_score
 
             return query_result
 
-        elif isinstance(query, PhraseQuery):
-            terms = self._normalize_tokens(query.terms)
-
-            if len(terms) == 1:
-                # if phrase query is normalized to 1 term, treat it like a TermQuery
-                return self._eval_query(TermQuery(term=terms[0]), score)
-            elif len(terms) == 0:
-                return QueryResult()
+        elif isinstance(plan, PhrasePlan):
+            terms = plan.terms
 
             # +1 to mimic edit distance instead of word distance i.e. "word1 word2" should be edit distance of 0, but word distance of 1
-            distance = query.distance + 1
-            ordered = query.ordered
+            distance = plan.distance + 1
+            ordered = plan.ordered
 
             postings = []
             for term in terms:
@@ -356,197 +1304,263 @@ class Index:
                     return QueryResult()
                 postings.append(self.positional_index[term])
 
-            doc_ids = []
-            match_score = {}
-            if len(terms) == 2:
+            matches = None
+            # matches are kept with their counts, so a later pass can score them
+            count = score or self._phrase_matches is not None
+            if self._phrase_matches is not None:
+                matches = self._phrase_matches.get(plan.key)
+
+            if matches is not None:
+                doc_ids, freq_map = matches
+            elif len(terms) == 2:
                 p1 = postings[0]
                 p2 = postings[1]
-                doc_ids, match_score = self._positional_intersect(
-                    p1, p2, distance, ordered, score
+                doc_ids, freq_map = self._positional_intersect(
+                    p1, p2, distance, ordered, count, profile
                 )
-            elif len(terms) > 2:
-                doc_ids, match_score = self._multi_term_positional_intersect(
-                    postings, distance, ordered, score
+            else:
+                doc_ids, freq_map = self._multi_term_positional_intersect(
+                    postings, distance, ordered, count, profile
                 )
+
+            if self._phrase_matches is not None:
+                self._phrase_matches[plan.key] = (doc_ids, freq_map)
+
+            match_score = {}
+            if score and freq_map:
+                # the number of documents matching the phrase stands in for term doc frequency
+                match_freq = len(doc_ids)
+                if stats is not None:
+                    match_freq = stats.phrase_dfs.get(plan.key, match_freq)
+                bm25 = self._scorer(stats)
+                for doc_id, term_freq in freq_map.items():
+                    match_score[doc_id] = bm25.score(
+                        term_freq, match_freq, self._doc_lengths[doc_id]
+                    )
+
             query_result = QueryResult(doc_ids=doc_ids, match_score=match_score)
             return query_result
-        elif isinstance(query, WildcardQuery):
-            if "?" not in query.term and "*" not in query.term:
-                # wildcard search not needed when wildcard symbol not present
-                return self._eval_query(TermQuery(term=query.term), score)
-
-            pattern = query.term.replace("?", ".")
-            pattern = pattern.replace("*", ".+")
-            re_pattern = re.compile(pattern)
+        elif isinstance(plan, WildcardPlan):
             doc_ids = set()
             match_score = None
-            for tok in self.positional_index.keys():
-                if re_pattern.fullmatch(tok):
-                    sub_query_result = self._eval_query(TermQuery(term=tok), score)
-                    doc_ids.update(sub_query_result.doc_ids)
-
-                    if score:
-                        if not match_score:
-                            match_score = sub_query_result.match_score
-
-                        else:
-                            for (
-                                d_id,
-                                sub_q_match_score,
-                            ) in sub_query_result.match_score.items():
-                                match_score[d_id] = (
-                                    match_score.get(d_id, 0) + sub_q_match_score
-                                )
-            query_result = QueryResult(doc_ids=doc_ids, match_score=match_score)
+            wildcard_terms = self._wildcard_terms(plan)
+            for tok in wildcard_terms:
+                sub_query_result = self._eval_node(
+                    term_plan(self.analyzer.token_normalizers, tok), score, stats, None
+                )
+                doc_ids.update(sub_query_result.doc_ids)
+
+                if score:
+                    if not match_score:
+                        match_score = sub_query_result.match_score
+
+                    else:
+                        for (
+                            d_id,
+                            sub_q_match_score,
+                        ) in sub_query_result.match_score.items():
+                            match_score[d_id] = (
+                                match_score.get(d_id, 0) + sub_q_match_score
+                            )
+            if profile is not None:
+                # expanded terms are counted on the wildcard node, not as children
+                profile.terms_expanded = len(wildcard_terms)
+                profile.postings_scanned = sum(
+                    len(self._visible(self.positional_index[tok].doc_ids))
+                    for tok in wildcard_terms
+                )
+            query_result = QueryResult(doc_ids=sorted(doc_ids), match_score=match_score)
             return query_result
         else:
             raise ValueError("Invalid Query type")
 
-    def _find_match_doc_ids(self, search_index, to_search_index):
-        match_doc_ids = []
-        for doc_id in search_index.keys():
-            if doc_id in to_search_index:
-                match_doc_ids.append(doc_id)
-        return match_doc_ids
+    def _wildcard_terms(self, plan: WildcardPlan) -> List[str]:
+        """
+        index terms matching the wildcard in sorted order, so match scores are summed in the
+        same order whatever order terms were added
+        """
+        terms = self._terms
+        if terms is None:
+            terms = self._term_dictionary()
+        candidates = terms.candidates(plan.pattern)
+
+        return [tok for tok in candidates if plan.regex.fullmatch(tok)]
+
+    def _term_dictionary(self) -> TermDictionary:
+        # built under the write lock, so no term is added while the keys are read
+        with self._write_lock:
+            if self._terms is None:
+                self._terms = TermDictionary(
+                    self.positional_index.keys(), kgram_size=self.kgram_size
+                )
+            return self._terms
 
     def _positional_intersect(
-        self, p1: Dict, p2: Dict, k: int, ordered: bool, score: bool
+        self,
+        p1: Postings,
+        p2: Postings,
+        k: int,
+        ordered: bool,
+        score: bool,
+        profile: Optional[QueryProfile] = None,
     ):
-        result = set()
+        result = []
 
-        # iterate through the rarer term to find matching documents
-        if len(p1.keys()) >= len(p2.keys()):
-            doc_ids = self._find_match_doc_ids(p2, p1)
-        else:
-            doc_ids = self._find_match_doc_ids(p1, p2)
+        # intersection is driven by the rarer term to find matching documents
+        doc_ids = self._live(intersect_sorted([p1.keys(), p2.keys()]))
 
+        positions_compared = 0
         freq_map = {}
         for doc_id in doc_ids:
-            temp = []
             positions1 = p1[doc_id]
             positions2 = p2[doc_id]
-
-            for pp1 in positions1:
-                for pp2 in positions2:
-                    # if phrase search is order sensitive, skip when term two position is before term one
-                    if ordered and pp2 < pp1:
-                        continue
-
-                    dis = abs(pp1 - pp2)
-                    # != 0 checks the token is not on the same position i.e. "word word" would match doc="word"
-                    if dis <= k and dis != 0:
-                        temp.append(pp2)
-                    elif pp2 > pp1:
-                        break
-
-                # this is here to allow saving of positions, should revisit in the future
-                # potentially could reduce extra processing if we don't need the matched token index
-                while len(temp) > 0 and abs(temp[0] - pp1) > k:
-                    temp.remove(temp[0])
-
-                for ps in temp:
-                    # for now just return doc_id for simplicity
-                    # result.append((doc_id, pp1, ps))
-                    result.add(doc_id)
-
-                # add in doc frequency matched, temp should be matched length
-                if score and len(temp) > 0:
-                    freq_map[doc_id] = freq_map.get(doc_id, 0) + len(temp)
-
-        match_score = {}
-        if score and freq_map:
-            for doc_id, term_freq in freq_map.items():
-                match_score[doc_id] = self._bm_25_score(
-                    term_freq, len(result), self.documents[doc_id].count
-                )
-
-        # should revisit to clean up algo so maybe we don't need to construct set to list here
-        # needed currently because matched doc_id can duplicate
-        return list(result), match_score
-
-    def _multi_term_match_doc_ids(self, postings: List[Dict]):
-        # start from the smallest candidate list to reduce search time
-        sorted_postings = sorted(postings, key=lambda x: len(x.keys()))
-        candidate = list(sorted_postings[0].keys())
-
-        for posting in sorted_postings[1:]:
-            candidate = [c for c in candidate if c in posting]
-
-        return candidate
+            if profile is not None:
+                positions_compared += len(positions1) + len(positions2)
+            match_count = proximity_match_count(positions1, positions2, k, ordered)
+            if match_count:
+                result.append(doc_id)
+                # add in doc frequency matched
+                if score:
+                    freq_map[doc_id] = match_count
+
+        if profile is not None:
+            self._profile_phrase(profile, [p1, p2], positions_compared)
+        # candidates are visited in doc id order so result is already sorted
+        return result, freq_map
 
     def _multi_term_positional_intersect(
-        self, postings: List[Dict], k: int, ordered: bool, score: bool
+        self,
+        postings: List[Postings],
+        k: int,
+        ordered: bool,
+        score: bool,
+        profile: Optional[QueryProfile] = None,
     ):
-        result_doc_ids = set()
+        result_doc_ids = []
 
-        doc_ids = self._multi_term_match_doc_ids(postings)
+        # start from the smallest candidate list to reduce search time
+        doc_ids = self._live(intersect_sorted([p.keys() for p in postings]))
 
+        positions_compared = 0
         freq_map = {}
         for doc_id in doc_ids:
-            positions1 = postings[0][doc_id]
-            positions2 = postings[1][doc_id]
-
-            for pp1 in positions1:
-                ranges = []
-                # initialize search ranges, similar to two term phrase query
-                for pp2 in positions2:
-                    if ordered and pp2 < pp1:
-                        continue
+            positions = [p[doc_id] for p in postings]
+            if profile is not None:
+                positions_compared += sum(len(pos) for pos in positions)
+            match_count = multi_proximity_match_count(positions, k, ordered)
+            if match_count:
+                result_doc_ids.append(doc_id)
+                if score:
+                    freq_map[doc_id] = match_count
+
+        if profile is not None:
+            self._profile_phrase(profile, postings, positions_compared)
+        return result_doc_ids, freq_map
+
+    def _profile_phrase(
+        self, profile: QueryProfile, postings: List[Postings], positions_compared: int
+    ):
+        # an upper bound, intersection gallops over the postings longer than the rarest
+        profile.postings_scanned = sum(len(self._visible(p.doc_ids)) for p in postings)
+        profile.positions_compared = positions_compared
+
+    def _scorer(self, stats: Optional[CorpusStats] = None) -> BM25:
+        """
+        bm25 scorer for stats, or for this index when stats is None
+        """
+        if stats is not None:
+            return stats.bm25()
+
+        doc_n = len(self)
+        bm25 = self._bm25
+        if (
+            bm25 is None
+            or bm25.doc_count != doc_n
+            or bm25.total_tokens != self.total_tokens
+        ):
+            bm25 = BM25(doc_n, self.total_tokens)
+            self._bm25 = bm25
+        return bm25
+
+
+class IndexSnapshot(Index):
+    """
+    read only view of an Index at the time it was published
+
+    the snapshot shares postings and documents with the index, appends only add internal
+    ids from doc_limit up which the snapshot skips, deletes are appended to a log the
+    snapshot reads up to delete_limit, compact replaces the tables it changes instead of
+    modifying them
+    """
+
+    def __init__(self, index: Index):
+        self.__dict__.update(index.__dict__)
+        self._index = index
+        self._doc_limit = len(index._doc_ids)
+        self._doc_count = len(index._internal_ids)
+        self._reader = self
 
-                    dis = abs(pp1 - pp2)
-                    if dis <= k and dis != 0:
-                        ranges.append((min(pp1, pp2), max(pp1, pp2)))
-                    elif pp2 > pp1:
-                        break
-
-                for index, postings_k in enumerate(postings[2:]):
-                    temp = []
-                    positions_k = postings_k[doc_id]
-
-                    for r in ranges:
-                        for pp_k in positions_k:
-                            if ordered and pp_k < r[1]:
-                                continue
-
-                            low = min(r[0], pp_k)
-                            high = max(r[1], pp_k)
-                            # - 1 - index subtracts the word distance count for matching tokens
-                            # this way converts word distance into 'edit distance'
-                            dis = high - low - 1 - index
-                            if dis <= k and dis != 0:
-                                temp.append((min(r[0], pp_k), max(r[1], pp_k)))
-                            elif pp_k > r[1]:
-                                break
-                    ranges = temp
-
-                if len(ranges) > 0:
-                    result_doc_ids.add(doc_id)
-
-                # ranges should represent all matches for starting position1
-                if score and len(ranges) > 0:
-                    freq_map[doc_id] = freq_map.get(doc_id, 0) + len(ranges)
-
-        match_score = {}
-        if score and freq_map:
-            for doc_id, term_freq in freq_map.items():
-                match_score[doc_id] = self._bm_25_score(
-                    term_freq, len(result_doc_ids), self.documents[doc_id].count
+    def __len__(self):
+        return self._doc_count
+
+    @property
+    def documents(self) -> Mapping[str, Document]:
+        return DocumentsView(_SnapshotIds(self), self._doc_store)
+
+    def _lookup(self, ext_id: str) -> Optional[int]:
+        d_id = self._internal_ids.get(ext_id)
+        if d_id is not None and d_id < self._doc_limit:
+            return d_id
+        # deleted since the snapshot was taken, possibly appended again with a new id
+        doc_ids = self._doc_ids
+        for d_id in self._deletions[self._delete_limit :]:
+            if doc_ids[d_id] == ext_id:
+                return d_id
+        return None
+
+    def _publish(self):
+        raise TextSearchPyError("IndexSnapshot is read only")
+
+    def _read_only(self, *args, **kwargs):
+        raise TextSearchPyError("IndexSnapshot is read only")
+
+    append = bulk_append = delete = compact = save = load_from_file = _read_only
+
+    def _term_dictionary(self) -> TermDictionary:
+        index = self._index
+        with index._write_lock:
+            if index.positional_index is self.positional_index:
+                # terms added since this snapshot have no postings below doc_limit
+                terms = index._term_dictionary()
+            else:
+                # compacted since, this snapshot's postings are no longer modified
+                terms = TermDictionary(
+                    self.positional_index.keys(), kgram_size=self.kgram_size
                 )
+        self._terms = terms
+        return terms
 
-        return list(result_doc_ids), match_score
 
-    def _bm_25_score(self, term_freq: int, match_freq: int, token_len: int):
-        # default following elastic search
-        k1 = 1.2
-        b = 0.75
+class _SnapshotIds(collections.abc.Mapping):
+    """
+    {document id: internal id} of the documents live in an IndexSnapshot
+    """
 
-        doc_n = len(self.documents)
+    def __init__(self, snapshot: IndexSnapshot):
+        self._snapshot = snapshot
 
-        idf = math.log((doc_n - match_freq + 0.5) / (match_freq + 0.5) + 1)
+    def __getitem__(self, ext_id: str) -> int:
+        d_id = self._snapshot._lookup(ext_id)
+        if d_id is None:
+            raise KeyError(ext_id)
+        return d_id
 
-        top_term = term_freq * (k1 + 1)
-        bot_term = term_freq + k1 * (
-            1 - b + b * token_len / (self.total_tokens / doc_n)
-        )
+    def __iter__(self) -> Iterator[str]:
+        snapshot = self._snapshot
+        doc_ids = snapshot._doc_ids
+        for d_id in range(snapshot._doc_limit):
+            if snapshot._is_live(d_id):
+                yield doc_ids[d_id]
 
-        return idf * top_term / bot_term
+    def __len__(self) -> int:
+        return len(self._snapshot)
@@ -0,0 +1,181 @@
+from collections import OrderedDict
+import re
+import threading
+from typing import List, Optional, Tuple, Union
+
+from .normalizers import TokenNormalizer
+from .query import (
+    BooleanQuery,
+    Clause,
+    PhraseQuery,
+    Query,
+    TermQuery,
+    WildcardQuery,
+    parse_query,
+)
+
+
+def normalize_tokens(
+    token_normalizers: List[TokenNormalizer], tokens: List[str]
+) -> List[str]:
+    if not token_normalizers:
+        return tokens
+
+    for normalizer in token_normalizers:
+        tokens = normalizer.normalize(tokens)
+
+    return tokens
+
+
+# every plan has a hashable key, equal for plans that evaluate the same way
+# i.e. "Fox  OR dog" and "fox OR dog"
+
+
+class TermPlan:
+    __slots__ = ("term", "key")
+
+    def __init__(self, term: Optional[str]):
+        # normalized term, None when normalization removed it and nothing can match
+        self.term = term
+        self.key = ("term", term)
+
+
+class PhrasePlan:
+    __slots__ = ("terms", "distance", "ordered", "key")
+
+    def __init__(self, terms: Tuple[str, ...], distance: int, ordered: bool):
+        # two or more normalized terms
+        self.terms = terms
+        self.distance = distance
+        self.ordered = ordered
+        # also identifies the phrase in CorpusStats.phrase_dfs
+        self.key = (terms, distance, ordered)
+
+
+class WildcardPlan:
+    __slots__ = ("pattern", "regex", "key")
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.regex = re.compile(pattern.replace("?", ".").replace("*", ".+"))
+        self.key = ("wildcard", pattern)
+
+
+class BooleanPlan:
+    __slots__ = ("clauses", "key")
+
+    def __init__(self, clauses: Tuple[Tuple[Clause, "Plan"], ...]):
+        self.clauses = clauses
+        self.key = ("boolean", tuple((c.value, p.key) for c, p in clauses))
+
+
+Plan = Union[TermPlan, PhrasePlan, WildcardPlan, BooleanPlan]
+
+
+def term_plan(token_normalizers: List[TokenNormalizer], term: str) -> TermPlan:
+    tokens = normalize_tokens(token_normalizers, [term])
+    # TODO revisit: if normalization removes the token, consider no match
+    return TermPlan(tokens[0] if tokens else None)
+
+
+def compile_query(query: Query, token_normalizers: List[TokenNormalizer]) -> Plan:
+    """
+    execution plan of query with every term normalized up front
+    """
+    if isinstance(query, BooleanQuery):
+        return BooleanPlan(
+            tuple(
+                (clause.clause, compile_query(clause.query, token_normalizers))
+                for clause in query.clauses
+            )
+        )
+
+    elif isinstance(query, TermQuery):
+        # running same normalization on the search term to ensure consistency
+        return term_plan(token_normalizers, query.term)
+
+    elif isinstance(query, PhraseQuery):
+        terms = normalize_tokens(token_normalizers, query.terms)
+
+        if len(terms) == 1:
+            # if phrase query is normalized to 1 term, treat it like a TermQuery
+            return term_plan(token_normalizers, terms[0])
+        elif len(terms) == 0:
+            return TermPlan(None)
+
+        return PhrasePlan(tuple(terms), query.distance, query.ordered)
+
+    elif isinstance(query, WildcardQuery):
+        if "?" not in query.term and "*" not in query.term:
+            # wildcard search not needed when wildcard symbol not present
+            return term_plan(token_normalizers, query.term)
+
+        return WildcardPlan(query.term)
+
+    else:
+        raise ValueError("Invalid Query type")
+
+
+class PlanCache:
+    """
+    least recently used {query string: Plan} with at most max_size entries
+    plans are never modified once compiled, so they are shared between threads
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._plans: OrderedDict[str, Plan] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._plans)
+
+    def get(self, query: str) -> Optional[Plan]:
+        with self._lock:
+            plan = self._plans.get(query)
+            if plan is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._plans.move_to_end(query)
+            return plan
+
+    def put(self, query: str, plan: Plan):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._plans[query] = plan
+            self._plans.move_to_end(query)
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def plan_query(
+    query: Union[Query, str],
+    token_normalizers: List[TokenNormalizer],
+    cache: Optional[PlanCache] = None,
+) -> Plan:
+    """
+    compile query, plans of query strings are reused from cache
+    """
+    if not isinstance(query, str):
+        return compile_query(query, token_normalizers)
+
+    if cache is not None:
+        plan = cache.get(query)
+        if plan is not None:
+            return plan
+
+    plan = compile_query(parse_query(query), token_normalizers)
+    if cache is not None:
+        cache.put(query, plan)
+    return plan
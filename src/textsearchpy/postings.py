@@ -0,0 +1,613 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from collections.abc import Mapping
+from itertools import accumulate, chain
+from operator import sub
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+class Postings:
+    """
+    positional postings of a single term stored in flat typed arrays
+
+    doc_ids holds internal document ids in ascending order, the positions of doc_ids[i]
+    are positions[offsets[i] : offsets[i + 1]]
+    supports the read only part of the dict interface keyed by internal doc id
+
+    max_tf and min_doc_length are kept to bound the best possible score of the term,
+    they are not lowered on remove so they stay valid (if looser) upper bounds
+    """
+
+    __slots__ = ("doc_ids", "offsets", "positions", "max_tf", "min_doc_length")
+
+    def __init__(self):
+        self.doc_ids = array("I")
+        self.offsets = array("I", [0])
+        self.positions = array("I")
+        self.max_tf = 0
+        self.min_doc_length = None
+
+    @classmethod
+    def from_arrays(
+        cls,
+        doc_ids: array,
+        offsets: array,
+        positions: array,
+        max_tf: int,
+        min_doc_length: Optional[int],
+    ) -> "Postings":
+        postings = cls()
+        postings.doc_ids = doc_ids
+        postings.offsets = offsets
+        postings.positions = positions
+        postings.max_tf = max_tf
+        postings.min_doc_length = min_doc_length
+        return postings
+
+    def add(self, doc_id: int, positions: Iterable[int], doc_length: int = 0):
+        # doc ids are assigned in increasing order so appending keeps doc_ids sorted
+        self.doc_ids.append(doc_id)
+        self.positions.extend(positions)
+        self.offsets.append(len(self.positions))
+
+        self._update_bounds(self.offsets[-1] - self.offsets[-2], doc_length)
+
+    def _update_bounds(self, tf: int, doc_length: Optional[int]):
+        if tf > self.max_tf:
+            self.max_tf = tf
+        if doc_length is not None and (
+            self.min_doc_length is None or doc_length < self.min_doc_length
+        ):
+            self.min_doc_length = doc_length
+
+    def extend(self, other: "Postings"):
+        """
+        append every document of other, its doc ids must all be above the ids held here
+        """
+        other = other.decompress()
+        base = self.offsets[-1]
+        self.doc_ids.extend(other.doc_ids)
+        self.positions.extend(other.positions)
+        self.offsets.extend(offset + base for offset in other.offsets[1:])
+        self._update_bounds(other.max_tf, other.min_doc_length)
+
+    def remove(self, doc_id: int):
+        i = self._find(doc_id)
+        if i < 0:
+            raise KeyError(doc_id)
+
+        start = self.offsets[i]
+        end = self.offsets[i + 1]
+        size = end - start
+
+        del self.doc_ids[i]
+        del self.positions[start:end]
+        del self.offsets[i + 1]
+        for j in range(i + 1, len(self.offsets)):
+            self.offsets[j] -= size
+
+    def live_copy(self, live_docs: Sequence[int]) -> "Postings":
+        """
+        copy without the documents flagged 0 in live_docs, self when all documents are live
+        """
+        doc_ids = self.doc_ids
+        keep = [i for i, doc_id in enumerate(doc_ids) if live_docs[doc_id]]
+        if len(keep) == len(doc_ids):
+            return self
+
+        offsets = self.offsets
+        positions = self.positions
+        copy = Postings()
+        for i in keep:
+            copy.doc_ids.append(doc_ids[i])
+            copy.positions.extend(positions[offsets[i] : offsets[i + 1]])
+            copy.offsets.append(len(copy.positions))
+        # bounds of the removed documents are kept, they remain valid upper bounds
+        copy.max_tf = self.max_tf
+        copy.min_doc_length = self.min_doc_length
+        return copy
+
+    def decompress(self) -> "Postings":
+        """
+        postings with plain position arrays, self as positions are already stored plainly
+        """
+        return self
+
+    def _find(self, doc_id: int) -> int:
+        i = bisect_left(self.doc_ids, doc_id)
+        if i < len(self.doc_ids) and self.doc_ids[i] == doc_id:
+            return i
+        return -1
+
+    def _positions_at(self, i: int) -> array:
+        return self.positions[self.offsets[i] : self.offsets[i + 1]]
+
+    def term_freq(self, doc_id: int) -> int:
+        i = self._find(doc_id)
+        if i < 0:
+            return 0
+        return self.offsets[i + 1] - self.offsets[i]
+
+    def __getitem__(self, doc_id: int) -> array:
+        i = self._find(doc_id)
+        if i < 0:
+            raise KeyError(doc_id)
+        return self._positions_at(i)
+
+    def get(self, doc_id: int, default=None):
+        i = self._find(doc_id)
+        if i < 0:
+            return default
+        return self._positions_at(i)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return self._find(doc_id) >= 0
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.doc_ids)
+
+    def keys(self) -> array:
+        return self.doc_ids
+
+    def items(self) -> Iterator[Tuple[int, array]]:
+        for i, doc_id in enumerate(self.doc_ids):
+            yield doc_id, self._positions_at(i)
+
+
+def encode_positions(positions: Sequence[int]) -> bytes:
+    """
+    ascending positions as varint encoded gaps, the first gap is from 0
+    """
+    gaps = list(map(sub, positions, chain((0,), positions)))
+    if not gaps or max(gaps) < 0x80:
+        # every gap fits a single byte, the common case for frequent terms
+        return bytes(gaps)
+
+    encoded = bytearray()
+    for gap in gaps:
+        while gap >= 0x80:
+            encoded.append(gap & 0x7F | 0x80)
+            gap >>= 7
+        encoded.append(gap)
+    return bytes(encoded)
+
+
+def decode_positions(encoded: bytes) -> array:
+    if not encoded or max(encoded) < 0x80:
+        return array("I", accumulate(encoded))
+
+    gaps = []
+    gap = 0
+    shift = 0
+    for byte in encoded:
+        if byte & 0x80:
+            gap |= (byte & 0x7F) << shift
+            shift += 7
+        else:
+            gaps.append(gap | byte << shift)
+            gap = 0
+            shift = 0
+    return array("I", accumulate(gaps))
+
+
+class CompressedPostings(Postings):
+    """
+    Postings with the positions of each document stored as varint encoded gaps,
+    positions are decoded when a document's positions are accessed
+
+    positions is a bytearray and the bytes of doc_ids[i] are positions[blocks[i] : blocks[i + 1]]
+    offsets still count positions, so term frequencies are read without decoding
+    doc_ids stay fixed width for the binary searches and galloping intersections
+    """
+
+    __slots__ = ("blocks",)
+
+    def __init__(self):
+        super().__init__()
+        self.positions = bytearray()
+        self.blocks = array("I", [0])
+
+    @classmethod
+    def from_postings(cls, postings: Postings) -> "CompressedPostings":
+        if isinstance(postings, CompressedPostings):
+            return postings
+        compressed = cls()
+        compressed.doc_ids = array("I", postings.doc_ids)
+        compressed.offsets = array("I", postings.offsets)
+        for _, positions in postings.items():
+            compressed.positions += encode_positions(positions)
+            compressed.blocks.append(len(compressed.positions))
+        compressed.max_tf = postings.max_tf
+        compressed.min_doc_length = postings.min_doc_length
+        return compressed
+
+    def add(self, doc_id: int, positions: Sequence[int], doc_length: int = 0):
+        self.doc_ids.append(doc_id)
+        self.positions += encode_positions(positions)
+        self.blocks.append(len(self.positions))
+        self.offsets.append(self.offsets[-1] + len(positions))
+        self._update_bounds(len(positions), doc_length)
+
+    def extend(self, other: Postings):
+        other = CompressedPostings.from_postings(other)
+        base = self.offsets[-1]
+        block_base = self.blocks[-1]
+        self.doc_ids.extend(other.doc_ids)
+        self.positions += other.positions
+        self.offsets.extend(offset + base for offset in other.offsets[1:])
+        self.blocks.extend(block + block_base for block in other.blocks[1:])
+        self._update_bounds(other.max_tf, other.min_doc_length)
+
+    def remove(self, doc_id: int):
+        i = self._find(doc_id)
+        if i < 0:
+            raise KeyError(doc_id)
+
+        start = self.blocks[i]
+        end = self.blocks[i + 1]
+        size = end - start
+        tf = self.offsets[i + 1] - self.offsets[i]
+
+        del self.doc_ids[i]
+        del self.positions[start:end]
+        del self.blocks[i + 1]
+        del self.offsets[i + 1]
+        for j in range(i + 1, len(self.blocks)):
+            self.blocks[j] -= size
+            self.offsets[j] -= tf
+
+    def live_copy(self, live_docs: Sequence[int]) -> "CompressedPostings":
+        doc_ids = self.doc_ids
+        keep = [i for i, doc_id in enumerate(doc_ids) if live_docs[doc_id]]
+        if len(keep) == len(doc_ids):
+            return self
+
+        offsets = self.offsets
+        blocks = self.blocks
+        positions = self.positions
+        copy = CompressedPostings()
+        for i in keep:
+            copy.doc_ids.append(doc_ids[i])
+            copy.positions += positions[blocks[i] : blocks[i + 1]]
+            copy.blocks.append(len(copy.positions))
+            copy.offsets.append(copy.offsets[-1] + offsets[i + 1] - offsets[i])
+        copy.max_tf = self.max_tf
+        copy.min_doc_length = self.min_doc_length
+        return copy
+
+    def decompress(self) -> Postings:
+        positions = array("I")
+        for _, doc_positions in self.items():
+            positions.extend(doc_positions)
+        return Postings.from_arrays(
+            array("I", self.doc_ids),
+            array("I", self.offsets),
+            positions,
+            self.max_tf,
+            self.min_doc_length,
+        )
+
+    def _positions_at(self, i: int) -> array:
+        return decode_positions(self.positions[self.blocks[i] : self.blocks[i + 1]])
+
+
+# (terms, doc_freqs, max_tfs, min_doc_lengths, doc_ids, position_ends, positions)
+PackedPostings = Tuple[List[str], array, array, array, array, array, array]
+
+
+def pack_postings(postings_by_term: Mapping[str, Postings]) -> PackedPostings:
+    """
+    flatten {term: Postings} into a few arrays, which pickle far faster than one
+    object per term when sent between processes
+    """
+    terms = list(postings_by_term)
+    doc_freqs = array("I")
+    max_tfs = array("I")
+    min_doc_lengths = array("I")
+    doc_ids = array("I")
+    # end of each document's positions, relative to the start of its term's positions
+    position_ends = array("I")
+    positions = array("I")
+    for term in terms:
+        postings = postings_by_term[term].decompress()
+        doc_freqs.append(len(postings.doc_ids))
+        max_tfs.append(postings.max_tf)
+        min_doc_lengths.append(postings.min_doc_length or 0)
+        doc_ids.extend(postings.doc_ids)
+        position_ends.extend(postings.offsets[1:])
+        positions.extend(postings.positions)
+
+    return (
+        terms,
+        doc_freqs,
+        max_tfs,
+        min_doc_lengths,
+        doc_ids,
+        position_ends,
+        positions,
+    )
+
+
+def unpack_postings(packed: PackedPostings) -> Iterator[Tuple[str, Postings]]:
+    terms, doc_freqs, max_tfs, min_doc_lengths, doc_ids, position_ends, positions = (
+        packed
+    )
+    doc_start = 0
+    position_start = 0
+    for i, term in enumerate(terms):
+        doc_end = doc_start + doc_freqs[i]
+        offsets = array("I", [0])
+        offsets.extend(position_ends[doc_start:doc_end])
+        position_end = position_start + offsets[-1]
+
+        yield (
+            term,
+            Postings.from_arrays(
+                doc_ids[doc_start:doc_end],
+                offsets,
+                positions[position_start:position_end],
+                max_tfs[i],
+                min_doc_lengths[i],
+            ),
+        )
+        doc_start = doc_end
+        position_start = position_end
+
+
+class DocIdsView(Mapping):
+    """
+    {token: sorted array of doc_id} view over a {token: Postings} mapping
+    """
+
+    def __init__(self, positional_index: Mapping):
+        self._positional_index = positional_index
+
+    def __getitem__(self, token: str) -> array:
+        return self._positional_index[token].doc_ids
+
+    def __contains__(self, token) -> bool:
+        return token in self._positional_index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._positional_index)
+
+    def __len__(self) -> int:
+        return len(self._positional_index)
+
+
+def gallop(seq: Sequence[int], target: int, lo: int = 0) -> int:
+    """
+    find the first index >= lo where seq[index] >= target in a sorted sequence
+    probes exponentially growing steps before binary search, so the cost depends on
+    how far the cursor moves rather than the length of seq
+    """
+    n = len(seq)
+    if lo >= n or seq[lo] >= target:
+        return lo
+
+    step = 1
+    hi = lo + 1
+    while hi < n and seq[hi] < target:
+        lo = hi
+        step *= 2
+        hi = lo + step
+
+    return bisect_left(seq, target, lo + 1, min(hi, n))
+
+
+def gallop_probes(seq: Sequence[int], target: int, lo: int = 0) -> Tuple[int, int]:
+    """
+    gallop that also returns how many entries of seq were compared, for profiling
+    the binary search runs in python so every comparison is counted
+    """
+    n = len(seq)
+    if lo >= n:
+        return lo, 0
+    probes = 1
+    if seq[lo] >= target:
+        return lo, probes
+
+    step = 1
+    hi = lo + 1
+    while hi < n:
+        probes += 1
+        if seq[hi] >= target:
+            break
+        lo = hi
+        step *= 2
+        hi = lo + step
+
+    lo += 1
+    hi = min(hi, n)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        probes += 1
+        if seq[mid] < target:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo, probes
+
+
+def intersect_sorted(doc_id_lists: List[Sequence[int]]) -> List[int]:
+    """
+    intersect sorted doc id lists, driven by the rarest list
+    every other list is only advanced by galloping, so the cost tracks the smallest list
+    """
+    if not doc_id_lists:
+        return []
+
+    doc_id_lists = sorted(doc_id_lists, key=len)
+    rarest = doc_id_lists[0]
+    others = doc_id_lists[1:]
+    if not others:
+        return list(rarest)
+
+    cursors = [0] * len(others)
+    result = []
+    for doc_id in rarest:
+        for i, other in enumerate(others):
+            cursor = gallop(other, doc_id, cursors[i])
+            if cursor == len(other):
+                # one list is exhausted, no further matches possible
+                return result
+            cursors[i] = cursor
+            if other[cursor] != doc_id:
+                break
+        else:
+            result.append(doc_id)
+
+    return result
+
+
+def _adjacent_match_count(
+    positions1: Sequence[int], positions2: Sequence[int], ordered: bool
+) -> int:
+    # k == 1, each position of term 1 can only match the position either side of it
+    following = set(positions2)
+    window = deque()
+    count = 0
+    for pp1 in positions1:
+        if not ordered and pp1 - 1 in following:
+            window.append(pp1 - 1)
+        if pp1 + 1 in following:
+            window.append(pp1 + 1)
+        while window and window[0] < pp1 - 1:
+            window.popleft()
+        count += len(window)
+    return count
+
+
+def proximity_match_count(
+    positions1: Sequence[int], positions2: Sequence[int], k: int, ordered: bool
+) -> int:
+    """
+    phrase match count of two terms within k positions in one document, 0 when no match
+
+    for every position of term 1 the positions of term 2 within k of it (other than the same
+    position, after it when ordered) are appended to a window, which then drops positions
+    from its front while the front is more than k before the term 1 position
+    the count sums the window length after each term 1 position
+
+    positions appended for earlier term 1 positions stay behind the front, so a term 2
+    position can be counted more than once, this count is kept as the phrase frequency
+
+    the window is kept as runs of positions2 indexes and every cursor only moves forward,
+    so the cost is linear in the number of positions
+    """
+    if k == 1:
+        return _adjacent_match_count(positions1, positions2, ordered)
+
+    n2 = len(positions2)
+    # first index of positions2 >= pp1 - k (> pp1 when ordered), > pp1 + k, >= pp1
+    # and >= the front cutoff, all move forward as pp1 grows
+    start_i = 0
+    end_i = 0
+    same_i = 0
+    cut_i = 0
+    # [start, end, index of pp1 in positions2 or -1], positions2[start:end] less the index
+    runs = deque()
+    window_size = 0
+    count = 0
+    for pp1 in positions1:
+        low = pp1 + 1 if ordered else pp1 - k
+        while start_i < n2 and positions2[start_i] < low:
+            start_i += 1
+        high = pp1 + k
+        while end_i < n2 and positions2[end_i] <= high:
+            end_i += 1
+
+        run_size = end_i - start_i
+        same = -1
+        if not ordered and run_size > 0:
+            while same_i < n2 and positions2[same_i] < pp1:
+                same_i += 1
+            if same_i < n2 and positions2[same_i] == pp1:
+                same = same_i
+                run_size -= 1
+        if run_size > 0:
+            runs.append([start_i, end_i, same])
+            window_size += run_size
+
+        cutoff = pp1 - k
+        while cut_i < n2 and positions2[cut_i] < cutoff:
+            cut_i += 1
+        while runs:
+            run = runs[0]
+            start, end, same = run
+            if cut_i <= start:
+                break
+            front = cut_i if cut_i < end else end
+            # index same is not part of the run
+            removed = front - start - (start <= same < front)
+            if front == end or (front == same and front + 1 == end):
+                runs.popleft()
+                window_size -= end - start - (same >= start)
+                continue
+            run[0] = front
+            window_size -= removed
+            break
+
+        count += window_size
+
+    return count
+
+
+def multi_proximity_match_count(
+    positions: Sequence[Sequence[int]], k: int, ordered: bool
+) -> int:
+    """
+    phrase match count of three or more terms in one document, 0 when no match
+
+    a match is a chain of one position per term, starting from a term 1 and term 2 pair
+    within k of each other (as in proximity_match_count) and growing the (low, high) span
+    one term at a time, term i + 3 may widen the span to k + 1 + i positions
+    the count is the number of chains
+
+    chains reaching the same span extend the same way, so spans are kept once with the
+    number of chains reaching them, rather than enumerating every chain
+    """
+    positions1 = positions[0]
+    positions2 = positions[1]
+
+    # {(low, high): number of chains}
+    spans: Dict[Tuple[int, int], int] = {}
+    for pp1 in positions1:
+        start = bisect_left(positions2, pp1 + 1 if ordered else pp1 - k)
+        end = bisect_right(positions2, pp1 + k, start)
+        for i in range(start, end):
+            pp2 = positions2[i]
+            if pp2 == pp1:
+                continue
+            span = (pp1, pp2) if pp1 < pp2 else (pp2, pp1)
+            spans[span] = spans.get(span, 0) + 1
+
+    for index, positions_k in enumerate(positions[2:]):
+        if not spans:
+            return 0
+
+        reach = k + 1 + index
+        n = len(positions_k)
+        next_spans: Dict[Tuple[int, int], int] = {}
+        for (low, high), chains in spans.items():
+            # positions before this cannot extend the span, when ordered term k can
+            # share the position of the previous term but not come before it
+            i = bisect_left(positions_k, high if ordered else high - reach)
+            while i < n:
+                pp_k = positions_k[i]
+                new_low = low if low < pp_k else pp_k
+                new_high = high if high > pp_k else pp_k
+                dis = new_high - new_low - 1 - index
+                if dis <= k and dis != 0:
+                    span = (new_low, new_high)
+                    next_spans[span] = next_spans.get(span, 0) + chains
+                elif pp_k > high:
+                    break
+                i += 1
+        spans = next_spans
+
+    return sum(spans.values())
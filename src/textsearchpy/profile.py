@@ -0,0 +1,121 @@
+from typing import Dict, List, Optional
+
+from .plan import BooleanPlan, PhrasePlan, Plan, TermPlan, WildcardPlan
+from .query import Clause
+
+
+def describe(plan: Plan) -> str:
+    """
+    query string form of a single plan node, boolean plans are described by their clauses
+    """
+    if isinstance(plan, TermPlan):
+        return str(plan.term)
+    elif isinstance(plan, PhrasePlan):
+        description = '"' + " ".join(plan.terms) + '"'
+        if plan.distance:
+            description += f"~{plan.distance}"
+        return description + (" ordered" if plan.ordered else "")
+    elif isinstance(plan, WildcardPlan):
+        return plan.pattern
+    return f"{len(plan.clauses)} clauses"
+
+
+_PLAN_TYPES = {
+    TermPlan: "term",
+    PhrasePlan: "phrase",
+    WildcardPlan: "wildcard",
+    BooleanPlan: "boolean",
+}
+
+
+class QueryProfile:
+    """
+    execution profile of one query node, children follow the clauses of a boolean query
+
+    counters only cover the work of this node, each child holds its own
+    postings_scanned - postings entries read from the inverted index
+    positions_compared - term positions walked to match phrases
+    terms_expanded - index terms a wildcard matched
+    docs_scored - documents given a match score
+
+    pruned is set on term disjunctions ranked with MaxScore and on their terms, documents
+    that cannot make the top n are skipped so their counters only cover the documents
+    examined, the terms are evaluated together and carry no time of their own
+    postings_scanned of a pruned term counts the entries its cursor stepped over plus the
+    entries compared while galloping, an entry compared by several gallops counts each time
+    """
+
+    __slots__ = (
+        "type",
+        "description",
+        "clause",
+        "seconds",
+        "docs_matched",
+        "postings_scanned",
+        "positions_compared",
+        "terms_expanded",
+        "docs_scored",
+        "pruned",
+        "children",
+    )
+
+    def __init__(self, plan: Plan, clause: Optional[Clause] = None):
+        self.type = _PLAN_TYPES[type(plan)]
+        self.description = describe(plan)
+        # how the node is combined by its parent, None for the root
+        self.clause = clause
+        self.seconds = 0.0
+        self.docs_matched = 0
+        self.postings_scanned = 0
+        self.positions_compared = 0
+        self.terms_expanded = 0
+        self.docs_scored = 0
+        self.pruned = False
+        self.children: List["QueryProfile"] = []
+
+    def child(self, plan: Plan, clause: Optional[Clause] = None) -> "QueryProfile":
+        profile = QueryProfile(plan, clause)
+        self.children.append(profile)
+        return profile
+
+    def to_dict(self) -> Dict:
+        return {
+            "type": self.type,
+            "description": self.description,
+            "clause": self.clause.value if self.clause is not None else None,
+            "seconds": self.seconds,
+            "docs_matched": self.docs_matched,
+            "postings_scanned": self.postings_scanned,
+            "positions_compared": self.positions_compared,
+            "terms_expanded": self.terms_expanded,
+            "docs_scored": self.docs_scored,
+            "pruned": self.pruned,
+            "children": [c.to_dict() for c in self.children],
+        }
+
+    def __str__(self) -> str:
+        return "\n".join(self._lines(0))
+
+    def _lines(self, depth: int) -> List[str]:
+        clause = f"{self.clause.value} " if self.clause is not None else ""
+        counters = [
+            f"{self.seconds * 1000:.3f}ms",
+            f"matched={self.docs_matched}",
+            f"postings={self.postings_scanned}",
+        ]
+        if self.positions_compared:
+            counters.append(f"positions={self.positions_compared}")
+        if self.terms_expanded:
+            counters.append(f"terms={self.terms_expanded}")
+        if self.docs_scored:
+            counters.append(f"scored={self.docs_scored}")
+        if self.pruned:
+            counters.append("pruned")
+        lines = [
+            "  " * depth
+            + f"{clause}{self.type} {self.description} "
+            + " ".join(counters)
+        ]
+        for c in self.children:
+            lines.extend(c._lines(depth + 1))
+        return lines
@@ -0,0 +1,602 @@
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+import copy
+from itertools import islice
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from .analyzers import Analyzer
+from .collectors import TopNCollector
+from .docstore import Document
+from .index import _ANALYZE_BATCH_SIZE, Index
+from .normalizers import LowerCaseNormalizer, TokenNormalizer
+from .postings import Postings
+from .plan import Plan, PlanCache, plan_query
+from .query import Query
+from .stats import CorpusStats
+from .tokenizers import SimpleTokenizer, Tokenizer
+from .exception import IndexingError, TextSearchPyError
+
+
+def merge_segments(
+    segments: Sequence[Index],
+    token_normalizers: List[TokenNormalizer],
+    tokenizer: Tokenizer,
+    deleted: Set[str] = frozenset(),
+    kgram_size: Optional[int] = None,
+) -> Index:
+    """
+    build a new segment holding the live documents of segments in order, skipping ids in deleted
+    postings are copied with remapped doc ids, documents are not tokenized again
+    """
+    merged = Index(
+        token_normalizers=token_normalizers, tokenizer=tokenizer, kgram_size=kgram_size
+    )
+
+    for segment in segments:
+        id_map: Dict[int, int] = {}
+        for d_id, ext_id in enumerate(segment._doc_ids):
+            if not segment._is_live(d_id) or ext_id in deleted:
+                continue
+            new_id = len(merged._doc_ids)
+            id_map[d_id] = new_id
+            merged._doc_ids.append(ext_id)
+            merged._internal_ids[ext_id] = new_id
+            merged._doc_lengths.append(segment._doc_lengths[d_id])
+            merged._deleted_at.append(0)
+            merged._doc_store.add(new_id, segment._doc_store[d_id])
+            merged.total_tokens += segment._doc_lengths[d_id]
+
+        for tok, postings in segment.positional_index.items():
+            target = None
+            for d_id, positions in postings.items():
+                new_id = id_map.get(d_id)
+                if new_id is None:
+                    continue
+                if target is None:
+                    target = merged.positional_index.get(tok)
+                    if target is None:
+                        target = Postings()
+                        merged.positional_index[tok] = target
+                # segments are merged in order so remapped ids stay ascending
+                target.add(new_id, positions, segment._doc_lengths[d_id])
+
+    merged._publish()
+    return merged
+
+
+class TieredMergePolicy:
+    """
+    groups segments into tiers by document count, a tier holds segments up to
+    segments_per_tier times larger than the tier below, starting from floor_segment_docs
+
+    once segments_per_tier adjacent segments share a tier they are merged into one segment of
+    the next tier, only adjacent segments are merged so documents keep their index order
+
+    fewer than segments_per_tier segments of a tier between segments of higher tiers (or the
+    start of the index) can never join a full run of their tier, they are merged into their
+    smaller neighbour instead so the layout does not settle into alternating tiers
+    """
+
+    def __init__(
+        self,
+        segments_per_tier: int = 10,
+        max_merge_at_once: int = 10,
+        floor_segment_docs: int = 1000,
+    ):
+        if segments_per_tier < 2 or max_merge_at_once < 2:
+            raise ValueError("segments_per_tier and max_merge_at_once should be >= 2")
+        self.segments_per_tier = segments_per_tier
+        self.max_merge_at_once = max_merge_at_once
+        self.floor_segment_docs = floor_segment_docs
+
+    def tier(self, doc_count: int) -> int:
+        size = max(doc_count, self.floor_segment_docs, 1)
+        tier = 0
+        while size >= self.floor_segment_docs * self.segments_per_tier:
+            size /= self.segments_per_tier
+            tier += 1
+        return tier
+
+    def find_merges(self, segment_sizes: List[int]) -> List[Tuple[int, int]]:
+        """
+        returns (start, end) slices of adjacent segments to merge
+        """
+        tiers = [self.tier(size) for size in segment_sizes]
+        merges = []
+        # (start, end) of runs too short to merge on their own
+        short_runs = []
+
+        i = 0
+        while i < len(tiers):
+            j = i
+            while j < len(tiers) and tiers[j] == tiers[i]:
+                j += 1
+
+            start = i
+            while j - start >= self.segments_per_tier:
+                end = min(j, start + self.max_merge_at_once)
+                merges.append((start, end))
+                start = end
+            if start == i:
+                short_runs.append((i, j))
+            i = j
+
+        merging = {i for start, end in merges for i in range(start, end)}
+        for start, end in short_runs:
+            tier = tiers[start]
+            # segments appended later can still complete a run at the end of the index
+            if end == len(tiers) or tiers[end] < tier:
+                continue
+            if start > 0 and tiers[start - 1] < tier:
+                continue
+
+            neighbours = [n for n in (start - 1, end) if n >= 0 and n not in merging]
+            if not neighbours:
+                continue
+            neighbour = min(neighbours, key=lambda n: segment_sizes[n])
+            # the neighbour and the segments of the run closest to it
+            if neighbour < start:
+                merge = (neighbour, min(end, neighbour + self.max_merge_at_once))
+            else:
+                merge = (max(start, end + 1 - self.max_merge_at_once), end + 1)
+            merges.append(merge)
+            merging.update(range(*merge))
+
+        return sorted(merges)
+
+
+class SegmentReader:
+    """
+    searches a fixed list of segments as one index
+
+    corpus statistics are summed over every segment before scoring, so scores and ranking
+    match a single Index holding the same documents
+    """
+
+    def __init__(
+        self, segments: Sequence[Index], plan_cache: Optional[PlanCache] = None
+    ):
+        self.segments: Tuple[Index, ...] = tuple(s for s in segments if len(s))
+        self.plan_cache = plan_cache if plan_cache is not None else PlanCache()
+
+    def _plan(self, query: Union[Query, str]) -> Optional[Plan]:
+        # segments share their normalizers, so one plan serves every segment
+        if not self.segments:
+            return None
+        return plan_query(
+            query, self.segments[0].analyzer.token_normalizers, self.plan_cache
+        )
+
+    def __len__(self):
+        return sum(len(s) for s in self.segments)
+
+    def get(self, doc_id: str) -> Optional[Document]:
+        for segment in self.segments:
+            d_id = segment._lookup(doc_id)
+            if d_id is not None:
+                return segment._doc_store[d_id]
+        return None
+
+    def search(self, query: Union[Query, str]) -> List[Document]:
+        plan = self._plan(query)
+
+        docs = []
+        for segment in self.segments:
+            docs.extend(segment._search(plan))
+        return docs
+
+    def retrieve_top_n(
+        self,
+        query: Union[Query, str],
+        n: Optional[int] = None,
+        search_after: Optional[Union[Document, Tuple[float, str]]] = None,
+    ) -> List[Document]:
+        """
+        same ordering and paging as Index.retrieve_top_n, ties ordered by segment then index order
+        """
+        plan = self._plan(query)
+
+        stats = CorpusStats()
+        for segment in self.segments:
+            stats.merge(segment._query_stats(plan))
+
+        afters = [None] * len(self.segments)
+        if search_after is not None:
+            afters = self._segment_cursors(search_after)
+
+        # (score, segment rank, internal doc id)
+        hits = []
+        for rank, segment in enumerate(self.segments):
+            collector = TopNCollector(n or None, afters[rank])
+            segment._collect_top_n(plan, collector, stats)
+            hits.extend((score, rank, doc_id) for score, doc_id in collector.top_docs())
+
+        hits.sort(key=lambda h: (-h[0], h[1], h[2]))
+        if n:
+            hits = hits[:n]
+
+        return [
+            self.segments[rank]._scored_documents([(score, doc_id)])[0]
+            for score, rank, doc_id in hits
+        ]
+
+    def _segment_cursors(
+        self, search_after: Union[Document, Tuple[float, str]]
+    ) -> List[Tuple[float, float]]:
+        if isinstance(search_after, Document):
+            score, ext_id = search_after.score, search_after.id
+        else:
+            score, ext_id = search_after
+
+        for rank, segment in enumerate(self.segments):
+            cursor_id = segment._lookup(ext_id)
+            if cursor_id is not None:
+                break
+        else:
+            rank = None
+
+        if score is None or rank is None:
+            raise TextSearchPyError(
+                f"search_after requires a scored document in index, found: {ext_id}"
+            )
+
+        # segments before the cursor drop hits tied with it, segments after keep them
+        cursors = []
+        for r, segment in enumerate(self.segments):
+            if r < rank:
+                cursors.append((score, math.inf))
+            elif r == rank:
+                cursors.append((score, cursor_id))
+            else:
+                cursors.append((score, -1))
+        return cursors
+
+
+class _Merge:
+    """
+    a running merge, current tracks the segments in the index standing in for the sources
+    """
+
+    __slots__ = ("sources", "current", "deleted")
+
+    def __init__(self, sources: List[Index]):
+        self.sources = sources
+        self.current = list(sources)
+        # documents deleted from the sources after the merge started
+        self.deleted: Set[str] = set()
+
+
+class SegmentedIndex:
+    """
+    index made of immutable segments
+
+    appends go into an in-memory buffer segment, once it holds max_buffered_docs documents it
+    is sealed and its postings are never modified again, a delete replaces the sealed segment
+    with a copy sharing its postings where the deleted documents are marked in the live docs
+    searches fan out over every segment, a merge policy combines adjacent segments on a
+    background thread (or inline when background_merges is False), merging drops deleted
+    documents from postings
+    """
+
+    def __init__(
+        self,
+        token_normalizers: List[TokenNormalizer] = [LowerCaseNormalizer()],
+        tokenizer: Tokenizer = SimpleTokenizer(),
+        max_buffered_docs: int = 1000,
+        merge_policy: Optional[TieredMergePolicy] = None,
+        background_merges: bool = True,
+        kgram_size: Optional[int] = None,
+    ):
+        if max_buffered_docs < 1:
+            raise ValueError("max_buffered_docs should be >= 1")
+
+        # shared by every segment, so documents and queries are analyzed the same way
+        self.analyzer = Analyzer(tokenizer, token_normalizers)
+        self.max_buffered_docs = max_buffered_docs
+        self.merge_policy = merge_policy or TieredMergePolicy()
+        self.background_merges = background_merges
+        self.kgram_size = kgram_size
+
+        self._lock = threading.RLock()
+        self._segments: List[Index] = []
+        self._buffer = self._new_segment()
+        # compiled plans of recent query strings, shared by every reader of this index
+        self.plan_cache = PlanCache()
+
+        self._merges: List[_Merge] = []
+        self._merge_futures: List[Future] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _new_segment(self) -> Index:
+        return Index(
+            token_normalizers=self.token_normalizers,
+            tokenizer=self.tokenizer,
+            kgram_size=self.kgram_size,
+        )
+
+    @property
+    def tokenizer(self) -> Tokenizer:
+        """
+        read only, the analyzer is compiled from it at construction
+        """
+        return self.analyzer.tokenizer
+
+    @property
+    def token_normalizers(self) -> List[TokenNormalizer]:
+        """
+        copy of the normalizers the analyzer was compiled from, changing it has no effect
+        """
+        return list(self.analyzer.token_normalizers)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._buffer) + sum(len(s) for s in self._segments)
+
+    @property
+    def segments(self) -> Tuple[Index, ...]:
+        """
+        sealed segments in index order, the buffer is not included
+        """
+        with self._lock:
+            return tuple(self._segments)
+
+    def _find_segment(self, doc_id: str) -> Optional[Index]:
+        if doc_id in self._buffer._internal_ids:
+            return self._buffer
+        for segment in self._segments:
+            if doc_id in segment._internal_ids:
+                return segment
+        return None
+
+    def append(
+        self,
+        docs: Iterable[Union[str, Document]],
+        batch_size: int = _ANALYZE_BATCH_SIZE,
+    ):
+        """
+        docs can be any iterable or generator, it is consumed batch_size documents at a time
+        each batch is analyzed before taking the lock, then added to the buffer in as few
+        pieces as its remaining capacity allows
+        """
+        docs = iter(docs)
+        while True:
+            batch = [
+                Document(text=doc) if isinstance(doc, str) else doc
+                for doc in islice(docs, batch_size)
+            ]
+            if not batch:
+                break
+            token_lists = self.analyzer.analyze_batch([d.text for d in batch])
+
+            with self._lock:
+                start = 0
+                while start < len(batch):
+                    end = start + self.max_buffered_docs - len(self._buffer)
+                    self._buffer_batch(batch[start:end], token_lists[start:end])
+                    if len(self._buffer) >= self.max_buffered_docs:
+                        self._seal_buffer()
+                    start = end
+
+            self.maybe_merge()
+
+    def _buffer_batch(self, docs: List[Document], token_lists: List[List[str]]):
+        # the buffer rejects ids it already holds, ids of sealed segments are checked here
+        for i, doc in enumerate(docs):
+            if doc.id is not None and self._find_segment(doc.id) is not None:
+                self._buffer._append_batch(docs[:i], token_lists[:i])
+                raise IndexingError(
+                    f"Attempting to add a Document with ID: {doc.id} already exists in index"
+                )
+        self._buffer._append_batch(docs, token_lists)
+
+    def flush(self):
+        """
+        seal the buffer into a segment
+        """
+        with self._lock:
+            self._seal_buffer()
+        self.maybe_merge()
+
+    def _seal_buffer(self):
+        if len(self._buffer) == 0:
+            return
+        # deletes are applied to postings before sealing, sealed postings stay as they are
+        self._buffer.compact()
+        self._segments.append(self._buffer)
+        self._buffer = self._new_segment()
+
+    def delete(self, docs: List[Document] = None, ids: List[str] = None) -> int:
+        if docs is None and ids is None:
+            raise TextSearchPyError("docs or ids required to delete from index")
+
+        ids_to_delete = []
+        if docs:
+            ids_to_delete.extend(d.id for d in docs)
+        if ids:
+            ids_to_delete.extend(ids)
+
+        with self._lock:
+            by_segment: Dict[int, Tuple[Index, List[str]]] = {}
+            for ext_id in dict.fromkeys(ids_to_delete):
+                segment = self._find_segment(ext_id)
+                if segment is None:
+                    continue
+                by_segment.setdefault(id(segment), (segment, []))[1].append(ext_id)
+
+            deleted = 0
+            for segment, segment_ids in by_segment.values():
+                deleted += len(segment_ids)
+
+                if segment is self._buffer:
+                    self._buffer.delete(ids=segment_ids)
+                    continue
+
+                # sealed segments are replaced rather than modified, readers holding the
+                # old segment keep seeing it unchanged
+                replacement = _with_deleted(segment, segment_ids)
+                in_merge = False
+                for merge in self._merges:
+                    for i, current in enumerate(merge.current):
+                        if current is segment:
+                            merge.current[i] = replacement
+                            merge.deleted.update(segment_ids)
+                            in_merge = True
+
+                i = self._segments.index(segment)
+                if len(replacement) or in_merge:
+                    self._segments[i] = replacement
+                else:
+                    del self._segments[i]
+
+            return deleted
+
+    def snapshot(self) -> SegmentReader:
+        """
+        point in time reader, later appends, deletes and merges do not change its results
+        """
+        with self._lock:
+            self._seal_buffer()
+            reader = SegmentReader(self._segments, self.plan_cache)
+        self.maybe_merge()
+        return reader
+
+    def _reader(self) -> SegmentReader:
+        # sealed segments are never modified and the buffer is read through its published
+        # snapshot, so queries run without holding the lock and never delay writes
+        with self._lock:
+            segments = self._segments + [self._buffer.snapshot()]
+        return SegmentReader(segments, self.plan_cache)
+
+    def search(self, query: Union[Query, str]) -> List[Document]:
+        return self._reader().search(query)
+
+    def retrieve_top_n(
+        self,
+        query: Union[Query, str],
+        n: Optional[int] = None,
+        search_after: Optional[Union[Document, Tuple[float, str]]] = None,
+    ) -> List[Document]:
+        return self._reader().retrieve_top_n(query, n, search_after)
+
+    def maybe_merge(self):
+        """
+        start the merges chosen by the merge policy
+        """
+        merges = []
+        with self._lock:
+            merging = [s for m in self._merges for s in m.current]
+            sizes = [len(s) for s in self._segments]
+            for start, end in self.merge_policy.find_merges(sizes):
+                sources = self._segments[start:end]
+                if any(s is m for s in sources for m in merging):
+                    continue
+                merge = _Merge(sources)
+                self._merges.append(merge)
+                merges.append(merge)
+
+            if self.background_merges:
+                if merges and self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1)
+                for merge in merges:
+                    self._merge_futures.append(
+                        self._executor.submit(self._merge, merge)
+                    )
+                return
+
+        for merge in merges:
+            self._merge(merge)
+
+    def _merge(self, merge: _Merge) -> bool:
+        # merging reads only sealed segments so it runs without holding the lock
+        try:
+            merged = merge_segments(
+                merge.sources,
+                self.token_normalizers,
+                self.tokenizer,
+                kgram_size=self.kgram_size,
+            )
+        except Exception:
+            with self._lock:
+                self._merges.remove(merge)
+            raise
+
+        with self._lock:
+            self._merges.remove(merge)
+            # deletes made while merging are applied again to the merged segment
+            merged._mark_deleted(
+                [d for d in merge.deleted if d in merged._internal_ids]
+            )
+
+            start = next(
+                (i for i, s in enumerate(self._segments) if s is merge.current[0]), None
+            )
+            committed = start is not None and all(
+                start + i < len(self._segments) and self._segments[start + i] is s
+                for i, s in enumerate(merge.current)
+            )
+            if committed:
+                self._segments[start : start + len(merge.current)] = [merged]
+
+        self.maybe_merge()
+        return committed
+
+    def wait_for_merges(self):
+        """
+        block until running merges and the merges they trigger are done
+        re-raises the first merge error
+        """
+        while True:
+            with self._lock:
+                futures = self._merge_futures
+                self._merge_futures = []
+            if not futures:
+                return
+            for future in futures:
+                future.result()
+
+    def force_merge(self):
+        """
+        merge the buffer and every segment into a single segment
+        """
+        with self._lock:
+            self._seal_buffer()
+        self.wait_for_merges()
+
+        with self._lock:
+            if len(self._segments) <= 1 and not any(
+                s._pending_deletes() for s in self._segments
+            ):
+                return
+            merged = merge_segments(
+                self._segments,
+                self.token_normalizers,
+                self.tokenizer,
+                kgram_size=self.kgram_size,
+            )
+            self._segments = [merged] if len(merged) else []
+
+    def close(self):
+        """
+        wait for background merges and stop the merge thread
+        """
+        self.wait_for_merges()
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+def _with_deleted(segment: Index, ext_ids: List[str]) -> Index:
+    """
+    copy of a sealed segment with ext_ids deleted, postings and documents are shared
+    and only the tables changed by a delete are copied
+    """
+    replacement = copy.copy(segment)
+    replacement._internal_ids = dict(segment._internal_ids)
+    replacement._deletions = array("I", segment._deletions)
+    replacement._deleted_at = array("I", segment._deleted_at)
+    replacement._mark_deleted(ext_ids)
+    return replacement
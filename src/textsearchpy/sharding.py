@@ -0,0 +1,345 @@
+from array import array
+from bisect import bisect_right
+from heapq import merge
+from itertools import islice
+import multiprocessing
+from multiprocessing.connection import Connection
+import os
+import threading
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+import uuid
+import zlib
+
+from .docstore import Document
+from .collectors import TopNCollector
+from .index import Index
+from .normalizers import LowerCaseNormalizer, TokenNormalizer
+from .query import Query
+from .stats import CorpusStats
+from .tokenizers import SimpleTokenizer, Tokenizer
+from .exception import TextSearchPyError
+
+# documents routed to the shards per round trip by append
+_APPEND_BATCH_SIZE = 1024
+
+
+def shard_of(doc_id: str, shards: int) -> int:
+    """
+    shard holding doc_id, stable across processes and runs unlike hash()
+    """
+    return zlib.crc32(doc_id.encode("utf-8")) % shards
+
+
+class _Shard:
+    """
+    Index of one worker process, with the global append sequence number of each document
+    """
+
+    def __init__(self, index: Index):
+        self.index = index
+        # global sequence number by internal doc id, ascending like the internal ids
+        self.seqs = array("Q")
+
+    def append(self, docs: List[Document], seqs: List[int]):
+        try:
+            self.index.append(docs)
+        finally:
+            # documents before a duplicate id are added, as with Index.append
+            added = len(self.index._doc_ids) - len(self.seqs)
+            self.seqs.extend(seqs[:added])
+
+    def delete(self, ids: List[str]) -> int:
+        return self.index.delete(ids=ids)
+
+    def length(self) -> int:
+        return len(self.index)
+
+    def seq_of(self, doc_id: str) -> Optional[int]:
+        d_id = self.index._internal_ids.get(doc_id)
+        return None if d_id is None else self.seqs[d_id]
+
+    def search(self, query: Union[Query, str]) -> List[Tuple[int, Document]]:
+        reader = self.index.snapshot()
+        doc_ids = reader._eval_plan(reader._plan(query), score=False).doc_ids
+        return [(self.seqs[d_id], reader._doc_store[d_id]) for d_id in doc_ids]
+
+    def query_stats(self, query: Union[Query, str]) -> CorpusStats:
+        # phrases matched for their statistics are scored by the top_n call that follows
+        reader = self.index.snapshot()
+        reader._phrase_matches = {}
+        return reader._query_stats(reader._plan(query))
+
+    def top_n(
+        self,
+        query: Union[Query, str],
+        n: Optional[int],
+        stats: CorpusStats,
+        after: Optional[Tuple[float, int]],
+    ) -> List[Tuple[float, int, Document]]:
+        reader = self.index.snapshot()
+        if after is not None:
+            # documents appended after the cursor document have a larger internal id
+            score, seq = after
+            after = (score, bisect_right(self.seqs, seq) - 1)
+
+        collector = TopNCollector(n, after)
+        try:
+            reader._collect_top_n(reader._plan(query), collector, stats)
+        finally:
+            reader._phrase_matches = None
+        hits = collector.top_docs()
+        docs = reader._scored_documents(hits)
+        return [(score, self.seqs[d_id], doc) for (score, d_id), doc in zip(hits, docs)]
+
+
+def _serve_shard(
+    conn: Connection,
+    token_normalizers: List[TokenNormalizer],
+    tokenizer: Tokenizer,
+    kgram_size: Optional[int],
+    compress_positions: bool,
+):
+    """
+    worker process loop, runs (method, args) requests until None is received
+    replies (True, result) or (False, exception)
+    """
+    shard = _Shard(
+        Index(
+            token_normalizers=token_normalizers,
+            tokenizer=tokenizer,
+            kgram_size=kgram_size,
+            compress_positions=compress_positions,
+        )
+    )
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        method, args = request
+        try:
+            result = getattr(shard, method)(*args)
+        except Exception as e:
+            conn.send((False, e))
+        else:
+            conn.send((True, result))
+    conn.close()
+
+
+class ShardedIndex:
+    """
+    documents hash partitioned by id over shards, each shard an Index in its own worker
+    process, so indexing and query evaluation run on as many cores as there are shards
+
+    queries are scattered to every shard and the hits gathered, ranked queries first sum
+    the corpus statistics of every shard so scores and ranking match a single Index holding
+    the same documents, ties ordered by append order
+
+    requests from several threads are served one at a time, each one runs on every shard
+    tokenizer and normalizers have to be picklable
+    """
+
+    def __init__(
+        self,
+        token_normalizers: List[TokenNormalizer] = [LowerCaseNormalizer()],
+        tokenizer: Tokenizer = SimpleTokenizer(),
+        shards: Optional[int] = None,
+        kgram_size: Optional[int] = None,
+        compress_positions: bool = False,
+        mp_context: Optional[multiprocessing.context.BaseContext] = None,
+    ):
+        """
+        shards defaults to the cpu count, mp_context to the default multiprocessing context
+        """
+        self.token_normalizers = token_normalizers
+        self.tokenizer = tokenizer
+        self.shards = shards or os.cpu_count() or 1
+
+        context = mp_context or multiprocessing.get_context()
+        self._conns: List[Connection] = []
+        self._processes = []
+        for _ in range(self.shards):
+            conn, worker_conn = context.Pipe()
+            process = context.Process(
+                target=_serve_shard,
+                args=(
+                    worker_conn,
+                    token_normalizers,
+                    tokenizer,
+                    kgram_size,
+                    compress_positions,
+                ),
+                daemon=True,
+            )
+            process.start()
+            worker_conn.close()
+            self._conns.append(conn)
+            self._processes.append(process)
+
+        # a request and its reply are never interleaved with another thread's
+        self._lock = threading.Lock()
+        # global append order, breaks ties between shards the way a single Index would
+        self._next_seq = 0
+
+    def _call(self, requests: Sequence[Optional[Tuple[str, tuple]]]) -> List:
+        """
+        send requests[i] to shard i, None skips the shard
+        every request is sent before any reply is read, so shards work in parallel
+        """
+        if self._conns is None:
+            raise TextSearchPyError("ShardedIndex is closed")
+
+        for conn, request in zip(self._conns, requests):
+            if request is not None:
+                conn.send(request)
+
+        results = []
+        error = None
+        for conn, request in zip(self._conns, requests):
+            if request is None:
+                results.append(None)
+                continue
+            ok, result = conn.recv()
+            if not ok and error is None:
+                error = result
+            results.append(result)
+
+        if error is not None:
+            raise error
+        return results
+
+    def _call_all(self, method: str, *args) -> List:
+        return self._call([(method, args)] * self.shards)
+
+    def __len__(self):
+        with self._lock:
+            return sum(self._call_all("length"))
+
+    def append(
+        self,
+        docs: Iterable[Union[str, Document]],
+        batch_size: int = _APPEND_BATCH_SIZE,
+    ):
+        """
+        docs can be any iterable or generator, it is consumed batch_size documents at a time
+        a duplicate id raises IndexingError once the rest of its batch is added to the other
+        shards
+        """
+        docs = iter(docs)
+        while True:
+            batch = [
+                Document(text=doc) if isinstance(doc, str) else doc
+                for doc in islice(docs, batch_size)
+            ]
+            if not batch:
+                break
+
+            routed = [([], []) for _ in range(self.shards)]
+            with self._lock:
+                for doc in batch:
+                    if doc.id is None:
+                        doc.id = uuid.uuid4().hex
+                    shard_docs, seqs = routed[shard_of(doc.id, self.shards)]
+                    shard_docs.append(doc)
+                    seqs.append(self._next_seq)
+                    self._next_seq += 1
+
+                self._call(
+                    [("append", r) if r[0] else None for r in routed],
+                )
+
+    def delete(self, docs: List[Document] = None, ids: List[str] = None) -> int:
+        if docs is None and ids is None:
+            raise TextSearchPyError("docs or ids required to delete from index")
+
+        ids_to_delete = []
+        if docs:
+            ids_to_delete.extend(d.id for d in docs)
+        if ids:
+            ids_to_delete.extend(ids)
+
+        routed = [[] for _ in range(self.shards)]
+        for ext_id in dict.fromkeys(ids_to_delete):
+            routed[shard_of(ext_id, self.shards)].append(ext_id)
+
+        with self._lock:
+            deleted = self._call([("delete", (r,)) if r else None for r in routed])
+        return sum(d for d in deleted if d)
+
+    def search(self, query: Union[Query, str]) -> List[Document]:
+        """
+        matching documents in append order
+        """
+        with self._lock:
+            shard_hits = self._call_all("search", query)
+        return [doc for _, doc in merge(*shard_hits, key=lambda h: h[0])]
+
+    def retrieve_top_n(
+        self,
+        query: Union[Query, str],
+        n: Optional[int] = None,
+        search_after: Optional[Union[Document, Tuple[float, str]]] = None,
+    ) -> List[Document]:
+        """
+        same ordering and paging as Index.retrieve_top_n
+        """
+        with self._lock:
+            after = None
+            if search_after is not None:
+                after = self._resolve_cursor(search_after)
+
+            stats = CorpusStats()
+            for shard_stats in self._call_all("query_stats", query):
+                stats.merge(shard_stats)
+
+            # (score, global sequence number, Document)
+            hits = []
+            for shard_hits in self._call_all("top_n", query, n or None, stats, after):
+                hits.extend(shard_hits)
+
+        hits.sort(key=lambda h: (-h[0], h[1]))
+        if n:
+            hits = hits[:n]
+        return [doc for _, _, doc in hits]
+
+    def _resolve_cursor(
+        self, search_after: Union[Document, Tuple[float, str]]
+    ) -> Tuple[float, int]:
+        if isinstance(search_after, Document):
+            score, ext_id = search_after.score, search_after.id
+        else:
+            score, ext_id = search_after
+
+        seq = None
+        if ext_id is not None:
+            requests = [None] * self.shards
+            shard = shard_of(ext_id, self.shards)
+            requests[shard] = ("seq_of", (ext_id,))
+            seq = self._call(requests)[shard]
+
+        if score is None or seq is None:
+            raise TextSearchPyError(
+                f"search_after requires a scored document in index, found: {ext_id}"
+            )
+        return score, seq
+
+    def close(self):
+        """
+        stop the worker processes, their documents are discarded
+        """
+        with self._lock:
+            conns = self._conns
+            self._conns = None
+        if conns is None:
+            return
+
+        for conn in conns:
+            conn.send(None)
+            conn.close()
+        for process in self._processes:
+            process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,105 @@
+import math
+from typing import Dict, Optional, Tuple
+
+# (normalized terms, distance, ordered) identifying a phrase query
+PhraseKey = Tuple[Tuple[str, ...], int, bool]
+
+
+class BM25:
+    """
+    bm25 scoring for a fixed document count and total token count
+
+    idf by document frequency and the length norm by document length are computed once
+    and cached, so scoring a posting is a lookup, a multiply and a divide
+    scores are computed with the same operations in the same order as the plain formula,
+    so they are identical to it
+    """
+
+    # default following elastic search
+    k1 = 1.2
+    b = 0.75
+
+    __slots__ = ("doc_count", "total_tokens", "_avg_doc_length", "_idfs", "_norms")
+
+    def __init__(self, doc_count: int, total_tokens: int):
+        self.doc_count = doc_count
+        self.total_tokens = total_tokens
+        # an empty corpus has nothing to score
+        self._avg_doc_length = total_tokens / doc_count if doc_count else 0
+        self._idfs: Dict[int, float] = {}
+        self._norms: Dict[int, float] = {}
+
+    def idf(self, match_freq: int) -> float:
+        idf = self._idfs.get(match_freq)
+        if idf is None:
+            doc_n = self.doc_count
+            idf = math.log((doc_n - match_freq + 0.5) / (match_freq + 0.5) + 1)
+            self._idfs[match_freq] = idf
+        return idf
+
+    def norm(self, token_len: int) -> float:
+        """
+        k1 scaled length normalization, the part of the denominator added to term_freq
+        """
+        norm = self._norms.get(token_len)
+        if norm is None:
+            k1 = self.k1
+            b = self.b
+            avg_doc_length = self._avg_doc_length
+            # only empty documents are live, lengths are taken as average
+            if avg_doc_length:
+                norm = k1 * (1 - b + b * token_len / avg_doc_length)
+            else:
+                norm = k1
+            self._norms[token_len] = norm
+        return norm
+
+    def score(self, term_freq: int, match_freq: int, token_len: int) -> float:
+        top_term = term_freq * (self.k1 + 1)
+        bot_term = term_freq + self.norm(token_len)
+        return self.idf(match_freq) * top_term / bot_term
+
+
+class CorpusStats:
+    """
+    corpus statistics used by BM25 scoring
+
+    an index split into parts (i.e. segments) sums the statistics of every part for a query,
+    so each part scores its documents as if it held the whole corpus
+    """
+
+    __slots__ = ("doc_count", "total_tokens", "term_dfs", "phrase_dfs", "_bm25")
+
+    def __init__(
+        self,
+        doc_count: int = 0,
+        total_tokens: int = 0,
+        term_dfs: Optional[Dict[str, int]] = None,
+        phrase_dfs: Optional[Dict[PhraseKey, int]] = None,
+    ):
+        self.doc_count = doc_count
+        self.total_tokens = total_tokens
+        # {term: number of documents containing term}
+        self.term_dfs: Dict[str, int] = term_dfs if term_dfs is not None else {}
+        # {phrase key: number of documents matching the phrase}
+        self.phrase_dfs: Dict[PhraseKey, int] = (
+            phrase_dfs if phrase_dfs is not None else {}
+        )
+        self._bm25: Optional[BM25] = None
+
+    def bm25(self) -> BM25:
+        if (
+            self._bm25 is None
+            or self._bm25.doc_count != self.doc_count
+            or self._bm25.total_tokens != self.total_tokens
+        ):
+            self._bm25 = BM25(self.doc_count, self.total_tokens)
+        return self._bm25
+
+    def merge(self, other: "CorpusStats"):
+        self.doc_count += other.doc_count
+        self.total_tokens += other.total_tokens
+        for term, df in other.term_dfs.items():
+            self.term_dfs[term] = self.term_dfs.get(term, 0) + df
+        for key, df in other.phrase_dfs.items():
+            self.phrase_dfs[key] = self.phrase_dfs.get(key, 0) + df
@@ -0,0 +1,344 @@
+"""
+binary index file layout, all integers little endian
+
+preamble: magic b"TSPY", format version (uint32), header offset (uint64), header length (uint64)
+sections, located through the header:
+    doc_lengths       uint32 token count per internal doc id
+    doc_id_offsets    uint64 byte offsets into doc_id_blob, one more than doc count
+    doc_id_blob       utf-8 external document ids
+    doc_offsets       uint64 byte offset of each document line in docs.jsonl, one more than
+                      doc count, optional
+    term_offsets      uint64 byte offsets into term_blob, one more than term count
+    term_blob         utf-8 terms in sorted order
+    postings_offsets  uint64 byte offset of each term's postings block
+    doc_freqs         uint32 number of documents per term
+    position_counts   uint32 number of positions per term
+    max_tfs           uint32 highest term frequency per term
+    min_doc_lengths   uint32 shortest document length per term
+    postings blocks   per term: doc ids (uint32 * df), position offsets (uint32 * (df + 1)),
+                      positions (uint32 * position count)
+header: utf-8 json with index metadata and the (offset, count) of each section
+"""
+
+from array import array
+from bisect import bisect_left
+from collections.abc import MutableMapping
+import json
+import mmap
+import struct
+import sys
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+from .exception import TextSearchPyError
+from .postings import Postings
+
+MAGIC = b"TSPY"
+FORMAT_VERSION = 1
+
+_PREAMBLE = struct.Struct("<4sIQQ")
+
+_TERM_COLUMNS = [
+    ("postings_offsets", "Q"),
+    ("doc_freqs", "I"),
+    ("position_counts", "I"),
+    ("max_tfs", "I"),
+    ("min_doc_lengths", "I"),
+]
+
+
+def _array_bytes(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _blob_with_offsets(values: Iterable[str]) -> Tuple[bytes, array]:
+    offsets = array("Q", [0])
+    parts = []
+    size = 0
+    for v in values:
+        encoded = v.encode("utf-8")
+        parts.append(encoded)
+        size += len(encoded)
+        offsets.append(size)
+    return b"".join(parts), offsets
+
+
+class _SectionWriter:
+    def __init__(self, f):
+        self.f = f
+        self.sections: Dict[str, Tuple[int, int]] = {}
+
+    def write(self, name: str, data: bytes, count: int):
+        self.sections[name] = (self.f.tell(), count)
+        self.f.write(data)
+
+
+def write_index_file(
+    path: str,
+    metadata: Dict,
+    doc_ids: List[str],
+    doc_lengths: array,
+    postings_by_term: Mapping[str, Postings],
+    doc_id_map: Optional[array] = None,
+    doc_offsets: Optional[array] = None,
+):
+    """
+    write an index to path in the binary format
+    doc_id_map optionally maps the doc ids stored in postings to the dense ids being written
+    doc_offsets optionally records where each document starts in the documents file
+    """
+    terms = sorted(postings_by_term.keys())
+
+    with open(path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, 0))
+        writer = _SectionWriter(f)
+
+        writer.write("doc_lengths", _array_bytes(doc_lengths), len(doc_lengths))
+        doc_id_blob, doc_id_offsets = _blob_with_offsets(doc_ids)
+        writer.write(
+            "doc_id_offsets", _array_bytes(doc_id_offsets), len(doc_id_offsets)
+        )
+        writer.write("doc_id_blob", doc_id_blob, len(doc_id_blob))
+        if doc_offsets is not None:
+            writer.write("doc_offsets", _array_bytes(doc_offsets), len(doc_offsets))
+
+        term_blob, term_offsets = _blob_with_offsets(terms)
+        writer.write("term_offsets", _array_bytes(term_offsets), len(term_offsets))
+        writer.write("term_blob", term_blob, len(term_blob))
+
+        columns = {name: array(typecode) for name, typecode in _TERM_COLUMNS}
+        postings_start = f.tell()
+        for term in terms:
+            postings = postings_by_term[term].decompress()
+            term_doc_ids = postings.doc_ids
+            if doc_id_map is not None:
+                term_doc_ids = array("I", [doc_id_map[d] for d in term_doc_ids])
+
+            columns["postings_offsets"].append(f.tell())
+            columns["doc_freqs"].append(len(term_doc_ids))
+            columns["position_counts"].append(len(postings.positions))
+            columns["max_tfs"].append(postings.max_tf)
+            columns["min_doc_lengths"].append(postings.min_doc_length or 0)
+
+            f.write(_array_bytes(term_doc_ids))
+            f.write(_array_bytes(postings.offsets))
+            f.write(_array_bytes(postings.positions))
+        writer.sections["postings"] = (postings_start, len(terms))
+
+        for name, _ in _TERM_COLUMNS:
+            writer.write(name, _array_bytes(columns[name]), len(columns[name]))
+
+        header = dict(metadata)
+        header["doc_count"] = len(doc_ids)
+        header["term_count"] = len(terms)
+        header["sections"] = writer.sections
+        header_bytes = json.dumps(header).encode("utf-8")
+        header_offset = f.tell()
+        f.write(header_bytes)
+
+        f.seek(0)
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_offset, len(header_bytes)))
+
+
+class _BlobStrings:
+    """
+    sequence of utf-8 strings in a blob, decoded on access
+    """
+
+    def __init__(self, buffer, start: int, offsets: array):
+        self._buffer = buffer
+        self._start = start
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def raw(self, i: int) -> bytes:
+        return self._buffer[
+            self._start + self._offsets[i] : self._start + self._offsets[i + 1]
+        ]
+
+    def __getitem__(self, i: int) -> str:
+        return self.raw(i).decode("utf-8")
+
+
+class _RawBlobStrings:
+    # adapter so bisect can compare encoded terms without decoding them
+    def __init__(self, strings: _BlobStrings):
+        self._strings = strings
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    def __getitem__(self, i: int) -> bytes:
+        return self._strings.raw(i)
+
+
+class IndexFileReader:
+    """
+    memory maps a binary index file, only the per term tables are read on open,
+    postings are decoded when requested
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise TextSearchPyError(f"{path} is not a valid index file")
+
+        if len(self._mmap) < _PREAMBLE.size:
+            self.close()
+            raise TextSearchPyError(f"{path} is not a valid index file")
+
+        magic, version, header_offset, header_length = _PREAMBLE.unpack_from(
+            self._mmap, 0
+        )
+        if magic != MAGIC:
+            self.close()
+            raise TextSearchPyError(f"{path} is not a valid index file")
+        if version > FORMAT_VERSION:
+            self.close()
+            raise TextSearchPyError(
+                f"{path} has format version {version}, newest supported is {FORMAT_VERSION}"
+            )
+
+        self.metadata = json.loads(
+            self._mmap[header_offset : header_offset + header_length].decode("utf-8")
+        )
+        self._sections = self.metadata["sections"]
+
+        self.terms = _BlobStrings(
+            self._mmap,
+            self._sections["term_blob"][0],
+            self._read_section("term_offsets", "Q"),
+        )
+        self._raw_terms = _RawBlobStrings(self.terms)
+        self._columns = {
+            name: self._read_section(name, typecode) for name, typecode in _TERM_COLUMNS
+        }
+
+    def _read_array(self, typecode: str, offset: int, count: int) -> array:
+        values = array(typecode)
+        values.frombytes(self._mmap[offset : offset + count * values.itemsize])
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+    def _read_section(self, name: str, typecode: str) -> array:
+        offset, count = self._sections[name]
+        return self._read_array(typecode, offset, count)
+
+    def doc_lengths(self) -> array:
+        return self._read_section("doc_lengths", "I")
+
+    def doc_ids(self) -> _BlobStrings:
+        return _BlobStrings(
+            self._mmap,
+            self._sections["doc_id_blob"][0],
+            self._read_section("doc_id_offsets", "Q"),
+        )
+
+    def doc_offsets(self) -> Optional[array]:
+        if "doc_offsets" not in self._sections:
+            return None
+        return self._read_section("doc_offsets", "Q")
+
+    def find_term(self, term: str) -> Optional[int]:
+        # terms are written sorted, utf-8 byte order matches str code point order
+        encoded = term.encode("utf-8")
+        i = bisect_left(self._raw_terms, encoded)
+        if i < len(self.terms) and self._raw_terms[i] == encoded:
+            return i
+        return None
+
+    def read_postings(self, term_i: int) -> Postings:
+        offset = self._columns["postings_offsets"][term_i]
+        df = self._columns["doc_freqs"][term_i]
+        position_count = self._columns["position_counts"][term_i]
+
+        doc_ids = self._read_array("I", offset, df)
+        offset += df * doc_ids.itemsize
+        offsets = self._read_array("I", offset, df + 1)
+        offset += (df + 1) * offsets.itemsize
+        positions = self._read_array("I", offset, position_count)
+
+        return Postings.from_arrays(
+            doc_ids,
+            offsets,
+            positions,
+            self._columns["max_tfs"][term_i],
+            self._columns["min_doc_lengths"][term_i] if df else None,
+        )
+
+    def close(self):
+        if not self._mmap.closed:
+            self._mmap.close()
+        self._file.close()
+
+
+class MappedPostings(MutableMapping):
+    """
+    {token: Postings} backed by an IndexFileReader
+    postings are decoded from the file on first access and then kept in memory,
+    so changes from append and delete apply to the decoded copy
+    """
+
+    def __init__(self, reader: IndexFileReader):
+        self._reader = reader
+        self._loaded: Dict[str, Postings] = {}
+        # terms in the file that were deleted from the index
+        self._removed: Set[str] = set()
+        # terms added to the index that are not in the file
+        self._added: Set[str] = set()
+
+    def _in_file(self, term: str) -> bool:
+        return self._reader.find_term(term) is not None
+
+    def __getitem__(self, term: str) -> Postings:
+        postings = self._loaded.get(term)
+        if postings is not None:
+            return postings
+        if term in self._removed:
+            raise KeyError(term)
+
+        term_i = self._reader.find_term(term)
+        if term_i is None:
+            raise KeyError(term)
+
+        # two threads may decode the same postings, both get the first one stored
+        return self._loaded.setdefault(term, self._reader.read_postings(term_i))
+
+    def __contains__(self, term) -> bool:
+        if term in self._loaded:
+            return True
+        return term not in self._removed and self._in_file(term)
+
+    def __setitem__(self, term: str, postings: Postings):
+        if term not in self._loaded and term not in self._removed:
+            if not self._in_file(term):
+                self._added.add(term)
+        self._removed.discard(term)
+        self._loaded[term] = postings
+
+    def __delitem__(self, term: str):
+        if term not in self:
+            raise KeyError(term)
+        self._loaded.pop(term, None)
+        if term in self._added:
+            self._added.discard(term)
+        else:
+            self._removed.add(term)
+
+    def __iter__(self) -> Iterator[str]:
+        for term_i in range(len(self._reader.terms)):
+            term = self._reader.terms[term_i]
+            if term not in self._removed:
+                yield term
+        yield from list(self._added)
+
+    def __len__(self) -> int:
+        return len(self._reader.terms) - len(self._removed) + len(self._added)
@@ -0,0 +1,177 @@
+from bisect import bisect_left
+import re
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+# leading run of characters a wildcard pattern matches literally
+_LITERAL_PREFIX = re.compile(r"\w*")
+# characters a wildcard pattern does not match literally, i.e. ? * and regex syntax
+_NON_LITERAL = re.compile(r"\W")
+# regex syntax other than the ? and * wildcards, the pattern may then match terms
+# outside its literal prefix or k-grams (i.e. "ab|cd")
+_REGEX_SYNTAX = re.compile(r"[^\w?*]")
+
+
+class KGramIndex:
+    """
+    {k-gram: terms containing it}, terms are padded with $ on both ends so k-grams at the
+    start and end of a term are anchored, i.e. with k=3 "tion" has grams $ti tio ion on$
+    """
+
+    def __init__(self, k: int = 3):
+        if k < 2:
+            raise ValueError("k-gram size should be >= 2")
+        self.k = k
+        self._terms_by_gram: Dict[str, Set[str]] = {}
+
+    def _grams(self, text: str) -> Set[str]:
+        k = self.k
+        return {text[i : i + k] for i in range(len(text) - k + 1)}
+
+    def add(self, term: str):
+        for gram in self._grams("$" + term + "$"):
+            terms = self._terms_by_gram.get(gram)
+            if terms is None:
+                self._terms_by_gram[gram] = {term}
+            else:
+                terms.add(term)
+
+    def discard(self, term: str):
+        for gram in self._grams("$" + term + "$"):
+            terms = self._terms_by_gram.get(gram)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self._terms_by_gram[gram]
+
+    def candidates(self, wildcard: str) -> Optional[Set[str]]:
+        """
+        terms containing every k-gram of the literal parts of wildcard, a superset of the
+        terms matching it, None when no literal part is long enough to give a k-gram
+        """
+        pieces = _NON_LITERAL.split(wildcard)
+        grams = set()
+        for i, piece in enumerate(pieces):
+            if not piece:
+                continue
+            if i == 0:
+                piece = "$" + piece
+            if i == len(pieces) - 1:
+                piece = piece + "$"
+            grams.update(self._grams(piece))
+
+        if not grams:
+            return None
+
+        # intersect starting from the rarest gram
+        term_sets = sorted(
+            (self._terms_by_gram.get(gram, set()) for gram in grams), key=len
+        )
+        result = set(term_sets[0])
+        for terms in term_sets[1:]:
+            if not result:
+                break
+            result &= terms
+        return result
+
+
+class TermDictionary:
+    """
+    terms of an index in sorted order, terms sharing a prefix form a contiguous range
+    found with a binary search
+
+    added and removed terms are collected and applied on the next lookup, new terms are
+    sorted on their own and merged in, so keeping up with appends costs far less than
+    sorting the whole vocabulary again
+
+    with kgram_size set a KGramIndex is kept as well, for wildcards without a literal prefix
+    """
+
+    def __init__(self, terms: Iterable[str] = (), kgram_size: Optional[int] = None):
+        self._sorted: List[str] = sorted(terms)
+        self._added: List[str] = []
+        self._removed: Set[str] = set()
+        # changes are recorded and applied under the lock, so lookups can run while
+        # terms are added
+        self._lock = threading.Lock()
+
+        self._kgrams: Optional[KGramIndex] = None
+        if kgram_size:
+            self._kgrams = KGramIndex(kgram_size)
+            for term in self._sorted:
+                self._kgrams.add(term)
+
+    def add(self, term: str):
+        with self._lock:
+            if term in self._removed:
+                self._removed.discard(term)
+            else:
+                self._added.append(term)
+
+    def discard(self, term: str):
+        with self._lock:
+            self._removed.add(term)
+
+    def _refresh(self):
+        if self._removed or self._added:
+            with self._lock:
+                self._apply_changes()
+
+    def _apply_changes(self):
+        if self._removed:
+            removed = self._removed
+            self._sorted = [t for t in self._sorted if t not in removed]
+            self._added = [t for t in self._added if t not in removed]
+            if self._kgrams is not None:
+                for term in removed:
+                    self._kgrams.discard(term)
+            self._removed = set()
+        if self._added:
+            if self._kgrams is not None:
+                for term in self._added:
+                    self._kgrams.add(term)
+            self._added.sort()
+            # a new list, lookups still reading the previous one are not disturbed
+            merged = self._sorted + self._added
+            # two sorted runs, which sort merges in linear time
+            merged.sort()
+            self._sorted = merged
+            self._added = []
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._sorted)
+
+    def __iter__(self) -> Iterator[str]:
+        self._refresh()
+        return iter(self._sorted)
+
+    def prefix_range(self, prefix: str) -> List[str]:
+        """
+        terms starting with prefix in sorted order
+        """
+        self._refresh()
+        terms = self._sorted
+        start = bisect_left(terms, prefix)
+        end = start
+        while end < len(terms) and terms[end].startswith(prefix):
+            end += 1
+        return terms[start:end]
+
+    def candidates(self, wildcard: str) -> List[str]:
+        """
+        terms in sorted order that can match wildcard, still to be checked against the pattern
+        uses the prefix range, narrowed down by k-grams when available
+        """
+        self._refresh()
+        if _REGEX_SYNTAX.search(wildcard):
+            return list(self._sorted)
+
+        prefix = _LITERAL_PREFIX.match(wildcard).group()
+
+        if self._kgrams is not None:
+            matched = self._kgrams.candidates(wildcard)
+            if matched is not None:
+                return sorted(t for t in matched if t.startswith(prefix))
+
+        return self.prefix_range(prefix)
@@ -0,0 +1,29 @@
+import random
+from src.textsearchpy.index import Document
+
+
+def random_docs(seed, count):
+    rng = random.Random(seed)
+    # the default tokenizer drops digits so words are letters only
+    vocab = [a + b for a in "abcde" for b in "abcdefgh"]
+    docs = []
+    for i in range(count):
+        words = rng.choices(vocab, weights=range(40, 0, -1), k=rng.randint(1, 15))
+        docs.append(Document(id=f"doc{i}", text=" ".join(words)))
+    return docs
+
+
+def copy_docs(docs):
+    return [Document(id=d.id, text=d.text) for d in docs]
+
+
+# queries over the vocabulary of random_docs
+QUERIES = [
+    "aa",
+    "ad OR cb",
+    "ab AND ac",
+    "(ae OR af) NOT aa",
+    '"aa ab"~2',
+    '"ac aa ab"~3',
+    "b*",
+]
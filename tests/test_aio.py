@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import pytest
+from src.textsearchpy.aio import AsyncIndex
+from src.textsearchpy.exception import QueryRejectedError
+from src.textsearchpy.index import Document, Index
+from src.textsearchpy.query import BooleanClause, BooleanQuery, TermQuery
+from src.textsearchpy.segments import SegmentedIndex
+
+
+class BlockingIndex(Index):
+    """
+    index whose queries wait until released, to hold queries in flight
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def search(self, query):
+        self.calls += 1
+        self.release.wait(5)
+        return super().search(query)
+
+
+def _index(index):
+    index.append(
+        [
+            Document(id="1", text="fox"),
+            Document(id="2", text="fox dog"),
+            Document(id="3", text="dog"),
+        ]
+    )
+    return index
+
+
+def test_async_index_queries():
+    async def run():
+        async with AsyncIndex(_index(Index()), max_concurrency=2) as index:
+            docs = await index.search("fox")
+            assert [d.id for d in docs] == ["1", "2"]
+
+            page = await index.retrieve_top_n("fox OR dog", n=2)
+            assert len(page) == 2
+            rest = await index.retrieve_top_n("fox OR dog", n=2, search_after=page[-1])
+            assert [d.id for d in page + rest] == [
+                d.id for d in index.index.retrieve_top_n("fox OR dog")
+            ]
+
+    asyncio.run(run())
+
+
+def test_async_index_segmented():
+    async def run():
+        segmented = SegmentedIndex(max_buffered_docs=2, background_merges=False)
+        async with AsyncIndex(_index(segmented)) as index:
+            docs = await index.search("FOX")
+            assert [d.id for d in docs] == ["1", "2"]
+            page = await index.retrieve_top_n("fox OR dog", n=2)
+            assert page == segmented.retrieve_top_n("fox OR dog", n=2)
+
+    asyncio.run(run())
+
+
+def test_async_index_coalesces_identical_queries():
+    async def run():
+        blocking = _index(BlockingIndex())
+        index = AsyncIndex(blocking, max_concurrency=4)
+
+        tasks = [asyncio.ensure_future(index.search("fox")) for _ in range(5)]
+        other = asyncio.ensure_future(index.search("dog"))
+        await asyncio.sleep(0.05)
+        assert index.pending == 2
+
+        blocking.release.set()
+        results = await asyncio.gather(*tasks)
+        assert [d.id for d in (await other)] == ["2", "3"]
+
+        assert blocking.calls == 2
+        assert index.evaluations == 2 and index.coalesced == 4
+        assert all([d.id for d in r] == ["1", "2"] for r in results)
+        # every caller gets its own list
+        assert results[0] is not results[1]
+        assert index.pending == 0
+        index.close()
+
+    asyncio.run(run())
+
+
+def test_async_index_query_objects_coalesce_by_plan():
+    async def run():
+        blocking = _index(BlockingIndex())
+        index = AsyncIndex(blocking, max_concurrency=4)
+
+        def must(term):
+            return BooleanQuery(
+                clauses=[BooleanClause(query=TermQuery(term=term), clause="MUST")]
+            )
+
+        fox = asyncio.ensure_future(index.search(must("fox")))
+        dog = asyncio.ensure_future(index.search(must("dog")))
+        same_fox = asyncio.ensure_future(index.search(must("FOX")))
+        await asyncio.sleep(0.05)
+        assert index.pending == 2
+
+        blocking.release.set()
+        assert [d.id for d in await fox] == ["1", "2"]
+        assert [d.id for d in await dog] == ["2", "3"]
+        assert [d.id for d in await same_fox] == ["1", "2"]
+        assert index.evaluations == 2 and index.coalesced == 1
+        index.close()
+
+    asyncio.run(run())
+
+
+def test_async_index_rejects_when_full():
+    async def run():
+        blocking = _index(BlockingIndex())
+        index = AsyncIndex(blocking, max_concurrency=1, max_pending=2)
+
+        first = asyncio.ensure_future(index.search("fox"))
+        second = asyncio.ensure_future(index.search("dog"))
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(QueryRejectedError):
+            await index.search("cat")
+        # identical to a pending query, so it joins it rather than being rejected
+        joined = asyncio.ensure_future(index.search("fox"))
+
+        blocking.release.set()
+        assert [d.id for d in await first] == [d.id for d in await joined]
+        await second
+        assert index.pending == 0
+        index.close()
+
+    asyncio.run(run())
+
+
+def test_async_index_keeps_loop_responsive():
+    async def run():
+        blocking = _index(BlockingIndex())
+        index = AsyncIndex(blocking, max_concurrency=1)
+        query = asyncio.ensure_future(index.search("fox"))
+
+        # the event loop keeps running while the query is blocked on a worker thread
+        for _ in range(3):
+            await asyncio.sleep(0.01)
+        assert not query.done()
+
+        blocking.release.set()
+        assert len(await query) == 2
+        index.close()
+
+    asyncio.run(run())
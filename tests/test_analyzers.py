@@ -0,0 +1,59 @@
+import random
+from src.textsearchpy.analyzers import Analyzer
+from src.textsearchpy.normalizers import (
+    LowerCaseNormalizer,
+    StopwordsNormalizer,
+    TokenNormalizer,
+)
+from src.textsearchpy.tokenizers import NGramTokenizer, SimpleTokenizer
+
+
+class ReverseNormalizer(TokenNormalizer):
+    def normalize(self, tokens):
+        return [t[::-1] for t in tokens]
+
+
+class UpperStopwords(StopwordsNormalizer):
+    def normalize(self, tokens):
+        return [t for t in tokens if t.upper() not in self.stopwords]
+
+
+def _unfused(tokenizer, normalizers, text):
+    tokens = tokenizer.tokenize(text)
+    for normalizer in normalizers:
+        tokens = normalizer.normalize(tokens)
+    return tokens
+
+
+def test_analyzer_matches_unfused_pipeline():
+    rng = random.Random(0)
+    words = ["The", "quick", "BROWN", "fox", "is", "İstanbul", "ÉTÉ", "a1b", "Of", "x"]
+    texts = [" ".join(rng.choices(words, k=12)) for _ in range(50)]
+    texts += ["", "   ", "ÀB Cd", "İ"]
+
+    pipelines = [
+        [],
+        [LowerCaseNormalizer()],
+        [StopwordsNormalizer()],
+        [LowerCaseNormalizer(), StopwordsNormalizer()],
+        [StopwordsNormalizer(["The", "Of"]), LowerCaseNormalizer()],
+        [
+            StopwordsNormalizer(["The"]),
+            LowerCaseNormalizer(),
+            StopwordsNormalizer(["quick"]),
+        ],
+        [LowerCaseNormalizer(), ReverseNormalizer(), StopwordsNormalizer(["xof"])],
+        [UpperStopwords(["FOX"]), LowerCaseNormalizer()],
+    ]
+    for tokenizer in [SimpleTokenizer(), NGramTokenizer(2, 3)]:
+        for normalizers in pipelines:
+            analyzer = Analyzer(tokenizer, normalizers)
+            expected = [_unfused(tokenizer, normalizers, text) for text in texts]
+            assert [analyzer.analyze(text) for text in texts] == expected
+            assert analyzer.analyze_batch(texts) == expected
+
+
+def test_analyzer_defaults():
+    analyzer = Analyzer()
+    assert analyzer.analyze("The Quick fox 42") == ["the", "quick", "fox"]
+    assert analyzer.normalize(["Fox"]) == ["fox"]
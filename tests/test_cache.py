@@ -0,0 +1,84 @@
+from src.textsearchpy.cache import ResultCache
+from src.textsearchpy.index import Document, Index
+
+
+def _index():
+    index = Index(result_cache_bytes=1024 * 1024)
+    index.append(
+        [
+            Document(id="1", text="the quick brown fox"),
+            Document(id="2", text="lazy dog"),
+            Document(id="3", text="fox and dog"),
+        ]
+    )
+    return index
+
+
+def test_result_cache_hits():
+    index = _index()
+    cache = index.result_cache
+
+    first = index.retrieve_top_n("fox OR dog", n=2)
+    assert cache.misses == 1 and cache.hits == 0
+
+    # same plan after normalization shares the entry
+    second = index.retrieve_top_n("FOX OR dog", n=2)
+    assert cache.hits == 1
+    assert [(d.id, d.score) for d in second] == [(d.id, d.score) for d in first]
+
+    # n and mode are part of the key
+    index.retrieve_top_n("fox OR dog", n=1)
+    assert [d.id for d in index.search("fox OR dog")] == ["1", "2", "3"]
+    assert cache.misses == 3
+    assert cache.stats()["entries"] == 3
+
+
+def test_result_cache_invalidated_by_changes(tmp_path, mocker):
+    mocker.patch("importlib.metadata.version", return_value="1.0.0")
+    index = _index()
+    assert [d.id for d in index.search("fox")] == ["1", "3"]
+
+    index.append([Document(id="4", text="fox")])
+    assert [d.id for d in index.search("fox")] == ["1", "3", "4"]
+
+    index.delete(ids=["1"])
+    assert [d.id for d in index.search("fox")] == ["3", "4"]
+
+    index.bulk_append([Document(id="5", text="fox")], workers=1)
+    assert [d.id for d in index.search("fox")] == ["3", "4", "5"]
+
+    index.save(str(tmp_path / "saved"))
+    other = _index()
+    other.append([Document(id="6", text="fox")])
+    assert [d.id for d in other.search("fox")] == ["1", "3", "6"]
+    other.load_from_file(str(tmp_path / "saved"))
+    assert [d.id for d in other.search("fox")] == ["3", "4", "5"]
+
+
+def test_result_cache_eviction():
+    docs = [Document(id=str(i), text="x" * 100) for i in range(2)]
+    cache = ResultCache(max_bytes=1500)
+
+    cache.put("a", 0, docs)
+    cache.put("b", 0, docs)
+    cache.put("c", 0, docs)
+    assert cache.size_bytes <= 1500
+    assert cache.evictions == 1
+    assert cache.get("a", 0) is None
+    assert cache.get("b", 0) == docs
+    assert cache.get("c", 0) == docs
+
+    # entries of an older generation are dropped
+    assert cache.get("c", 1) is None
+    assert len(cache) == 0
+
+    # results too large for the cache are not stored
+    cache.put("d", 1, docs * 10)
+    assert len(cache) == 0
+
+
+def test_result_cache_disabled_by_default():
+    index = Index()
+    index.append(["fox"])
+    assert index.result_cache is None
+    assert [d.text for d in index.search("fox")] == ["fox"]
@@ -0,0 +1,54 @@
+from src.textsearchpy.collectors import TopNCollector
+
+
+def test_top_n_collector():
+    collector = TopNCollector(n=3)
+    for doc_id, score in [(0, 1.0), (1, 3.0), (2, 2.0), (3, 3.0), (4, 0.5)]:
+        collector.collect(doc_id, score)
+
+    # ties ordered by doc id ascending
+    assert collector.top_docs() == [(3.0, 1), (3.0, 3), (2.0, 2)]
+    assert collector.threshold == 2.0
+
+    # equal score only replaces a larger doc id
+    assert not collector.collect(5, 2.0)
+    assert collector.collect(0, 2.0)
+    assert collector.top_docs() == [(3.0, 1), (3.0, 3), (2.0, 0)]
+
+
+def test_top_n_collector_unbounded():
+    collector = TopNCollector()
+    for doc_id, score in [(0, 1.0), (1, 3.0), (2, 2.0)]:
+        collector.collect(doc_id, score)
+
+    assert collector.threshold is None
+    assert collector.top_docs() == [(3.0, 1), (2.0, 2), (1.0, 0)]
+
+
+def test_top_n_collector_negative_n():
+    collector = TopNCollector(n=-1)
+    assert not collector.collect(0, 1.0)
+    assert collector.threshold is None
+    assert collector.top_docs() == []
+
+
+def test_top_n_collector_after():
+    hits = [(0, 1.0), (1, 3.0), (2, 2.0), (3, 3.0), (4, 2.0), (5, 0.5)]
+
+    pages = []
+    after = None
+    while True:
+        collector = TopNCollector(n=2, after=after)
+        for doc_id, score in hits:
+            collector.collect(doc_id, score)
+        page = collector.top_docs()
+        if not page:
+            break
+        pages.append(page)
+        after = page[-1]
+
+    assert pages == [
+        [(3.0, 1), (3.0, 3)],
+        [(2.0, 2), (2.0, 4)],
+        [(1.0, 0), (0.5, 5)],
+    ]
@@ -0,0 +1,46 @@
+import pytest
+from src.textsearchpy.docstore import Document, DocumentStore, DocumentsView
+
+
+def test_document_store_memory():
+    store = DocumentStore()
+    store.add(0, Document(text="you like cookie", id="a"))
+    store.add(1, Document(text="we like cake", id="b"))
+
+    assert store[1].text == "we like cake"
+
+    store.remove(0)
+    with pytest.raises(KeyError):
+        store[0]
+
+
+def test_document_store_file(tmp_path):
+    path = tmp_path / "docs.jsonl"
+    docs = [
+        Document(text="you like cookie", id="a", count=3),
+        Document(text="we like cake\nand tea", id="b", count=5),
+        Document(text="", id="c", count=0),
+    ]
+    path.write_text("".join(d.model_dump_json() + "\n" for d in docs))
+
+    store = DocumentStore.open(str(path))
+    assert store.file_count == 3
+    assert store[1] == docs[1]
+    assert store[2] == docs[2]
+
+    # appended documents continue after the file documents
+    store.add(3, Document(text="tea party", id="d"))
+    assert store[3].text == "tea party"
+
+    store.remove(0)
+    with pytest.raises(KeyError):
+        store[0]
+    with pytest.raises(KeyError):
+        store[4]
+
+    view = DocumentsView({"b": 1, "d": 3}, store)
+    assert len(view) == 2
+    assert "a" not in view
+    assert view["b"].text == "we like cake\nand tea"
+    assert [d.id for d in view.values()] == ["b", "d"]
+    store.close()
@@ -1,6 +1,10 @@
 import json
+import random
+import string
+import threading
 import pytest
 from src.textsearchpy.index import Document, Index, IndexingError
+from src.textsearchpy.exception import TextSearchPyError
 from src.textsearchpy.query import (
     BooleanClause,
     BooleanQuery,
@@ -8,7 +12,7 @@ from src.textsearchpy.query import (
     TermQuery,
     WildcardQuery,
 )
-from src.textsearchpy.normalizers import StopwordsNormalizer
+from src.textsearchpy.normalizers import LowerCaseNormalizer, StopwordsNormalizer
 import os
 
 
@@ -77,11 +81,147 @@ def test_positional_index_append():
     doc1_id = list(index.positional_index["a"].keys())[0]
     doc2_id = list(index.positional_index["away"].keys())[0]
 
-    assert index.documents[doc1_id].text == doc1.text
-    assert index.documents[doc2_id].text == doc2.text
+    assert doc1_id == 0
+    assert doc2_id == 1
+    assert index.documents[index._doc_ids[doc1_id]].text == doc1.text
+    assert index.documents[index._doc_ids[doc2_id]].text == doc2.text
 
-    assert index.positional_index["book"][doc1_id] == [1, 9]
-    assert index.positional_index["book"][doc2_id] == [4]
+    assert index.positional_index["book"][doc1_id].tolist() == [1, 9]
+    assert index.positional_index["book"][doc2_id].tolist() == [4]
+    assert index.inverted_index["book"].tolist() == [0, 1]
+
+
+def test_append_streams_iterables(tmp_path):
+    def generate():
+        for i in range(10):
+            yield Document(id=str(i), text=f"fox {'dog ' * i}")
+
+    index = Index()
+    index.append(generate(), batch_size=3)
+    assert len(index) == 10
+    assert [d.id for d in index.search("dog")] == [str(i) for i in range(1, 10)]
+
+    index.append(text for text in ["lazy cat", "quick cat"])
+    assert len(index.search("cat")) == 2
+
+    jsonl_path = tmp_path / "docs.jsonl"
+    with open(jsonl_path, "w") as f:
+        f.write('{"text": "jsonl cat", "id": "j1"}\n\n{"text": "jsonl bird"}\n')
+    index.append_jsonl(str(jsonl_path), batch_size=1)
+    assert [d.id for d in index.search("jsonl")][0] == "j1"
+    assert len(index.search("jsonl")) == 2
+
+    paths = []
+    for i, text in enumerate(["file one", "file two"]):
+        path = tmp_path / f"{i}.txt"
+        path.write_text(text)
+        paths.append(str(path))
+    index.append_files(iter(paths))
+    assert [d.id for d in index.search("file")] == paths
+    assert index.documents[paths[1]].text == "file two"
+
+    # a file appended again has a duplicate id
+    with pytest.raises(IndexingError):
+        index.append_files(paths[:1])
+    assert len(index) == 16
+
+
+def test_bulk_append_matches_append():
+    rng = random.Random(3)
+    docs = [
+        Document(
+            text=" ".join(rng.choices(["cake", "tea", "party", "Like", "we"], k=8)),
+            id=str(i),
+        )
+        for i in range(60)
+    ]
+
+    index = Index()
+    index.append([d.model_copy() for d in docs[:5]])
+    index.append([d.model_copy() for d in docs[5:]])
+
+    for workers in [1, 2]:
+        bulk_index = Index()
+        bulk_index.append([d.model_copy() for d in docs[:5]])
+        bulk_index.bulk_append(
+            [d.model_copy() for d in docs[5:]], workers=workers, batch_size=7
+        )
+
+        assert bulk_index._doc_ids == index._doc_ids
+        assert bulk_index._doc_lengths == index._doc_lengths
+        assert bulk_index.total_tokens == index.total_tokens
+        assert list(bulk_index.positional_index) == list(index.positional_index)
+        for tok, postings in index.positional_index.items():
+            bulk_postings = bulk_index.positional_index[tok]
+            assert list(bulk_postings.items()) == list(postings.items())
+            assert bulk_postings.max_tf == postings.max_tf
+            assert bulk_postings.min_doc_length == postings.min_doc_length
+
+        assert bulk_index.documents["7"].count == index.documents["7"].count
+        for q in ["cake", "tea OR party", '"like cake"~2']:
+            assert [(d.id, d.score) for d in bulk_index.retrieve_top_n(q)] == [
+                (d.id, d.score) for d in index.retrieve_top_n(q)
+            ]
+
+
+def test_compressed_positions_match_plain(tmp_path, mocker):
+    mocker.patch("importlib.metadata.version", return_value="1.0.0")
+    rng = random.Random(4)
+    words = ["cake", "tea", "party", "like", "we", "alice"]
+    docs = [
+        Document(text=" ".join(rng.choices(words, k=rng.randint(1, 300))), id=str(i))
+        for i in range(80)
+    ]
+
+    index = Index()
+    index.append([d.model_copy() for d in docs])
+    compressed = Index(compress_positions=True)
+    compressed.append([d.model_copy() for d in docs[:40]])
+    compressed.bulk_append([d.model_copy() for d in docs[40:]], workers=1)
+    compressed.append([Document(text="party of one", id="extra")])
+    index.append([Document(text="party of one", id="extra")])
+
+    queries = ["cake", "tea OR party", '"like cake"~2', '"we alice tea"~3', "p*"]
+    for deleted in [[], ["3", "50"]]:
+        index.delete(ids=deleted)
+        compressed.delete(ids=deleted)
+        for q in queries:
+            assert [(d.id, d.score) for d in compressed.retrieve_top_n(q)] == [
+                (d.id, d.score) for d in index.retrieve_top_n(q)
+            ]
+
+    compressed.compact()
+    compressed.save(str(tmp_path / "json"))
+    loaded = Index(compress_positions=True)
+    loaded.load_from_file(str(tmp_path / "json"))
+    compressed.save(str(tmp_path / "binary"), format="binary")
+    loaded_binary = Index(compress_positions=True)
+    loaded_binary.load_from_file(str(tmp_path / "binary"))
+    for q in queries:
+        expected = [(d.id, d.score) for d in index.retrieve_top_n(q)]
+        assert [(d.id, d.score) for d in loaded.retrieve_top_n(q)] == expected
+        assert [(d.id, d.score) for d in loaded_binary.retrieve_top_n(q)] == expected
+
+
+def test_bulk_append_duplicate_id():
+    index = Index()
+    index.append([Document(text="cake", id="1")])
+
+    with pytest.raises(IndexingError):
+        index.bulk_append(
+            [
+                Document(text="tea", id="2"),
+                "party",
+                Document(text="more tea", id="2"),
+                Document(text="cake party", id="3"),
+            ],
+            workers=1,
+        )
+
+    # like append, documents before the duplicate are indexed
+    assert len(index) == 3
+    assert "3" not in index.documents
+    assert [d.id for d in index.search("tea")] == ["2"]
 
 
 def test_search():
@@ -357,14 +497,185 @@ def test_index_delete():
     index.delete(ids=["1", "2", "3"])
 
     assert len(index) == 1
-    assert index.inverted_index["we"] == ["4"]
-    assert index.positional_index["we"] == {"4": [0]}
+    # "4" was the fourth document appended, internal id 3
+    assert index.inverted_index["we"].tolist() == [3]
+    assert {k: v.tolist() for k, v in index.positional_index["we"].items()} == {3: [0]}
+    assert "like" not in index.positional_index
+    assert "like" not in index.inverted_index
     assert index.total_tokens == 6
 
     assert len(index.search("cake")) == 0
     assert len(index.search("tea")) == 1
 
 
+def test_index_delete_marks_live_docs():
+    docs = [
+        Document(text="i like cake, but do we like this specific cake", id="1"),
+        Document(text="you like cookie", id="2"),
+        Document(text="we like cake", id="3"),
+        Document(text="we should have a tea party", id="4"),
+        Document(text="cake and tea", id="5"),
+        Document(text="tea for two", id="6"),
+    ]
+    index = Index()
+    index.append([d.model_copy() for d in docs])
+
+    assert index.delete(ids=["3", "missing"]) == 1
+    # a single delete is below the compaction ratio, postings are left untouched
+    assert index.inverted_index["cake"].tolist() == [0, 2, 4]
+    assert len(index) == 5
+    assert index.total_tokens == 25
+
+    # scoring only counts live documents, same as an index that never held them
+    expected = Index()
+    expected.append([d.model_copy() for d in docs if d.id != "3"])
+    queries = [
+        "cake",
+        "we OR tea",
+        "like AND cake",
+        '"like cake"~3',
+        "c*",
+        "(we OR tea) NOT party",
+        "cake AND (we OR c*)",
+    ]
+    for q in queries:
+        assert [d.id for d in index.search(q)] == [d.id for d in expected.search(q)]
+        assert [(d.id, d.score) for d in index.retrieve_top_n(q)] == [
+            (d.id, d.score) for d in expected.retrieve_top_n(q)
+        ]
+        assert [(d.id, d.score) for d in index.retrieve_top_n(q, n=2)] == [
+            (d.id, d.score) for d in expected.retrieve_top_n(q, n=2)
+        ]
+
+    index.compact()
+    assert index.inverted_index["cake"].tolist() == [0, 4]
+    assert [d.id for d in index.search("cake")] == ["1", "5"]
+
+    # appending after a delete keeps document frequencies current
+    index.append([Document(text="cake", id="7")])
+    expected.append([Document(text="cake", id="7")])
+    assert [(d.id, d.score) for d in index.retrieve_top_n("cake")] == [
+        (d.id, d.score) for d in expected.retrieve_top_n("cake")
+    ]
+
+
+def test_snapshot_isolated_from_changes():
+    docs = [
+        Document(text="we like cake", id="1"),
+        Document(text="tea and cake", id="2"),
+        Document(text="we should have a tea party", id="3"),
+    ]
+    index = Index()
+    index.append(docs)
+    index.search("t*")
+
+    queries = ["cake", "we OR tea", '"tea party"', "t*", "c*e"]
+    snapshot = index.snapshot()
+    before = {q: [(d.id, d.score) for d in snapshot.retrieve_top_n(q)] for q in queries}
+
+    index.append([Document(text="tea time cake", id="4")])
+    index.delete(ids=["2"])
+    index.compact()
+    assert [d.id for d in index.search("cake")] == ["1", "4"]
+    assert [d.id for d in index.search("t*")] == ["3", "4"]
+
+    # the snapshot still holds document 2 and not document 4
+    assert len(snapshot) == 3
+    assert [d.id for d in snapshot.search("cake")] == ["1", "2"]
+    for q in queries:
+        assert [(d.id, d.score) for d in snapshot.retrieve_top_n(q)] == before[q]
+
+    with pytest.raises(TextSearchPyError):
+        snapshot.append(["more tea"])
+    with pytest.raises(TextSearchPyError):
+        snapshot.delete(ids=["1"])
+
+
+def test_snapshot_isolated_from_deletes():
+    index = Index()
+    index.append([Document(text="tea and cake", id="1")])
+    snapshot = index.snapshot()
+    (hit,) = snapshot.retrieve_top_n("cake", n=1)
+
+    index.append([Document(text="more cake", id="2")])
+    index.delete(ids=["1"])
+    index.append([Document(text="lemon", id="1")])
+    assert [d.id for d in index.search("cake")] == ["2"]
+    assert index.documents["1"].text == "lemon"
+
+    # deleted, and appended again, after the snapshot was taken
+    assert [d.id for d in snapshot.search("cake")] == ["1"]
+    assert list(snapshot.documents) == ["1"]
+    assert snapshot.documents["1"].text == "tea and cake"
+    assert "2" not in snapshot.documents
+    assert snapshot.retrieve_top_n("cake", n=1, search_after=hit) == []
+
+    index.compact()
+    assert [d.id for d in snapshot.search("cake")] == ["1"]
+
+    # a snapshot taken after the delete does not see the deleted document
+    assert [d.id for d in index.snapshot().search("cake")] == ["2"]
+
+
+def test_top_n_with_only_empty_documents_live():
+    index = Index()
+    index.append([Document(text="cake", id="0")] + [""] * 5)
+    index.delete(ids=["0"])
+
+    # the postings of cake are still in place while no live document has tokens
+    assert index.retrieve_top_n("cake", n=1) == []
+    assert index.retrieve_top_n("cake OR tea", n=1) == []
+    assert index.retrieve_top_n("cake") == []
+
+
+def test_search_while_writing():
+    index = Index()
+    index.append([f"common {w}" for w in ("apple", "cider", "crumble")])
+    errors = []
+    done = threading.Event()
+
+    def write():
+        try:
+            for i in range(200):
+                index.append(
+                    [
+                        Document(text=f"common word{i} c{i}x", id=f"{i}.{j}")
+                        for j in range(3)
+                    ]
+                )
+                if i % 3 == 0:
+                    index.delete(ids=[f"{i // 2}.0", f"{i // 2}.1"])
+        except Exception as e:
+            errors.append(e)
+        finally:
+            done.set()
+
+    def read():
+        try:
+            while not done.is_set():
+                snapshot = index.snapshot()
+                # every live document holds "common", each query sees one version
+                assert len(snapshot.search("common")) == len(snapshot)
+                assert len(snapshot.search("c*")) == len(snapshot)
+                assert len(snapshot.retrieve_top_n("common OR x", n=None)) == len(
+                    snapshot
+                )
+                assert len(index.search("common")) >= 3
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write)] + [
+        threading.Thread(target=read) for _ in range(3)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert len(index.search("c*")) == len(index)
+
+
 def test_query_with_filtered_tokens():
     index = Index(token_normalizers=[StopwordsNormalizer()])
 
@@ -382,6 +693,22 @@ def test_query_with_filtered_tokens():
     assert len(docs) == 1
 
 
+def test_analysis_settings_are_read_only():
+    index = Index()
+    index.append([Document(text="The Fox")])
+
+    with pytest.raises(AttributeError):
+        index.token_normalizers = [StopwordsNormalizer()]
+    with pytest.raises(AttributeError):
+        index.tokenizer = None
+
+    # queries and documents keep being analyzed the same way
+    index.token_normalizers.append(StopwordsNormalizer())
+    assert [type(n) for n in index.token_normalizers] == [LowerCaseNormalizer]
+    assert len(index.search("the")) == 1
+    assert index.text_to_index_tokens("The Fox") == ["the", "fox"]
+
+
 def test_index_save_load(tmp_path, mocker):
     index = Index()
     doc1 = Document(text="you like cookie")
@@ -422,6 +749,11 @@ def test_index_save_load(tmp_path, mocker):
     assert len(new_index.search("you")) == 1
     assert len(new_index.search("like")) == 2
     assert len(new_index.documents) == 2
+    assert new_index.total_tokens == index.total_tokens
+
+    docs = index.retrieve_top_n("cake OR you")
+    loaded_docs = new_index.retrieve_top_n("cake OR you")
+    assert [(d.id, d.score) for d in docs] == [(d.id, d.score) for d in loaded_docs]
 
 
 def test_search_top_n():
@@ -451,6 +783,9 @@ def test_search_top_n():
     docs = index.retrieve_top_n("i AND cake")
     assert len(docs) == 2
 
+    assert index.retrieve_top_n("cake", n=-1) == []
+    assert index.retrieve_top_n("cake OR like", n=-1) == []
+
 
 def test_wildcard_query():
     index = Index()
@@ -478,3 +813,174 @@ def test_wildcard_query():
 
     docs = index.search("c*e")
     assert len(docs) == 5
+
+
+def test_wildcard_query_tracks_index_changes():
+    index = Index()
+    index.append(["tea party", "team work", "steam"])
+    assert [d.text for d in index.search("te*")] == ["tea party", "team work"]
+
+    # terms added and removed after the first wildcard search are picked up
+    index.append([Document(text="tear drop", id="4")])
+    assert [d.text for d in index.search("tea?")] == ["team work", "tear drop"]
+
+    index.delete(ids=["4"])
+    index.compact()
+    assert "tear" not in index.positional_index
+    assert [d.text for d in index.search("tea?")] == ["team work"]
+    assert [d.text for d in index.search("?team")] == ["steam"]
+
+
+def test_wildcard_query_kgram_index():
+    rng = random.Random(5)
+    words = ["".join(rng.choices("abcn", k=rng.randint(1, 6))) for _ in range(300)]
+    texts = [" ".join(rng.choices(words, k=5)) for _ in range(100)]
+
+    index = Index()
+    index.append(texts)
+    kgram_index = Index(kgram_size=3)
+    kgram_index.append(texts[:50])
+    kgram_index.search("a*")
+    # terms added after the k-gram index is built are indexed too
+    kgram_index.append(texts[50:])
+
+    for q in ["*ban", "*an*", "?an?", "b*a", "*c?b*", "an", "*b"]:
+        assert [d.text for d in kgram_index.search(q)] == [
+            d.text for d in index.search(q)
+        ]
+        assert [d.score for d in kgram_index.retrieve_top_n(q)] == [
+            d.score for d in index.retrieve_top_n(q)
+        ]
+
+
+def test_search_top_n_boolean_clauses():
+    index = Index()
+    doc1 = Document(text="cake cake like", id="1")
+    doc2 = Document(text="cake cookie", id="2")
+    doc3 = Document(text="like cookie", id="3")
+    doc4 = Document(text="cake like cookie", id="4")
+    index.append([doc1, doc2, doc3, doc4])
+
+    # excluded documents should not be returned when scoring
+    docs = index.retrieve_top_n("cake NOT cookie")
+    assert [d.id for d in docs] == ["1"]
+
+    # only documents matching every MUST clause are returned
+    docs = index.retrieve_top_n("cake AND like AND cookie")
+    assert [d.id for d in docs] == ["4"]
+
+    docs = index.retrieve_top_n("cake AND cookie")
+    assert sorted(d.id for d in docs) == ["2", "4"]
+    assert len(index.search("cake AND cookie")) == 2
+
+
+def test_search_top_n_pruned_matches_exhaustive():
+    rng = random.Random(7)
+    vocab = ["".join(rng.choices(string.ascii_lowercase, k=4)) for _ in range(60)]
+    weights = [1 / (i + 1) for i in range(len(vocab))]
+
+    index = Index()
+    index.append(
+        [
+            " ".join(rng.choices(vocab, weights=weights, k=rng.randint(1, 30)))
+            for _ in range(300)
+        ]
+    )
+
+    queries = [
+        vocab[0],
+        f"{vocab[0]} OR {vocab[1]} OR {vocab[30]}",
+        f"{vocab[2]} {vocab[5]} {vocab[5]} {vocab[40]}",
+        f"{vocab[0]} OR {vocab[3]} NOT {vocab[1]}",
+        f"{vocab[10]} OR missing",
+    ]
+    for q in queries:
+        for n in [1, 5, 20]:
+            top = [(d.id, d.score) for d in index.retrieve_top_n(q, n=n)]
+            exhaustive = [(d.id, d.score) for d in index.retrieve_top_n(q)][:n]
+            assert top == exhaustive
+
+
+def test_search_top_n_search_after():
+    index = Index()
+    index.append(
+        [
+            Document(text=text, id=str(i))
+            for i, text in enumerate(
+                [
+                    "cake cake cake",
+                    "cake",
+                    "cake like",
+                    "cake",
+                    "like cake cake",
+                    "cake",
+                    "cookie",
+                ]
+            )
+        ]
+    )
+
+    for q in ["cake", "cake OR like", '"cake like"~1']:
+        expected = [(d.id, d.score) for d in index.retrieve_top_n(q)]
+
+        pages = []
+        page = index.retrieve_top_n(q, n=2)
+        while page:
+            pages.extend((d.id, d.score) for d in page)
+            page = index.retrieve_top_n(q, n=2, search_after=page[-1])
+
+        assert pages == expected
+
+    # equal scores are ordered by index order
+    ids = [d.id for d in index.retrieve_top_n("cake")]
+    assert [i for i in ids if i in ["1", "3", "5"]] == ["1", "3", "5"]
+
+    with pytest.raises(TextSearchPyError):
+        index.retrieve_top_n("cake", n=2, search_after=(1.0, "missing"))
+
+
+def test_index_save_load_binary(tmp_path, mocker):
+    index = Index()
+    index.append(
+        [
+            Document(text="i like cake, but do we like this specific cake", id="1"),
+            Document(text="you like cookie", id="2"),
+            Document(text="we like cake", id="3"),
+            Document(text="we should have a tea party", id="4"),
+        ]
+    )
+    # leaves a gap in internal ids which is closed when saving
+    index.delete(ids=["2"])
+
+    save_path = str(tmp_path / "test_save")
+    mocker.patch("importlib.metadata.version", return_value="1.0.0")
+    index.save(path=save_path, format="binary")
+
+    assert os.path.exists(os.path.join(save_path, "index.bin"))
+    assert os.path.exists(os.path.join(save_path, "docs.jsonl"))
+    assert not os.path.exists(os.path.join(save_path, "index.json"))
+
+    new_index = Index()
+    new_index.load_from_file(save_path)
+
+    assert len(new_index) == 3
+    assert new_index.total_tokens == index.total_tokens
+    assert len(new_index.inverted_index) == len(index.inverted_index)
+    for q in ["cake", "like OR tea", "we AND cake", '"like cake"', "c*e", "cookie"]:
+        assert [d.id for d in new_index.search(q)] == [d.id for d in index.search(q)]
+        assert [(d.id, d.score) for d in new_index.retrieve_top_n(q)] == [
+            (d.id, d.score) for d in index.retrieve_top_n(q)
+        ]
+
+    # loaded index stays writable
+    new_index.append([Document(text="cake for the party", id="5")])
+    new_index.delete(ids=["4"])
+    assert [d.id for d in new_index.search("party")] == ["5"]
+    assert [d.id for d in new_index.search("cake")] == ["1", "3", "5"]
+    # deleted documents stay in postings until compaction
+    assert "tea" in new_index.inverted_index
+    new_index.compact()
+    assert "tea" not in new_index.inverted_index
+
+    with pytest.raises(TextSearchPyError):
+        index.save(path=str(tmp_path / "other"), format="xml")
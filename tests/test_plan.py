@@ -0,0 +1,74 @@
+import pytest
+from src.textsearchpy.index import Index
+from src.textsearchpy.normalizers import LowerCaseNormalizer, StopwordsNormalizer
+from src.textsearchpy.plan import (
+    BooleanPlan,
+    PhrasePlan,
+    PlanCache,
+    TermPlan,
+    WildcardPlan,
+    compile_query,
+    plan_query,
+)
+from src.textsearchpy.query import Clause, parse_query
+from src.textsearchpy.exception import QueryParseError
+
+
+NORMALIZERS = [LowerCaseNormalizer(), StopwordsNormalizer()]
+
+
+def test_compile_query():
+    plan = compile_query(parse_query('Cake AND "The Tea Party"~2'), NORMALIZERS)
+    assert isinstance(plan, BooleanPlan)
+    (c1, p1), (c2, p2) = plan.clauses
+    assert c1 == Clause.MUST and isinstance(p1, TermPlan) and p1.term == "cake"
+    assert c2 == Clause.MUST and isinstance(p2, PhrasePlan)
+    assert p2.terms == ("tea", "party")
+    assert p2.key == (("tea", "party"), 2, False)
+
+    # normalization removing every term matches nothing
+    assert compile_query(parse_query("the"), NORMALIZERS).term is None
+    # a phrase normalized to one term becomes a term
+    plan = compile_query(parse_query('"the Cake"'), NORMALIZERS)
+    assert isinstance(plan, TermPlan) and plan.term == "cake"
+
+    plan = compile_query(parse_query("ca?e"), NORMALIZERS)
+    assert isinstance(plan, WildcardPlan)
+    assert plan.regex.fullmatch("cake")
+
+
+def test_plan_cache_lru():
+    cache = PlanCache(max_size=2)
+    plan_query("a", NORMALIZERS, cache)
+    plan_query("b", NORMALIZERS, cache)
+    first = plan_query("a", NORMALIZERS, cache)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    # "b" is the least recently used entry
+    plan_query("c", NORMALIZERS, cache)
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") is first
+
+    cache.clear()
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (0, 0)
+
+    with pytest.raises(QueryParseError):
+        plan_query('"broken', NORMALIZERS, cache)
+    assert len(cache) == 0
+
+
+def test_index_plan_cache():
+    index = Index()
+    index.append(["The quick brown fox", "jumps over the lazy dog"])
+
+    assert [d.text for d in index.search("FOX OR dog")] == [
+        "The quick brown fox",
+        "jumps over the lazy dog",
+    ]
+    index.retrieve_top_n("FOX OR dog", n=1)
+    index.search("fox")
+    assert index.plan_cache.hits == 1
+    assert index.plan_cache.misses == 2
+    assert len(index.plan_cache) == 2
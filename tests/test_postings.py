@@ -0,0 +1,226 @@
+import random
+import pytest
+from src.textsearchpy.postings import (
+    CompressedPostings,
+    Postings,
+    decode_positions,
+    encode_positions,
+    gallop,
+    gallop_probes,
+    intersect_sorted,
+    multi_proximity_match_count,
+    proximity_match_count,
+)
+
+
+def test_postings_add_and_lookup():
+    postings = Postings()
+    postings.add(0, [1, 9])
+    postings.add(3, [4])
+    postings.add(7, [0, 2, 5])
+
+    assert len(postings) == 3
+    assert postings.keys().tolist() == [0, 3, 7]
+    assert postings[0].tolist() == [1, 9]
+    assert postings[7].tolist() == [0, 2, 5]
+    assert postings.term_freq(7) == 3
+    assert postings.term_freq(5) == 0
+    assert 3 in postings
+    assert 4 not in postings
+    assert postings.get(4) is None
+
+    with pytest.raises(KeyError):
+        postings[4]
+
+
+def test_postings_remove():
+    postings = Postings()
+    postings.add(0, [1, 9])
+    postings.add(3, [4])
+    postings.add(7, [0, 2, 5])
+
+    postings.remove(3)
+
+    assert postings.keys().tolist() == [0, 7]
+    assert {k: v.tolist() for k, v in postings.items()} == {0: [1, 9], 7: [0, 2, 5]}
+
+    with pytest.raises(KeyError):
+        postings.remove(3)
+
+
+def test_encode_positions():
+    assert encode_positions([]) == b""
+    assert encode_positions([0, 3, 10]) == bytes([0, 3, 7])
+    # gaps of 128 and above take more than one byte
+    assert encode_positions([200, 201]) == bytes([0xC8, 0x01, 0x01])
+
+    rng = random.Random(0)
+    for _ in range(100):
+        positions = sorted(rng.sample(range(100000), rng.randint(1, 50)))
+        assert decode_positions(encode_positions(positions)).tolist() == positions
+
+
+def test_compressed_postings_match_postings():
+    rng = random.Random(1)
+    plain = Postings()
+    compressed = CompressedPostings()
+    for doc_id in range(0, 300, 3):
+        positions = sorted(rng.sample(range(5000), rng.randint(1, 20)))
+        plain.add(doc_id, positions, doc_id + 5)
+        compressed.add(doc_id, positions, doc_id + 5)
+
+    def assert_same(compressed, plain):
+        assert compressed.doc_ids == plain.doc_ids
+        assert compressed.offsets == plain.offsets
+        assert list(compressed.items()) == list(plain.items())
+        assert compressed.max_tf == plain.max_tf
+        assert compressed.min_doc_length == plain.min_doc_length
+        assert compressed.decompress().positions == plain.positions
+
+    assert_same(compressed, plain)
+    assert compressed[30] == plain[30]
+    assert compressed.term_freq(30) == plain.term_freq(30)
+    assert compressed.get(31) is None
+    assert len(compressed.positions) < len(plain.positions) * 4
+
+    compressed.remove(30)
+    plain.remove(30)
+    assert_same(compressed, plain)
+
+    live_docs = [doc_id % 2 for doc_id in range(300)]
+    assert_same(compressed.live_copy(live_docs), plain.live_copy(live_docs))
+
+    other = Postings()
+    other.add(400, [1, 300])
+    compressed.extend(other)
+    plain.extend(other)
+    assert_same(compressed, plain)
+    assert_same(CompressedPostings.from_postings(plain), plain)
+
+
+def test_gallop():
+    seq = [1, 3, 5, 7, 9, 11, 13]
+    assert gallop(seq, 0) == 0
+    assert gallop(seq, 7) == 3
+    assert gallop(seq, 8) == 4
+    assert gallop(seq, 8, lo=5) == 5
+    assert gallop(seq, 14) == 7
+    assert gallop([], 1) == 0
+
+
+def test_gallop_probes():
+    seq = list(range(0, 200, 3))
+    for lo in (0, 5, 66, 67):
+        for target in range(-1, 205, 7):
+            pos, probes = gallop_probes(seq, target, lo)
+            assert pos == gallop(seq, target, lo)
+            assert probes <= 2 * max(1, len(seq) - lo).bit_length() + 1
+    assert gallop_probes(seq, 100, 67) == (67, 0)
+    # seq[0], seq[1] and seq[3], then seq[2] between them
+    assert gallop_probes(seq, 7, 0) == (3, 4)
+
+
+def test_intersect_sorted():
+    assert intersect_sorted([]) == []
+    assert intersect_sorted([[1, 2, 3]]) == [1, 2, 3]
+    assert intersect_sorted([[1, 2, 3, 4, 5, 6], [2, 4, 6], [4, 5, 6]]) == [4, 6]
+    assert intersect_sorted([list(range(1000)), [10, 500, 999, 1200]]) == [
+        10,
+        500,
+        999,
+    ]
+    assert intersect_sorted([[1, 2], []]) == []
+
+
+def _nested_loop_match_count(positions1, positions2, k, ordered):
+    # the original quadratic phrase matching, proximity_match_count must agree with it
+    temp = []
+    count = 0
+    for pp1 in positions1:
+        for pp2 in positions2:
+            if ordered and pp2 < pp1:
+                continue
+            dis = abs(pp1 - pp2)
+            if dis <= k and dis != 0:
+                temp.append(pp2)
+            elif pp2 > pp1:
+                break
+        while len(temp) > 0 and abs(temp[0] - pp1) > k:
+            temp.remove(temp[0])
+        if len(temp) > 0:
+            count += len(temp)
+    return count
+
+
+def test_proximity_match_count():
+    assert proximity_match_count([0], [1], 1, True) == 1
+    assert proximity_match_count([1], [0], 1, True) == 0
+    assert proximity_match_count([1], [0], 1, False) == 1
+    # the same position never matches, i.e. "word word" against "word"
+    assert proximity_match_count([3], [3], 2, False) == 0
+    # positions matched for an earlier term 1 position are counted again
+    assert proximity_match_count([0, 1], [2, 3], 3, False) == 6
+
+    rng = random.Random(2)
+    for _ in range(3000):
+        length = rng.randint(1, 60)
+        positions1 = sorted(rng.sample(range(length), rng.randint(1, length)))
+        positions2 = sorted(rng.sample(range(length), rng.randint(1, length)))
+        k = rng.randint(1, 8)
+        ordered = rng.random() < 0.5
+        assert proximity_match_count(
+            positions1, positions2, k, ordered
+        ) == _nested_loop_match_count(positions1, positions2, k, ordered)
+
+
+def _nested_loop_multi_match_count(positions, k, ordered):
+    # the original range enumerating phrase matching of three or more terms
+    count = 0
+    for pp1 in positions[0]:
+        ranges = []
+        for pp2 in positions[1]:
+            if ordered and pp2 < pp1:
+                continue
+            dis = abs(pp1 - pp2)
+            if dis <= k and dis != 0:
+                ranges.append((min(pp1, pp2), max(pp1, pp2)))
+            elif pp2 > pp1:
+                break
+
+        for index, positions_k in enumerate(positions[2:]):
+            temp = []
+            for r in ranges:
+                for pp_k in positions_k:
+                    if ordered and pp_k < r[1]:
+                        continue
+                    low = min(r[0], pp_k)
+                    high = max(r[1], pp_k)
+                    dis = high - low - 1 - index
+                    if dis <= k and dis != 0:
+                        temp.append((low, high))
+                    elif pp_k > r[1]:
+                        break
+            ranges = temp
+
+        count += len(ranges)
+    return count
+
+
+def test_multi_proximity_match_count():
+    # "a b c" exact phrase
+    assert multi_proximity_match_count([[0], [1], [2]], 1, True) == 1
+    assert multi_proximity_match_count([[0], [1], [3]], 1, True) == 0
+    assert multi_proximity_match_count([[0], [1], [3]], 2, True) == 1
+
+    rng = random.Random(3)
+    for _ in range(500):
+        length = rng.randint(1, 30)
+        positions = [
+            sorted(rng.sample(range(length), rng.randint(1, length)))
+            for _ in range(rng.randint(3, 5))
+        ]
+        k = rng.randint(1, 6)
+        ordered = rng.random() < 0.5
+        assert multi_proximity_match_count(
+            positions, k, ordered
+        ) == _nested_loop_multi_match_count(positions, k, ordered)
@@ -0,0 +1,124 @@
+from src.textsearchpy.index import Index
+from src.textsearchpy.query import Clause
+from tests.helpers import random_docs
+
+
+def create_index(**kwargs) -> Index:
+    index = Index(**kwargs)
+    index.append(
+        [
+            "the quick brown fox jumps over the lazy dog",
+            "the lazy fox sleeps",
+            "quick dog and brown cow",
+            "foxes are brown",
+        ]
+    )
+    return index
+
+
+def test_search_profile_tree():
+    index = create_index()
+    query = '("quick fox"~2 OR fo*) AND brown NOT cow'
+
+    docs, profile = index.search(query, profile=True)
+    assert docs == index.search(query)
+
+    assert profile.type == "boolean"
+    assert profile.clause is None
+    assert profile.docs_matched == 2
+    assert profile.seconds > 0
+    assert [(c.clause, c.type) for c in profile.children] == [
+        (Clause.MUST, "boolean"),
+        (Clause.MUST, "term"),
+        (Clause.MUST_NOT, "term"),
+    ]
+
+    phrase, wildcard = profile.children[0].children
+    assert phrase.type == "phrase"
+    assert phrase.docs_matched == 1
+    # postings of quick and fox
+    assert phrase.postings_scanned == 4
+    # positions of quick and fox in the one document holding both
+    assert phrase.positions_compared == 2
+
+    assert wildcard.description == "fo*"
+    assert wildcard.terms_expanded == 2
+    assert wildcard.postings_scanned == 3
+    assert wildcard.docs_matched == 3
+    assert wildcard.children == []
+
+    brown = profile.children[1]
+    assert brown.description == "brown"
+    assert brown.postings_scanned == 3
+    assert brown.docs_scored == 0
+
+
+def test_search_profile_multi_term_phrase():
+    index = create_index()
+    docs, profile = index.search('"the lazy dog"', profile=True)
+
+    assert len(docs) == 1
+    assert profile.type == "phrase"
+    # the, lazy and dog: 2 postings each
+    assert profile.postings_scanned == 6
+    # only the first document holds all three terms
+    assert profile.positions_compared == 4
+
+
+def test_search_profile_skips_result_cache():
+    index = create_index(result_cache_bytes=1024 * 1024)
+    index.search("fox")
+
+    _, profile = index.search("fox", profile=True)
+    assert profile.postings_scanned == 2
+    assert index.result_cache.stats()["hits"] == 0
+
+
+def test_retrieve_top_n_profile():
+    index = create_index()
+
+    query = '"the lazy dog" OR fox'
+    docs, profile = index.retrieve_top_n(query, profile=True)
+    assert docs == index.retrieve_top_n(query)
+    assert profile.docs_scored == 2
+    assert [c.docs_scored for c in profile.children] == [1, 2]
+
+    # term disjunctions are pruned with MaxScore, each term still has its own child
+    query = "fox OR dog NOT cow"
+    docs, profile = index.retrieve_top_n(query, n=1, profile=True)
+    assert docs == index.retrieve_top_n(query, n=1)
+    assert profile.pruned
+    assert [(c.clause, c.description) for c in profile.children] == [
+        (Clause.SHOULD, "fox"),
+        (Clause.SHOULD, "dog"),
+        (Clause.MUST_NOT, "cow"),
+    ]
+    fox, dog, cow = profile.children
+    assert fox.pruned and dog.pruned and not cow.pruned
+    assert (fox.postings_scanned, fox.docs_scored) == (2, 2)
+    # once dog no longer drives candidates its last posting is only compared against
+    # the fox candidate, without scoring it
+    assert (dog.postings_scanned, dog.docs_scored) == (2, 1)
+    for term in (fox, dog):
+        assert term.docs_scored <= term.postings_scanned
+    assert profile.docs_scored == 2
+
+    profile_dict = profile.to_dict()
+    assert profile_dict["type"] == "boolean"
+    assert profile_dict["pruned"]
+    assert profile_dict["children"][2]["clause"] == "MUST_NOT"
+    assert "cow" in str(profile)
+
+
+def test_retrieve_top_n_profile_pruned_terms():
+    index = Index()
+    index.append(random_docs(0, 300))
+
+    for query in ("aa OR ab", "ad OR cb OR ba NOT aa", "ag OR cc"):
+        for n in (1, 5):
+            _, profile = index.retrieve_top_n(query, n=n, profile=True)
+            terms = [c for c in profile.children if c.pruned]
+            assert terms
+            for term in terms:
+                # every scored posting was read by its own cursor
+                assert term.docs_scored <= term.postings_scanned
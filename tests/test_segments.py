@@ -0,0 +1,256 @@
+import threading
+import pytest
+from src.textsearchpy.index import Document, Index, IndexingError
+from tests.helpers import QUERIES, copy_docs, random_docs
+from src.textsearchpy.segments import (
+    _Merge,
+    SegmentedIndex,
+    TieredMergePolicy,
+    merge_segments,
+)
+
+
+def test_tiered_merge_policy():
+    policy = TieredMergePolicy(
+        segments_per_tier=3, max_merge_at_once=3, floor_segment_docs=10
+    )
+    assert policy.tier(1) == 0
+    assert policy.tier(29) == 0
+    assert policy.tier(30) == 1
+    assert policy.tier(90) == 2
+
+    assert policy.find_merges([10, 10]) == []
+    assert policy.find_merges([10, 10, 10]) == [(0, 3)]
+    # only adjacent segments of the same tier merge, segments before a higher tier can
+    # not complete their run and merge into their neighbour
+    assert policy.find_merges([10, 10, 30, 10, 10, 10, 10]) == [(0, 3), (3, 6)]
+    assert policy.find_merges([40, 50, 60, 5, 5]) == [(0, 3)]
+    assert policy.find_merges([30, 10, 40, 10, 10]) == [(0, 2)]
+    assert policy.find_merges([40, 10, 10, 30]) == [(1, 4)]
+
+
+def test_merge_segments():
+    docs = random_docs(0, 30)
+    seg1 = Index()
+    seg1.append(copy_docs(docs[:15]))
+    seg2 = Index()
+    seg2.append(copy_docs(docs[15:]))
+
+    merged = merge_segments([seg1, seg2], seg1.token_normalizers, seg1.tokenizer)
+    single = Index()
+    single.append(copy_docs(docs))
+
+    assert merged._doc_ids == single._doc_ids
+    assert merged._doc_lengths == single._doc_lengths
+    assert merged.total_tokens == single.total_tokens
+    assert sorted(merged.positional_index) == sorted(single.positional_index)
+    for tok, postings in single.positional_index.items():
+        assert list(merged.positional_index[tok].items()) == list(postings.items())
+
+    merged = merge_segments(
+        [seg1, seg2], seg1.token_normalizers, seg1.tokenizer, {"doc0", "doc20"}
+    )
+    assert len(merged) == 28
+    assert "doc0" not in merged.documents
+    assert merged.search("aa") == [
+        d for d in single.search("aa") if d.id not in ("doc0", "doc20")
+    ]
+
+
+def test_segmented_append_flushes_segments():
+    index = SegmentedIndex(max_buffered_docs=10, background_merges=False)
+    index.append(random_docs(0, 35))
+
+    assert len(index) == 35
+    assert [len(s) for s in index.segments] == [10, 10, 10]
+
+    index.flush()
+    assert [len(s) for s in index.segments] == [10, 10, 10, 5]
+
+    with pytest.raises(IndexingError):
+        index.append([Document(id="doc3", text="duplicate")])
+
+
+def test_segmented_append_splits_batches():
+    index = SegmentedIndex(max_buffered_docs=3, background_merges=False)
+    index.append(random_docs(0, 4))
+    index.append(random_docs(1, 8)[4:], batch_size=2)
+    assert [len(s) for s in index.segments] == [3, 3]
+    assert len(index) == 8
+
+    # documents before a duplicate id are added, across a sealed segment
+    docs = [Document(id=f"new{i}", text="fox") for i in range(4)]
+    with pytest.raises(IndexingError):
+        index.append(docs + [Document(id="new0", text="duplicate")])
+    assert len(index) == 12
+    assert [len(s) for s in index.segments] == [3, 3, 3, 3]
+
+
+def test_segmented_writes_do_not_wait_for_queries(monkeypatch):
+    index = SegmentedIndex(max_buffered_docs=2, background_merges=False)
+    index.append([Document(id=str(i), text="fox") for i in range(3)])
+
+    started = threading.Event()
+    release = threading.Event()
+    search = Index._search
+
+    def slow_search(self, plan, profile=None):
+        started.set()
+        release.wait(5)
+        return search(self, plan, profile)
+
+    monkeypatch.setattr(Index, "_search", slow_search)
+    results = []
+    query = threading.Thread(target=lambda: results.extend(index.search("fox")))
+    query.start()
+    assert started.wait(5)
+
+    def write():
+        index.append([Document(id="3", text="fox")])
+        index.delete(ids=["0", "2"])
+
+    # appends and deletes complete while the query is still running
+    writer = threading.Thread(target=write)
+    writer.start()
+    writer.join(2)
+    writing = writer.is_alive()
+    release.set()
+    writer.join()
+    assert not writing
+
+    query.join()
+    # the query reads the documents indexed when it started
+    assert [d.id for d in results] == ["0", "1", "2"]
+    monkeypatch.undo()
+    assert [d.id for d in index.search("fox")] == ["1", "3"]
+
+
+def test_segmented_background_merges_converge():
+    policy = TieredMergePolicy(
+        segments_per_tier=3, max_merge_at_once=4, floor_segment_docs=5
+    )
+    index = SegmentedIndex(max_buffered_docs=7, merge_policy=policy)
+    for i in range(2000):
+        index.append([Document(id=str(i), text="fox")])
+    index.wait_for_merges()
+
+    # merges finishing out of order leave lower tier segments between higher ones,
+    # those are merged too so the count stays logarithmic in the document count
+    sizes = [len(s) for s in index.segments]
+    assert sum(sizes) == 1995
+    assert policy.find_merges(sizes) == []
+    assert len(sizes) < 20
+    assert len(index.search("fox")) == 2000
+    index.close()
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_segmented_matches_single_index(background):
+    docs = random_docs(1, 400)
+    policy = TieredMergePolicy(
+        segments_per_tier=3, max_merge_at_once=3, floor_segment_docs=20
+    )
+    segmented = SegmentedIndex(
+        max_buffered_docs=20, merge_policy=policy, background_merges=background
+    )
+    single = Index()
+
+    for i in range(0, len(docs), 37):
+        segmented.append(copy_docs(docs[i : i + 37]))
+        single.append(copy_docs(docs[i : i + 37]))
+
+    deleted = [f"doc{i}" for i in range(0, 400, 7)]
+    assert segmented.delete(ids=deleted) == single.delete(ids=deleted)
+    segmented.wait_for_merges()
+
+    assert len(segmented) == len(single)
+    # merges keep the segment count low
+    assert len(segmented.segments) < 400 // 20
+
+    for query in QUERIES:
+        assert segmented.search(query) == single.search(query)
+
+        expected = single.retrieve_top_n(query)
+        result = segmented.retrieve_top_n(query)
+        assert [(d.id, d.score) for d in result] == [(d.id, d.score) for d in expected]
+
+        expected = single.retrieve_top_n(query, n=5)
+        result = segmented.retrieve_top_n(query, n=5)
+        assert [(d.id, d.score) for d in result] == [(d.id, d.score) for d in expected]
+
+    segmented.close()
+
+
+def test_segmented_search_after():
+    docs = random_docs(2, 200)
+    segmented = SegmentedIndex(max_buffered_docs=15, background_merges=False)
+    segmented.append(copy_docs(docs))
+    single = Index()
+    single.append(copy_docs(docs))
+
+    for query in ["aa OR ab", "ac AND ad", "b*"]:
+        expected = single.retrieve_top_n(query)
+        pages = []
+        page = segmented.retrieve_top_n(query, n=7)
+        while page:
+            pages.extend(page)
+            page = segmented.retrieve_top_n(query, n=7, search_after=page[-1])
+        assert [(d.id, d.score) for d in pages] == [(d.id, d.score) for d in expected]
+
+
+def test_segmented_snapshot():
+    index = SegmentedIndex(max_buffered_docs=100, background_merges=False)
+    index.append(["fox jumps", "lazy dog"])
+
+    snapshot = index.snapshot()
+    index.append(["quick fox"])
+    index.delete(ids=[snapshot.search("fox")[0].id])
+    index.force_merge()
+
+    assert len(snapshot) == 2
+    assert [d.text for d in snapshot.search("fox")] == ["fox jumps"]
+    assert [d.text for d in index.search("fox")] == ["quick fox"]
+    assert len(index.segments) == 1
+
+
+def test_segmented_delete():
+    index = SegmentedIndex(max_buffered_docs=2, background_merges=False)
+    index.append(
+        [
+            Document(id="1", text="fox"),
+            Document(id="2", text="fox dog"),
+            Document(id="3", text="dog"),
+        ]
+    )
+
+    assert index.delete(ids=["1", "3", "missing"]) == 2
+    assert len(index) == 1
+    assert [d.id for d in index.search("fox OR dog")] == ["2"]
+
+    assert index.delete(ids=["2"]) == 1
+    assert len(index) == 0
+    assert index.segments == ()
+    assert index.search("fox") == []
+
+
+def test_segmented_delete_during_merge():
+    policy = TieredMergePolicy(
+        segments_per_tier=10, max_merge_at_once=10, floor_segment_docs=2
+    )
+    index = SegmentedIndex(
+        max_buffered_docs=2, merge_policy=policy, background_merges=False
+    )
+    index.append([Document(id=str(i), text=f"fox {'dog ' * i}") for i in range(6)])
+    snapshot = index.snapshot()
+
+    # a delete lands on a segment after the merge started but before it commits
+    merge = _Merge(list(index.segments))
+    index._merges.append(merge)
+    assert index.delete(ids=["1", "4"]) == 2
+    assert index._merge(merge)
+
+    assert len(index.segments) == 1
+    assert len(index) == 4
+    assert [d.id for d in index.search("fox")] == ["0", "2", "3", "5"]
+    # the snapshot taken before still holds the deleted documents
+    assert [d.id for d in snapshot.search("fox")] == [str(i) for i in range(6)]
@@ -0,0 +1,67 @@
+import pytest
+from src.textsearchpy.index import Document, Index, IndexingError
+from src.textsearchpy.sharding import ShardedIndex, shard_of
+from tests.helpers import QUERIES, copy_docs, random_docs
+
+
+@pytest.fixture
+def sharded():
+    index = ShardedIndex(shards=3)
+    yield index
+    index.close()
+
+
+def test_shard_of():
+    assert shard_of("doc1", 4) == shard_of("doc1", 4)
+    assert {shard_of(f"doc{i}", 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+def test_sharded_matches_single_index(sharded):
+    docs = random_docs(3, 300)
+    single = Index()
+    for i in range(0, len(docs), 70):
+        sharded.append(copy_docs(docs[i : i + 70]), batch_size=25)
+        single.append(copy_docs(docs[i : i + 70]))
+
+    deleted = [f"doc{i}" for i in range(0, 300, 9)]
+    assert sharded.delete(ids=deleted + ["missing"]) == single.delete(ids=deleted)
+    assert len(sharded) == len(single)
+
+    for query in QUERIES:
+        assert sharded.search(query) == single.search(query)
+
+        # scores use statistics summed over every shard, so they are identical
+        expected = single.retrieve_top_n(query)
+        result = sharded.retrieve_top_n(query)
+        assert [(d.id, d.score) for d in result] == [(d.id, d.score) for d in expected]
+
+        expected = single.retrieve_top_n(query, n=5)
+        result = sharded.retrieve_top_n(query, n=5)
+        assert [(d.id, d.score) for d in result] == [(d.id, d.score) for d in expected]
+
+
+def test_sharded_search_after(sharded):
+    # few distinct lengths and words, so many hits tie across shards
+    docs = [
+        Document(id=str(i), text=["fox", "fox dog", "dog"][i % 3]) for i in range(60)
+    ]
+    sharded.append(copy_docs(docs))
+    single = Index()
+    single.append(copy_docs(docs))
+
+    for query in ["fox OR dog", "fox"]:
+        expected = single.retrieve_top_n(query)
+        pages = []
+        page = sharded.retrieve_top_n(query, n=7)
+        while page:
+            pages.extend(page)
+            page = sharded.retrieve_top_n(query, n=7, search_after=page[-1])
+        assert [(d.id, d.score) for d in pages] == [(d.id, d.score) for d in expected]
+
+
+def test_sharded_duplicate_id(sharded):
+    sharded.append([Document(id="1", text="fox"), "dog"])
+    with pytest.raises(IndexingError):
+        sharded.append([Document(id="1", text="fox again")])
+    assert len(sharded) == 2
+    assert [d.text for d in sharded.search("fox")] == ["fox"]
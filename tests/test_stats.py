@@ -0,0 +1,53 @@
+import math
+from src.textsearchpy.index import Index
+from src.textsearchpy.stats import BM25, CorpusStats
+
+
+def _plain_bm25(term_freq, match_freq, token_len, doc_n, total_tokens):
+    k1 = 1.2
+    b = 0.75
+    idf = math.log((doc_n - match_freq + 0.5) / (match_freq + 0.5) + 1)
+    top_term = term_freq * (k1 + 1)
+    bot_term = term_freq + k1 * (1 - b + b * token_len / (total_tokens / doc_n))
+    return idf * top_term / bot_term
+
+
+def test_bm25_matches_formula():
+    bm25 = BM25(1234, 56789)
+    for term_freq in (1, 2, 7):
+        for match_freq in (1, 10, 1234):
+            for token_len in (1, 46, 300):
+                # twice, the second time from the cached idf and norm
+                for _ in range(2):
+                    assert bm25.score(term_freq, match_freq, token_len) == _plain_bm25(
+                        term_freq, match_freq, token_len, 1234, 56789
+                    )
+
+
+def test_bm25_without_tokens():
+    # documents of average length when no document has tokens
+    assert BM25(3, 0).score(1, 1, 0) == BM25(3, 3).score(1, 1, 1)
+
+
+def test_corpus_stats_bm25_follows_counts():
+    stats = CorpusStats(10, 100)
+    bm25 = stats.bm25()
+    assert stats.bm25() is bm25
+
+    stats.merge(CorpusStats(5, 20))
+    assert stats.bm25() is not bm25
+    assert stats.bm25().doc_count == 15
+
+
+def test_index_scores_track_changes():
+    index = Index()
+    index.append(["fox dog", "fox", "dog dog cat"])
+    index.retrieve_top_n("fox")
+
+    index.append(["fox fox fox bird"])
+    index.delete(ids=[index.search("cat")[0].id])
+    doc_n = len(index)
+    for doc in index.retrieve_top_n("fox"):
+        assert doc.score == _plain_bm25(
+            doc.text.split().count("fox"), 3, doc.count, doc_n, index.total_tokens
+        )
@@ -0,0 +1,58 @@
+import pytest
+from src.textsearchpy.exception import TextSearchPyError
+from src.textsearchpy.index import Index
+from src.textsearchpy.storage import IndexFileReader, MappedPostings
+
+
+def test_index_file_round_trip(tmp_path, mocker):
+    index = Index()
+    index.append(["this book has a lot of words for a book", "can you give this book"])
+
+    mocker.patch("importlib.metadata.version", return_value="1.0.0")
+    index.save(str(tmp_path), format="binary")
+
+    reader = IndexFileReader(str(tmp_path / "index.bin"))
+    assert reader.metadata["doc_count"] == 2
+    assert reader.metadata["term_count"] == len(index.positional_index)
+    assert list(reader.terms) == sorted(index.positional_index.keys())
+    assert reader.doc_lengths().tolist() == index._doc_lengths.tolist()
+    assert list(reader.doc_ids()) == index._doc_ids
+
+    term_i = reader.find_term("book")
+    postings = reader.read_postings(term_i)
+    assert {k: v.tolist() for k, v in postings.items()} == {0: [1, 9], 1: [4]}
+    assert postings.max_tf == 2
+    assert postings.min_doc_length == 5
+    assert reader.find_term("missing") is None
+    reader.close()
+
+
+def test_mapped_postings_decodes_lazily(tmp_path, mocker):
+    index = Index()
+    index.append(["you like cookie", "we like cake"])
+
+    mocker.patch("importlib.metadata.version", return_value="1.0.0")
+    index.save(str(tmp_path), format="binary")
+
+    postings = MappedPostings(IndexFileReader(str(tmp_path / "index.bin")))
+    assert len(postings) == 5
+    assert postings._loaded == {}
+
+    assert "like" in postings
+    assert postings._loaded == {}
+    assert postings["like"].keys().tolist() == [0, 1]
+    assert list(postings._loaded.keys()) == ["like"]
+
+    del postings["cake"]
+    postings["tea"] = postings["you"]
+    assert "cake" not in postings
+    assert len(postings) == 5
+    assert sorted(postings) == ["cookie", "like", "tea", "we", "you"]
+
+
+def test_index_file_invalid(tmp_path):
+    path = tmp_path / "index.bin"
+    path.write_bytes(b"not an index file at all")
+
+    with pytest.raises(TextSearchPyError):
+        IndexFileReader(str(path))
@@ -0,0 +1,70 @@
+from src.textsearchpy.terms import KGramIndex, TermDictionary
+
+
+def test_prefix_range():
+    terms = TermDictionary(["tea", "cake", "tear", "team", "cookie", "te"])
+
+    assert terms.prefix_range("te") == ["te", "tea", "team", "tear"]
+    assert terms.prefix_range("tea") == ["tea", "team", "tear"]
+    assert terms.prefix_range("c") == ["cake", "cookie"]
+    assert terms.prefix_range("x") == []
+    assert terms.prefix_range("") == list(terms)
+    assert len(terms) == 6
+
+
+def test_add_and_discard():
+    terms = TermDictionary(["b", "d"])
+    terms.add("c")
+    terms.add("a")
+    assert list(terms) == ["a", "b", "c", "d"]
+
+    terms.discard("b")
+    terms.add("e")
+    terms.discard("e")
+    assert list(terms) == ["a", "c", "d"]
+
+    # a term added back after removal is kept
+    terms.discard("c")
+    terms.add("c")
+    assert list(terms) == ["a", "c", "d"]
+    assert terms.prefix_range("c") == ["c"]
+
+
+def test_kgram_candidates():
+    kgrams = KGramIndex(3)
+    for term in ["nation", "station", "ratio", "banana", "ana", "tion"]:
+        kgrams.add(term)
+
+    assert kgrams.candidates("*tion") == {"nation", "station", "tion"}
+    assert kgrams.candidates("*ana*") == {"banana", "ana"}
+    # candidates are a superset, the pattern is still checked afterwards
+    assert kgrams.candidates("?ati*") == {"nation", "ratio", "station"}
+    assert kgrams.candidates("ana") == {"ana"}
+    # no literal part long enough for a k-gram
+    assert kgrams.candidates("*a*") is None
+
+    kgrams.discard("ana")
+    assert kgrams.candidates("*ana*") == {"banana"}
+
+
+def test_candidates_with_kgrams():
+    words = ["nation", "station", "ratio", "banana", "ana", "tion", "national"]
+    for kgram_size in [None, 2, 3]:
+        terms = TermDictionary(words[:4], kgram_size=kgram_size)
+        for term in words[4:]:
+            terms.add(term)
+
+        for wildcard, expected in [
+            ("*tion", {"nation", "station"}),
+            ("nati*", {"nation", "national"}),
+            ("*an?n*", {"banana"}),
+        ]:
+            candidates = terms.candidates(wildcard)
+            assert candidates == sorted(candidates)
+            assert expected <= set(candidates)
+
+        assert terms.candidates("*tion") == (
+            ["nation", "station", "tion"] if kgram_size else sorted(words)
+        )
+        # regex syntax falls back to every term
+        assert terms.candidates("ana|tion") == sorted(words)